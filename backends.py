@@ -0,0 +1,305 @@
+"""Ecosystem backends and the pipeline driver they share.
+
+Every ecosystem follows the same steps: parse a manifest, resolve the
+dependencies it lists, fetch each package's metadata and extract its
+repository. A backend implements those steps for one registry, and
+run_pipeline drives any backend with the shared fast paths: concurrent
+and order-preserving lookups through the fetch engine, one lookup per
+unique package, memoized metadata, profiling stages and streaming
+output through a sink. When a manifest has a lockfile next to it, the
+locked packages are read instead of resolving the manifest.
+
+Adding an ecosystem means subclassing EcosystemBackend and adding the
+class to BACKENDS.
+"""
+
+import importlib
+import logging
+import sys
+import threading
+import time
+
+import profiling
+from fetch import fetch_imap
+from lru import memory_cache
+from output import TextSink, make_record
+
+
+# ecosystem -> "module:class" of its backend, imported on first use so a
+# run only loads the ecosystems it analyzes
+BACKENDS = {
+    "pypi": "pypi:PypiBackend",
+    "npm": "npm:NpmBackend",
+    "julia": "julia:JuliaBackend",
+}
+
+logger = logging.getLogger(__name__)
+
+
+class EcosystemBackend:
+    """The steps from a manifest to repository links for one ecosystem.
+
+    Subclasses set ecosystem and implement parse_manifest,
+    fetch_metadata and extract_repo, plus resolve_graph when
+    dependencies can be expanded and find_lockfile and parse_lockfile
+    when the ecosystem has lockfiles.
+    """
+
+    ecosystem = None
+
+    def __init__(self):
+        self._metadata = memory_cache(f"{self.ecosystem}_metadata")
+        # manifests listing the same packages share one resolution
+        self._resolutions = memory_cache(f"{self.ecosystem}_resolutions")
+        self._metadata_lock = threading.Lock()
+
+    def parse_manifest(self, filepath):
+        """Read the packages a manifest lists.
+
+        Args:
+            filepath (str) - manifest path
+
+        Returns:
+            dict - package name -> version requirement (None if any)
+        """
+        raise NotImplementedError
+
+    def resolve_graph(self, specs):
+        """Resolve the transitive dependencies of parsed manifest entries.
+
+        Args:
+            specs (dict) - result of parse_manifest
+
+        Returns:
+            dict - closure: list of (name, version) in resolution order,
+                not_found: names missing from the registry, and
+                optionally edges
+        """
+        raise NotImplementedError
+
+    def fetch_metadata(self, package):
+        """Retrieve a package's registry metadata.
+
+        Args:
+            package (str) - package name
+
+        Returns:
+            the metadata extract_repo reads, None if the package is not
+                in the registry
+        """
+        raise NotImplementedError
+
+    def extract_repo(self, metadata):
+        """Find the repository in a package's metadata.
+
+        Args:
+            metadata - result of fetch_metadata, never None
+
+        Returns:
+            str - repository URL, empty if the package names none
+        """
+        raise NotImplementedError
+
+    def find_lockfile(self, filepath):
+        """Find the lockfile recording a manifest's resolved dependencies.
+
+        Args:
+            filepath (str) - manifest path
+
+        Returns:
+            str - lockfile path, None if there is none
+        """
+        return None
+
+    def parse_lockfile(self, lockfile):
+        """Read the packages pinned by a lockfile.
+
+        Args:
+            lockfile (str) - result of find_lockfile
+
+        Returns:
+            iterable - (package name, version) of every locked package
+        """
+        raise NotImplementedError
+
+    def latest_version(self, metadata):
+        """Return the version to report when none was resolved."""
+        return None
+
+    def canonical_name(self, name):
+        """Return a manifest's package name as the resolver reports it."""
+        return name
+
+    def resolve(self, specs, no_deps=False, graph=None):
+        """List every package a manifest depends on.
+
+        Args:
+            specs (dict) - result of parse_manifest
+            no_deps (bool) - only list the packages the manifest names
+            graph (graph.DependencyGraph) - receives the resolved edges
+
+        Returns:
+            dict - package name -> resolved version (None if unknown), in
+                resolution order with packages missing from the
+                registry last
+        """
+        if no_deps:
+            return dict.fromkeys(specs)
+        key = tuple(specs.items())
+        with self._metadata_lock:
+            resolution = self._resolutions[key] if key in self._resolutions else None
+        if resolution is None:
+            with profiling.stage("resolve_deps"):
+                resolution = self.resolve_graph(specs)
+            with self._metadata_lock:
+                resolution = self._resolutions.setdefault(key, resolution)
+        if graph is not None:
+            graph.add_resolution(self.ecosystem, resolution)
+        # several versions of a package share one repository, keep the first
+        pkgs = {}
+        for name, version in resolution["closure"]:
+            pkgs.setdefault(name, version)
+        pkgs.update(dict.fromkeys(resolution["not_found"]))
+        return pkgs
+
+    def list_packages(self, filepath, no_deps=False, graph=None):
+        """List every package a manifest depends on, from its lockfile if any.
+
+        A lockfile already pins the whole tree, so it is read instead of
+        resolving the manifest unless no_deps is selected.
+
+        Args:
+            filepath (str) - manifest path
+            no_deps (bool) - only list the packages the manifest names
+            graph (graph.DependencyGraph) - receives the manifest, linked
+                to the packages it lists (every locked package for a
+                lockfile), and the resolved edges
+
+        Returns:
+            dict - see resolve
+        """
+        lockfile = None if no_deps else self.find_lockfile(filepath)
+        if lockfile is None:
+            specs = self.parse_manifest(filepath)
+            pkgs = self.resolve(specs, no_deps, graph)
+            if graph is not None:
+                graph.add_manifest(filepath, self.ecosystem, map(self.canonical_name, specs))
+            return pkgs
+        pkgs = {}
+        with profiling.stage("parse_manifest"):
+            for name, version in self.parse_lockfile(lockfile):
+                pkgs.setdefault(name, version)
+        logger.info("Read %d locked packages from %s", len(pkgs), lockfile)
+        if graph is not None:
+            graph.add_manifest(filepath, self.ecosystem, pkgs)
+        return pkgs
+
+    def metadata(self, package):
+        """Return fetch_metadata(package), fetching it once per backend."""
+        with self._metadata_lock:
+            if package in self._metadata:
+                return self._metadata[package]
+        metadata = self.fetch_metadata(package)
+        with self._metadata_lock:
+            return self._metadata.setdefault(package, metadata)
+
+    def lookup(self, node):
+        """Look up the repository of one package as an output record.
+
+        Args:
+            node (tuple) - (package name, resolved version or None)
+
+        Returns:
+            dict - see output.make_record
+        """
+        package, version = node
+        start = time.perf_counter()
+        try:
+            metadata = self.metadata(package)
+        except OSError as error:
+            # requests.RequestException is an OSError: a registry that is
+            # still unreachable after the retries fails this package only
+            logger.debug("Looking up %s on %s failed: %s", package, self.ecosystem, error)
+            return make_record(
+                self.ecosystem,
+                package,
+                version,
+                failed=True,
+                latency=time.perf_counter() - start,
+            )
+        repo_url = ""
+        if metadata is not None:
+            with profiling.stage("extract_url"):
+                repo_url = self.extract_repo(metadata)
+            version = version or self.latest_version(metadata)
+        return make_record(
+            self.ecosystem,
+            package,
+            version,
+            repo_url,
+            found=metadata is not None,
+            latency=time.perf_counter() - start,
+        )
+
+
+def get_backend(ecosystem, **options):
+    """Create the backend of an ecosystem.
+
+    Args:
+        ecosystem (str) - one of BACKENDS
+        **options - passed to the backend class
+
+    Returns:
+        EcosystemBackend
+    """
+    if ecosystem not in BACKENDS:
+        raise ValueError(f"unknown ecosystem: {ecosystem}")
+    module_name, _, class_name = BACKENDS[ecosystem].partition(":")
+    return getattr(importlib.import_module(module_name), class_name)(**options)
+
+
+def lookup_records(backend, pkgs, sink, graph=None):
+    """Look up packages concurrently, writing each record as it completes.
+
+    Args:
+        backend (EcosystemBackend) - backend of the packages
+        pkgs (iterable) - (package name, version or None) pairs
+        sink - output sink (see output.open_sink)
+        graph (graph.DependencyGraph) - receives each package's repository
+
+    Returns:
+        int - number of records written
+    """
+    count = 0
+    for record in fetch_imap(backend.lookup, pkgs):
+        sink.write(record)
+        if graph is not None:
+            graph.set_repo(backend.ecosystem, record["package"], record["repo_url"])
+        count += 1
+    return count
+
+
+def run_pipeline(backend, filepath, no_deps=False, sink=None, graph=None):
+    """Turn a manifest into one record per package it depends on.
+
+    Args:
+        backend (EcosystemBackend) - backend of the manifest's ecosystem
+        filepath (str) - manifest path, or lockfile path for backends
+            with lockfiles
+        no_deps (bool) - only analyze the packages the manifest lists
+        sink - output sink (see output.open_sink), defaults to text on
+            stdout with warnings on stderr
+        graph (graph.DependencyGraph) - receives the manifest's
+            dependency graph and the repositories found
+
+    Returns:
+        None
+    """
+    resolve_start = time.perf_counter()
+    pkgs = backend.list_packages(filepath, no_deps, graph)
+    lookup_start = time.perf_counter()
+    logger.info("Resolved %d packages in %.2fs", len(pkgs), lookup_start - resolve_start)
+
+    # stream a record per package, in resolution order, as lookups finish
+    lookup_records(backend, pkgs.items(), sink or TextSink(sys.stdout), graph)
+    logger.info("Looked up %d packages in %.2fs", len(pkgs), time.perf_counter() - lookup_start)
@@ -0,0 +1 @@
+"""Benchmarks for deps2repos, run from the repo root with python -m."""
@@ -0,0 +1,219 @@
+"""Benchmark the end-to-end pipelines against a local fake registry.
+
+Runs python_requirements_dot_text_analysis, js_package_dot_json_analysis
+and generate_julia_source_links over synthetic manifests and registries
+of each size, every run in a fresh process. Reports wall time, requests
+issued, bytes transferred and peak RSS, and writes them as JSON so runs
+from different commits can be compared.
+
+Usage:
+    python -m benchmarks.bench_pipelines [--sizes 10,1000,50000]
+        [--latency SECONDS] [--error_rate SHARE] [--output FILE]
+        [--compare BASELINE_FILE]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+
+from benchmarks.fake_registry import FakeRegistry, SyntheticRegistry
+from snapshot import DirectorySnapshot
+
+
+SCENARIOS = ("pypi", "npm", "julia")
+DEFAULT_SIZES = (10, 1000, 50000)
+FIXTURES = "test/registry_snapshot"
+# top-level packages of the synthetic manifests; the rest are transitive
+TOP_LEVEL = 10
+
+
+class _NullSink:
+    """Discard output so only the pipeline itself is measured."""
+
+    def write(self, record):
+        """Drop one record."""
+
+    def close(self):
+        """Nothing to flush."""
+
+
+def write_manifests(directory, registry):
+    """Write the synthetic manifests and Julia registry for one size.
+
+    Args:
+        directory (str) - where to write them
+        registry (SyntheticRegistry) - the packages to reference
+
+    Returns:
+        dict - scenario -> path of its manifest or registry
+    """
+    names = registry.names()
+    top_level = names[:TOP_LEVEL]
+    paths = {
+        "pypi": os.path.join(directory, "requirements.txt"),
+        "npm": os.path.join(directory, "package.json"),
+        "julia": os.path.join(directory, "julia"),
+    }
+    with open(paths["pypi"], "w") as requirements_file:
+        requirements_file.write("".join(f"{name}>=1.0\n" for name in top_level))
+    with open(paths["npm"], "w") as package_file:
+        json.dump({"dependencies": dict.fromkeys(top_level, "^1.0.0")}, package_file)
+    for i, name in enumerate(names):
+        package_dir = os.path.join(paths["julia"], name[4].upper(), name)
+        os.makedirs(package_dir)
+        with open(os.path.join(package_dir, "package.toml"), "w") as toml_file:
+            toml_file.write(
+                f'name = "{name}"\n'
+                f'uuid = "00000000-0000-0000-0000-{i:012d}"\n'
+                f'repo = "https://github.com/synthetic/{name}.jl.git"\n'
+            )
+    return paths
+
+
+def _run_scenario(scenario, path, pypi_url, npm_url, queue):
+    """Run one pipeline in this (child) process and report its cost."""
+    # pylint: disable=import-outside-toplevel
+    import fetch
+    import npm
+    import pypi
+    from julia import generate_julia_source_links
+
+    pypi.PYPI_URL = pypi_url
+    npm.NPM_REGISTRY_URL = npm_url
+    start = time.perf_counter()
+    if scenario == "pypi":
+        pypi.python_requirements_dot_text_analysis(path, False, sink=_NullSink())
+    elif scenario == "npm":
+        npm.js_package_dot_json_analysis(path, sink=_NullSink())
+    else:
+        generate_julia_source_links(path)
+    queue.put({
+        "wall_seconds": round(time.perf_counter() - start, 4),
+        # kilobytes on Linux
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "retries": fetch.stats()["retries"],
+    })
+
+
+def run_benchmarks(sizes, latency=0.0, error_rate=0.0):
+    """Benchmark every scenario at every size.
+
+    Args:
+        sizes (list of int) - numbers of packages in the synthetic registry
+        latency (float) - seconds the fake registry delays each response
+        error_rate (float) - share of requests answered with 503
+
+    Returns:
+        list of dict - scenario, size, wall_seconds, requests, bytes,
+            errors_injected, retries and peak_rss_kb of each run
+    """
+    context = multiprocessing.get_context("spawn")
+    registry = FakeRegistry([], latency=latency, error_rate=error_rate).start()
+    results = []
+    try:
+        for size in sizes:
+            synthetic = SyntheticRegistry(size)
+            registry.sources = [DirectorySnapshot(FIXTURES), synthetic]
+            with tempfile.TemporaryDirectory() as tmpdir:
+                paths = write_manifests(tmpdir, synthetic)
+                for scenario in SCENARIOS:
+                    registry.reset_stats()
+                    queue = context.Queue()
+                    process = context.Process(
+                        target=_run_scenario,
+                        args=(scenario, paths[scenario], registry.pypi_url, registry.npm_url, queue),
+                    )
+                    process.start()
+                    measured = queue.get()
+                    process.join()
+                    served = registry.reset_stats()
+                    result = {
+                        "scenario": scenario,
+                        "size": size,
+                        "wall_seconds": measured["wall_seconds"],
+                        "requests": served["requests"],
+                        "bytes": served["bytes"],
+                        "errors_injected": served["errors"],
+                        "retries": measured["retries"],
+                        "peak_rss_kb": measured["peak_rss_kb"],
+                    }
+                    results.append(result)
+                    print(_format_row(result), flush=True)
+    finally:
+        registry.stop()
+    return results
+
+
+def _format_row(result):
+    """Format one result as a table row."""
+    return (
+        f"{result['scenario']:<6} {result['size']:>7} {result['wall_seconds']:>9.3f}s "
+        f"{result['requests']:>8} req {result['bytes'] / 1e6:>8.2f} MB "
+        f"{result['peak_rss_kb'] / 1024:>7.1f} MiB rss"
+    )
+
+
+def compare(results, baseline):
+    """Print the wall time of each run relative to a baseline run."""
+    previous = {(row["scenario"], row["size"]): row for row in baseline["results"]}
+    print(f"\ncompared with {baseline.get('commit') or 'baseline'}:")
+    for row in results:
+        old = previous.get((row["scenario"], row["size"]))
+        if old and old["wall_seconds"]:
+            ratio = row["wall_seconds"] / old["wall_seconds"]
+            print(
+                f"{row['scenario']:<6} {row['size']:>7} {old['wall_seconds']:>9.3f}s -> "
+                f"{row['wall_seconds']:>9.3f}s ({ratio:.2f}x), "
+                f"requests {old['requests']} -> {row['requests']}"
+            )
+
+
+def _current_commit():
+    """Return the checked out commit, None outside a git repository."""
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, check=True, text=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def main():
+    """Run the benchmarks and write the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+        help="Comma-separated registry sizes.",
+    )
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error_rate", type=float, default=0.0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", default=None)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = run_benchmarks(sizes, latency=args.latency, error_rate=args.error_rate)
+    report = {
+        "commit": _current_commit(),
+        "python": platform.python_version(),
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "results": results,
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r") as baseline_file:
+            compare(results, json.load(baseline_file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark GitHub URL extraction from saved PyPI JSON documents.
+
+Compares the ranked, single-regex-pass extraction in pypi.py with the
+previous approach of splitting the whole description into tokens.
+
+Usage:
+    python -m benchmarks.bench_pypi_url_extraction [--fixtures DIR] [--number N]
+"""
+
+import argparse
+import glob
+import json
+import os
+import timeit
+
+from pypi import get_github_url_from_pypi_json
+from urls import parse_repo_url
+from utils import clean_github_link
+
+
+def legacy_get_github_url_from_pypi_json(pypi_pkg_json):
+    """The extraction as it was before candidates were ranked."""
+    github_page = ""
+    potential_github_fields = []
+    if pypi_pkg_json["info"]["home_page"] is not None and "github.com" in pypi_pkg_json["info"]["home_page"]:
+        potential_github_fields.append(pypi_pkg_json["info"]["home_page"])
+    if pypi_pkg_json["info"]["project_urls"]:
+        for _, url in pypi_pkg_json["info"]["project_urls"].items():
+            if "github.com" in url:
+                potential_github_fields.append(url)
+    description = pypi_pkg_json["info"]["description"]
+    if potential_github_fields == [] and description:
+        for token in description.split():
+            if "github.com" in token:
+                potential_github_fields.append(token)
+    for field in potential_github_fields:
+        if "github" in field:
+            github_page = field
+            break
+    if github_page:
+        github_page = clean_github_link(github_page)
+    return github_page
+
+
+def _time_per_call(func, documents, number):
+    """Return the mean seconds per document, memo caches cleared per run."""
+
+    def run():
+        clean_github_link.cache_clear()
+        parse_repo_url.cache_clear()
+        for document in documents:
+            func(document)
+
+    return min(timeit.repeat(run, number=number, repeat=5)) / number / len(documents)
+
+
+def main():
+    """Time both extractions per fixture and over the whole set."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", default="test/pypi_json")
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    documents = {}
+    for path in sorted(glob.glob(os.path.join(args.fixtures, "*.json"))):
+        with open(path, "r") as json_file:
+            documents[os.path.basename(path)[: -len(".json")]] = json.load(json_file)
+
+    print(f"{'package':<12} {'legacy us':>10} {'ranked us':>10} {'speedup':>8}  url")
+    for name, document in documents.items():
+        legacy = _time_per_call(legacy_get_github_url_from_pypi_json, [document], args.number)
+        ranked = _time_per_call(get_github_url_from_pypi_json, [document], args.number)
+        url = get_github_url_from_pypi_json(document)
+        print(f"{name:<12} {legacy * 1e6:>10.1f} {ranked * 1e6:>10.1f} {legacy / ranked:>7.1f}x  {url}")
+
+    documents = list(documents.values())
+    legacy = _time_per_call(legacy_get_github_url_from_pypi_json, documents, args.number)
+    ranked = _time_per_call(get_github_url_from_pypi_json, documents, args.number)
+    print(f"{'all':<12} {legacy * 1e6:>10.1f} {ranked * 1e6:>10.1f} {legacy / ranked:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Benchmark CLI cold start and keep it within a budget.
+
+Runs each scenario in a fresh interpreter with -X importtime, several
+times, and reports the median time spent importing modules and the
+median wall time of the whole process, along with the slowest imports.
+A scenario fails when its median import time exceeds the budget or when
+it loads a module it has no use for (e.g. requests for a --julia run).
+
+Usage:
+    python -m benchmarks.bench_startup [--runs N] [--budget_ms MS]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+
+# milliseconds of imports allowed before a scenario's own work starts
+STARTUP_BUDGET_MS = 100
+# scenario -> (command line arguments, modules it must not import)
+SCENARIOS = {
+    "import": (
+        ["-c", "import main"],
+        ("requests", "requirements", "packaging.requirements", "numpy", "pypi", "cache"),
+    ),
+    "help": (
+        ["main.py", "--help"],
+        ("requests", "requirements", "packaging.requirements", "numpy", "pypi", "cache"),
+    ),
+    "julia": (
+        ["main.py", "--julia", "test/julia_package_tree", "--no_cache"],
+        ("requests", "requirements", "packaging.requirements", "ruamel.yaml", "pypi"),
+    ),
+}
+
+
+def parse_importtime(stderr):
+    """Read -X importtime output.
+
+    Args:
+        stderr (str) - stderr of a python -X importtime process
+
+    Returns:
+        list of tuple - (module, depth, self us, cumulative us) in import
+            order, without the imports done while starting the
+            interpreter (site and what it loads)
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        head, cumulative_us, name = line.split("|", 2)
+        self_us = head[len("import time:"):]
+        module = name.strip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0 and module == "site":
+            imports = []
+            continue
+        imports.append((module, depth, int(self_us), int(cumulative_us)))
+    return imports
+
+
+def run_scenario(arguments, runs):
+    """Start the CLI repeatedly and collect its import profile.
+
+    Args:
+        arguments (list of str) - arguments after python -X importtime
+        runs (int) - number of fresh interpreters to start
+
+    Returns:
+        dict - import_ms and wall_ms medians, and the imports of the
+            last run
+    """
+    import_ms = []
+    wall_ms = []
+    imports = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime"] + arguments,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=True,
+        )
+        wall_ms.append((time.perf_counter() - start) * 1000)
+        imports = parse_importtime(process.stderr)
+        top_level = [cumulative for _, depth, _, cumulative in imports if depth == 0]
+        import_ms.append(sum(top_level) / 1000)
+    return {
+        "import_ms": statistics.median(import_ms),
+        "wall_ms": statistics.median(wall_ms),
+        "imports": imports,
+    }
+
+
+def main():
+    """Run every scenario and exit non-zero if one is over budget."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget_ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=5, help="Slowest imports to list.")
+    args = parser.parse_args()
+
+    failed = False
+    for scenario, (arguments, unwanted) in SCENARIOS.items():
+        result = run_scenario(arguments, args.runs)
+        loaded = {module for module, _, _, _ in result["imports"]}
+        unexpected = sorted(loaded.intersection(unwanted))
+        over_budget = result["import_ms"] > args.budget_ms
+        failed = failed or over_budget or bool(unexpected)
+        print(
+            f"{scenario:<8} imports {result['import_ms']:7.1f}ms  "
+            f"wall {result['wall_ms']:7.1f}ms  "
+            f"{'OVER BUDGET' if over_budget else 'ok'}"
+        )
+        if unexpected:
+            print(f"         unexpectedly imported: {', '.join(unexpected)}")
+        slowest = sorted(result["imports"], key=lambda entry: -entry[2])[: args.top]
+        for module, _, self_us, _ in slowest:
+            print(f"         {self_us / 1000:7.1f}ms {module}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""A local stand-in for the PyPI and npm registries used by the benchmarks.
+
+Documents come from a recorded snapshot (see snapshot.py) and, for
+packages it does not contain, from a synthetic registry generated on the
+fly. Every response can be delayed, and a share of them can be answered
+with 503 to exercise the retry path.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from npm import NPM_REGISTRY_URL
+from pypi import PYPI_URL
+from snapshot import snapshot_key
+
+
+class SyntheticRegistry:
+    """Generate PyPI projects and npm packuments named pkg-0 .. pkg-{size-1}.
+
+    Package i depends on packages fanout * i + 1 .. fanout * i + fanout,
+    so pkg-0 reaches every package and the graph is a tree of depth
+    log_fanout(size).
+
+    Args:
+        size (int) - number of packages
+        fanout (int) - dependencies per package
+    """
+
+    def __init__(self, size, fanout=3):
+        self.size = size
+        self.fanout = fanout
+
+    def names(self):
+        """Return every package name."""
+        return [f"pkg-{i}" for i in range(self.size)]
+
+    def _index(self, name):
+        """Return i for pkg-i, None for names outside the registry."""
+        prefix, _, number = name.partition("-")
+        if prefix != "pkg" or not number.isdigit() or int(number) >= self.size:
+            return None
+        return int(number)
+
+    def _dependencies(self, index):
+        """Return the names package index depends on."""
+        first = self.fanout * index + 1
+        return [f"pkg-{i}" for i in range(first, min(first + self.fanout, self.size))]
+
+    def lookup_key(self, key):
+        """Return the document body for a snapshot key, None if absent."""
+        ecosystem, _, name = key.partition("/")
+        name, _, version = name.partition("/")
+        index = self._index(name)
+        if index is None or version not in ("", "1.0.0"):
+            return None
+        repo = f"https://github.com/synthetic/{name}"
+        deps = self._dependencies(index)
+        if ecosystem == "npm":
+            document = {
+                "name": name,
+                "dist-tags": {"latest": "1.0.0"},
+                "versions": {"1.0.0": {"dependencies": dict.fromkeys(deps, "^1.0.0")}},
+                "repository": {"type": "git", "url": f"git+{repo}.git"},
+            }
+        else:
+            document = {
+                "info": {
+                    "name": name,
+                    "version": "1.0.0",
+                    "home_page": None,
+                    "download_url": None,
+                    "project_urls": {"Source": repo},
+                    "requires_dist": [f"{dep}>=1.0" for dep in deps] or None,
+                    "description": "",
+                },
+                "releases": {"1.0.0": [{"yanked": False}]},
+            }
+        return json.dumps(document).encode("UTF-8")
+
+
+class FakeRegistry:
+    """Serve registry documents over HTTP on localhost.
+
+    PyPI's JSON API is served below /pypi/ and the npm registry below
+    /npm/, see pypi_url and npm_url.
+
+    Args:
+        sources (list) - objects with lookup_key(key), tried in order
+        latency (float) - seconds every response is delayed
+        error_rate (float) - share of requests answered with 503
+        seed (int) - seed for the error injection
+    """
+
+    def __init__(self, sources, latency=0.0, error_rate=0.0, seed=0):
+        self.sources = sources
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "bytes": 0, "errors": 0}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def pypi_url(self):
+        """Base URL to use in place of pypi.PYPI_URL."""
+        return f"http://127.0.0.1:{self.server.server_port}/pypi/"
+
+    @property
+    def npm_url(self):
+        """Base URL to use in place of npm.NPM_REGISTRY_URL."""
+        return f"http://127.0.0.1:{self.server.server_port}/npm/"
+
+    def start(self):
+        """Start serving in a background thread."""
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and release the port."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_stats(self):
+        """Zero the request counters and return their previous values."""
+        with self.lock:
+            stats = dict(self.stats)
+            self.stats = dict.fromkeys(stats, 0)
+        return stats
+
+    def respond(self, path):
+        """Return the (status, body) answering a request path."""
+        with self.lock:
+            self.stats["requests"] += 1
+            fail = self.error_rate and self.random.random() < self.error_rate
+            if fail:
+                self.stats["errors"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            return 503, b"Service Unavailable"
+
+        ecosystem, _, rest = path.lstrip("/").partition("/")
+        base = {"pypi": PYPI_URL, "npm": NPM_REGISTRY_URL}.get(ecosystem)
+        key = snapshot_key(base + rest) if base else None
+        body = None
+        for source in self.sources if key else []:
+            body = source.lookup_key(key)
+            if body is not None:
+                break
+        status = 200
+        if body is None:
+            status, body = 404, b'{"error": "Not found"}' if ecosystem == "npm" else b""
+        with self.lock:
+            self.stats["bytes"] += len(body)
+        return status, body
+
+    def _handler_class(self):
+        """Build the request handler bound to this registry."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Answer GET requests from the registry's sources."""
+
+            protocol_version = "HTTP/1.1"
+            # send headers and body in one segment, avoiding delayed-ACK
+            # stalls on keep-alive connections
+            wbufsize = 1 << 16
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Serve one document."""
+                status, body = registry.respond(self.path)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if status == 503:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                """Keep the benchmark output quiet."""
+
+        return Handler
@@ -0,0 +1,121 @@
+"""Analysis of many manifests in one run, looking up each package once."""
+
+import logging
+import os
+
+from backends import get_backend
+from fetch import fetch_imap
+from output import FIELDS, STATUS_OK
+from urls import repo_key
+from utils import iter_all_paths
+
+
+MANIFEST_ECOSYSTEMS = {
+    "requirements.txt": "pypi",
+    "pyproject.toml": "pypi",
+    "Pipfile": "pypi",
+    "package.json": "npm",
+    "Project.toml": "julia",
+}
+# CSV columns of bulk records, which also name their manifest
+BULK_FIELDS = ("manifest",) + FIELDS
+# directories holding vendored copies of other projects' manifests
+SKIPPED_DIRECTORIES = {"node_modules"}
+
+logger = logging.getLogger(__name__)
+
+
+def find_manifests(paths):
+    """Expand manifest files and directories into manifest paths.
+
+    Args:
+        paths (list of str) - manifest files and directories to search
+
+    Yields:
+        str - path of each manifest named in MANIFEST_ECOSYSTEMS
+    """
+    for path in paths:
+        if not os.path.isdir(os.path.expanduser(path)):
+            yield path
+            continue
+        for manifest in iter_all_paths(path_endings=list(MANIFEST_ECOSYSTEMS), base=path):
+            if not SKIPPED_DIRECTORIES.intersection(manifest.split(os.sep)):
+                yield manifest
+
+
+def analyze_manifests(paths, no_deps=False, julia_registry=None, sink=None, graph=None):
+    """Find the repositories behind every manifest of an organization.
+
+    Each manifest is resolved on its own, but every manifest of an
+    ecosystem shares one backend (see backends.py), so registry metadata
+    is fetched once, and the repository of each unique package is looked
+    up exactly once no matter how many manifests depend on it. The cost
+    therefore grows with the number of unique packages rather than
+    manifests x packages.
+
+    Args:
+        paths (list of str) - manifest files and directories to search
+        no_deps (bool) - only analyze the packages manifests list directly
+        julia_registry (str) - registry checkout used for Project.toml
+            files, which are skipped without one
+        sink - output sink (see output.open_sink) receiving every
+            manifest's records, each with an extra "manifest" field
+        graph (graph.DependencyGraph) - receives every manifest's
+            dependency graph and the repositories found
+
+    Returns:
+        dict - manifests: path -> list of records,
+            union: one dict per unique repository with its repo_url and
+            the manifests depending on it, in first-seen order
+    """
+    backends = {}  # ecosystem -> backend, created for the first manifest
+    resolved = {}  # path -> (ecosystem, package -> version)
+    for path in find_manifests(paths):
+        ecosystem = MANIFEST_ECOSYSTEMS.get(os.path.basename(path))
+        if ecosystem is None:
+            logger.warning("Skipping %s: not a supported manifest", path)
+            continue
+        if ecosystem == "julia" and julia_registry is None:
+            logger.warning("Skipping %s: no Julia registry given", path)
+            continue
+        if ecosystem not in backends:
+            options = {"registry": julia_registry} if ecosystem == "julia" else {}
+            backends[ecosystem] = get_backend(ecosystem, **options)
+        backend = backends[ecosystem]
+        resolved[path] = (ecosystem, backend.list_packages(path, no_deps, graph))
+
+    # look up every unique package once, concurrently
+    unique_pkgs = list(dict.fromkeys(
+        (ecosystem, pkg) for ecosystem, pkgs in resolved.values() for pkg in pkgs
+    ))
+
+    def lookup(unique_pkg):
+        ecosystem, pkg = unique_pkg
+        return backends[ecosystem].lookup((pkg, None))
+
+    lookups = dict(zip(unique_pkgs, fetch_imap(lookup, unique_pkgs)))
+    if graph is not None:
+        for (ecosystem, pkg), record in lookups.items():
+            graph.set_repo(ecosystem, pkg, record["repo_url"])
+    logger.info(
+        "Looked up %d unique packages for %d manifests", len(unique_pkgs), len(resolved)
+    )
+
+    results = {"manifests": {}, "union": []}
+    union = {}
+    for path, (ecosystem, pkgs) in resolved.items():
+        records = []
+        for pkg, version in pkgs.items():
+            record = dict(lookups[(ecosystem, pkg)], manifest=path)
+            record["version"] = version or record["version"]
+            records.append(record)
+            if sink is not None:
+                sink.write(record)
+            if record["status"] == STATUS_OK:
+                key = repo_key(record["repo_url"]) or record["repo_url"]
+                entry = union.setdefault(key, {"repo_url": record["repo_url"], "manifests": []})
+                if path not in entry["manifests"]:
+                    entry["manifests"].append(path)
+        results["manifests"][path] = records
+    results["union"] = list(union.values())
+    return results
@@ -0,0 +1,195 @@
+"""Persistent on-disk cache for registry responses."""
+
+import os
+import sqlite3
+import threading
+import time
+
+from constants import DEFAULT_CACHE_PATH, DEFAULT_TTL
+
+
+NEGATIVE_TTL = 60 * 60  # "not found" answers are rechecked after an hour
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 1 GiB
+ACCESS_FLUSH_EVERY = 1000  # cache hits whose access times are written together
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+"""
+
+
+class RegistryCache:
+    """SQLite-backed store of registry responses.
+
+    Each entry keeps the raw response body along with the validators
+    (ETag / Last-Modified) needed for conditional revalidation. Entries
+    expire after their own TTL and the least recently used entries are
+    evicted once the total body size exceeds max_bytes. Access times of
+    cache hits are kept in memory and written in one transaction with
+    the next store, every ACCESS_FLUSH_EVERY hits and on close, so reads
+    do not pay for a commit each.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._lock = threading.Lock()
+        self._accessed = {}  # key -> last access time not yet written
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+        self._total_bytes = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def lookup(self, key):
+        """Return the cached entry for key, or None if absent.
+
+        Args:
+            key (str) - cache key, usually the request URL
+
+        Returns:
+            dict - entry with status, body, etag, last_modified,
+                expires_at and a boolean fresh flag
+        """
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT status, body, etag, last_modified, expires_at "
+                "FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._accessed[key] = now
+            if len(self._accessed) >= ACCESS_FLUSH_EVERY:
+                self._flush_access()
+                self._connection.commit()
+            self.hits += 1
+
+        status, body, etag, last_modified, expires_at = row
+        return {
+            "status": status,
+            "body": body,
+            "etag": etag,
+            "last_modified": last_modified,
+            "expires_at": expires_at,
+            "fresh": expires_at > now,
+        }
+
+    def store(self, key, status, body, etag=None, last_modified=None, ttl=None):
+        """Insert or replace the entry for key and evict if over the cap.
+
+        Args:
+            key (str) - cache key, usually the request URL
+            status (int) - HTTP status of the response
+            body (bytes) - raw response body
+            etag (str) - ETag header of the response, if any
+            last_modified (str) - Last-Modified header of the response
+            ttl (float) - seconds the entry stays fresh, defaults to the
+                cache TTL (or NEGATIVE_TTL for non-200 answers)
+
+        Returns:
+            None
+        """
+        if ttl is None:
+            ttl = self.ttl if status == 200 else min(self.ttl, NEGATIVE_TTL)
+        now = time.time()
+        with self._lock:
+            self._flush_access()
+            previous = self._connection.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, status, body, etag, last_modified, now, now + ttl, now, len(body)),
+            )
+            self._total_bytes += len(body) - (previous[0] if previous else 0)
+            self._evict()
+            self._connection.commit()
+
+    def refresh(self, key, ttl=None):
+        """Mark an entry fresh again after a 304 Not Modified answer.
+
+        Args:
+            key (str) - cache key, usually the request URL
+            ttl (float) - seconds the entry stays fresh
+
+        Returns:
+            None
+        """
+        now = time.time()
+        with self._lock:
+            self._flush_access()
+            self.revalidations += 1
+            self._connection.execute(
+                "UPDATE responses SET expires_at = ?, last_access = ? WHERE key = ?",
+                (now + (self.ttl if ttl is None else ttl), now, key),
+            )
+            self._connection.commit()
+
+    def _flush_access(self):
+        """Write the pending access times, leaving the commit to the caller."""
+        if self._accessed:
+            self._connection.executemany(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                ((accessed, key) for key, accessed in self._accessed.items()),
+            )
+            self._accessed.clear()
+
+    def _evict(self):
+        """Drop least recently used entries until under max_bytes."""
+        while self._total_bytes > self.max_bytes:
+            row = self._connection.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 1"
+            ).fetchone()
+            if row is None:
+                self._total_bytes = 0
+                break
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            self._total_bytes -= row[1]
+
+    def stats(self):
+        """Summarize the cache contents and this run's hit rate.
+
+        Returns:
+            dict - entry counts, sizes and hit/miss counters
+        """
+        with self._lock:
+            entries, expired = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(expires_at <= ?), 0) FROM responses",
+                (time.time(),),
+            ).fetchone()
+        return {
+            "path": self.path,
+            "entries": entries,
+            "expired": expired,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+        }
+
+    def close(self):
+        """Write the pending access times and close the database connection."""
+        with self._lock:
+            self._flush_access()
+            self._connection.commit()
+            self._connection.close()
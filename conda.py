@@ -0,0 +1,189 @@
+"""Conda (bioconda / conda-forge) recipe functionality"""
+
+import re
+
+from ruamel.yaml import YAML
+from ruamel.yaml.error import YAMLError
+
+from urls import dedupe_repo_urls
+from utils import clean_github_link, iter_all_paths, parallel_imap
+
+
+# {% set name = "value" %}
+_JINJA_SET = re.compile(r"{%-?\s*set\s+(\w+)\s*=\s*(.*?)\s*-?%}")
+# any other {% ... %} statement such as if/else/endif/for
+_JINJA_STATEMENT = re.compile(r"{%.*?%}")
+_JINJA_COMMENT = re.compile(r"{#.*?#}", re.DOTALL)
+_JINJA_EXPRESSION = re.compile(r"{{\s*(.*?)\s*}}")
+_STRING_LITERAL = re.compile(r"""^(['"])(.*)\1$""")
+_FUNCTION_CALL = re.compile(r"""^\w+\(\s*(['"])(.*?)\1.*\)$""")
+_INDEX = re.compile(r"^(\w+)\[(-?\d+)\]$")
+_DEPENDENCY_NAME = re.compile(r"^[^\s=<>!~]+")
+
+
+def iter_conda_recipes(filepath, processes=None):
+    """Lazily parse every conda recipe (meta.yaml) below a directory.
+
+    Recipes are yielded while the tree is still being walked, which also
+    picks up nested recipes such as amas/subfolder/meta.yaml. With
+    processes set, recipes are rendered and parsed in worker processes.
+
+    Args:
+        filepath (str): filepath to e.g. a bioconda-recipes checkout
+        processes (int): number of parsing processes, None for serial
+
+    Yields:
+        dict - the result of parse_conda_recipe for each recipe
+    """
+    paths = iter_all_paths(path_endings=["meta.yaml"], base=filepath)
+    yield from parallel_imap(parse_conda_recipe, paths, processes=processes)
+
+
+def parse_conda_recipe(filepath):
+    """Render a conda recipe and extract its repo links and dependencies.
+
+    Args:
+        filepath (str): filepath to a meta.yaml file
+
+    Returns:
+        dict - path, name, version, repo_links (cleaned GitHub links from
+            source.url, about.home and about.dev_url), host and run
+            dependency names, and error (None unless the recipe could not
+            be parsed)
+    """
+    result = {
+        "path": filepath,
+        "name": None,
+        "version": None,
+        "repo_links": [],
+        "host": [],
+        "run": [],
+        "error": None,
+    }
+    with open(filepath, "r") as recipe_file:
+        text = render_conda_jinja(recipe_file.read())
+
+    yaml = YAML(typ="safe", pure=True)
+    # selectors such as "# [osx]" are comments, so every platform branch
+    # is kept and a key may appear more than once
+    yaml.allow_duplicate_keys = True
+    try:
+        recipe = yaml.load(text)
+    except YAMLError as error:
+        result["error"] = str(error).splitlines()[0]
+        return result
+    if not isinstance(recipe, dict):
+        result["error"] = "recipe is not a mapping"
+        return result
+
+    package = recipe.get("package") or {}
+    result["name"] = _as_text(package.get("name"))
+    result["version"] = _as_text(package.get("version"))
+    result["repo_links"] = extract_repo_links_from_conda_recipe(recipe)
+
+    # multi-output recipes list further requirements under outputs
+    sections = [recipe] + [output for output in recipe.get("outputs") or [] if isinstance(output, dict)]
+    for section in sections:
+        requirements = section.get("requirements") or {}
+        if not isinstance(requirements, dict):
+            continue
+        for kind in ("host", "run"):
+            for dep in requirements.get(kind) or []:
+                name = _dependency_name(dep)
+                if name and name not in result[kind]:
+                    result[kind].append(name)
+
+    return result
+
+
+def render_conda_jinja(text):
+    """Strip conda's Jinja templating well enough to parse the YAML.
+
+    {% set %} variables are substituted into {{ }} expressions (with the
+    lower/upper filters and indexing), calls such as compiler('c') or
+    pin_compatible('numpy') render as their first argument and all other
+    statements are dropped. Unknown names render as themselves.
+
+    Args:
+        text (str): raw meta.yaml contents
+
+    Returns:
+        str - the rendered recipe
+    """
+    variables = {}
+    for name, expression in _JINJA_SET.findall(text):
+        variables[name] = _evaluate_jinja(expression, variables)
+
+    text = _JINJA_COMMENT.sub("", text)
+    text = _JINJA_STATEMENT.sub("", text)
+    return _JINJA_EXPRESSION.sub(
+        lambda match: _evaluate_jinja(match.group(1), variables), text
+    )
+
+
+def _evaluate_jinja(expression, variables):
+    """Evaluate the small subset of Jinja expressions used in recipes."""
+    value, *filters = [part.strip() for part in expression.split("|")]
+
+    literal = _STRING_LITERAL.match(value)
+    call = _FUNCTION_CALL.match(value)
+    index = _INDEX.match(value)
+    if literal:
+        value = literal.group(2)
+    elif call:
+        value = call.group(2)
+    elif index:
+        value = str(variables.get(index.group(1), index.group(1)))
+        position = int(index.group(2))
+        value = value[position] if -len(value) <= position < len(value) else ""
+    else:
+        value = str(variables.get(value, value))
+
+    for jinja_filter in filters:
+        if jinja_filter == "lower":
+            value = value.lower()
+        elif jinja_filter == "upper":
+            value = value.upper()
+    return value
+
+
+def extract_repo_links_from_conda_recipe(recipe):
+    """Collect cleaned GitHub links from a parsed recipe.
+
+    Args:
+        recipe (dict): the rendered and parsed meta.yaml
+
+    Returns:
+        list - repo links, unique by urls.repo_key, in source.url,
+            about.home, about.dev_url order
+    """
+    candidates = []
+
+    sources = recipe.get("source") or []
+    if isinstance(sources, dict):
+        sources = [sources]
+    for source in sources:
+        if not isinstance(source, dict):
+            continue
+        urls = source.get("url") or []
+        candidates.extend(urls if isinstance(urls, list) else [urls])
+
+    about = recipe.get("about") or {}
+    if isinstance(about, dict):
+        candidates.extend([about.get("home"), about.get("dev_url")])
+
+    links = [clean_github_link(_as_text(candidate) or "") for candidate in candidates]
+    return dedupe_repo_urls(link for link in links if link)
+
+
+def _dependency_name(dep):
+    """Return the package name of a "name >=1.0" style requirement."""
+    match = _DEPENDENCY_NAME.match(_as_text(dep) or "")
+    return match.group(0) if match else None
+
+
+def _as_text(value):
+    """Convert scalar YAML values (numbers, strings) to str, else None."""
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    return str(value)
@@ -0,0 +1,21 @@
+"""Option values shared by the CLI and the modules implementing them.
+
+main.py builds its argument parser from these, so they live apart from
+the modules using them and parsing the command line imports none of
+those modules.
+"""
+
+import os
+
+
+CACHE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "deps2repos")
+# registry response cache, see cache.py
+DEFAULT_CACHE_PATH = os.path.join(CACHE_DIRECTORY, "registry.sqlite")
+DEFAULT_TTL = 24 * 60 * 60  # one day
+# Python resolvers, see pypi.py
+RESOLVERS = ("builtin", "pipgrip", "pipgrip-batch")
+# dependency graph exports, see graph.py
+GRAPH_FORMATS = ("graphml", "parquet", "edgelist")
+# results store and its questions, see results.py
+DEFAULT_RESULTS_PATH = os.path.join(CACHE_DIRECTORY, "results.sqlite")
+QUERIES = ("dependents", "repos", "new", "scans")
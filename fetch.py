@@ -0,0 +1,449 @@
+"""Concurrent fetching of registry data shared across ecosystems."""
+
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import profiling
+
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_PER_HOST_LIMIT = 8
+DEFAULT_TIMEOUT = (5, 30)  # seconds to connect, seconds between bytes read
+DEFAULT_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+
+CACHEABLE_STATUSES = (200, 404)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_settings = {
+    "concurrency": DEFAULT_CONCURRENCY,
+    "per_host_limit": DEFAULT_PER_HOST_LIMIT,
+    "timeout": DEFAULT_TIMEOUT,
+    "retries": DEFAULT_RETRIES,
+    "rate_limit": None,
+    "cache": None,
+    "offline": False,
+    "refresh": False,
+    "snapshot": None,
+    "recorder": None,
+}
+_host_semaphores = {}
+_host_buckets = {}
+_session = None
+_stats = {"requests": 0, "retries": 0, "throttled": 0, "failures": 0, "coalesced": 0}
+# cache key -> Future of the document being retrieved for it
+_inflight = {}
+_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def configure(concurrency=None, per_host_limit=None, **settings):
+    """Set the limits, retry and cache behaviour used by the fetch engine.
+
+    Args:
+        concurrency (int) - maximum number of lookups in flight at once
+        per_host_limit (int) - maximum number of requests in flight
+            against a single registry host
+        timeout (tuple) - (connect, read) timeouts in seconds
+        retries (int) - attempts after the first for timeouts, connection
+            errors, 429 and 5xx answers
+        rate_limit (float) - requests per second per host, None for no limit
+        cache (cache.RegistryCache) - response cache, None disables it
+        offline (bool) - answer only from the cache, never the network
+        refresh (bool) - revalidate cached entries even if still fresh
+        snapshot (snapshot.DirectorySnapshot or snapshot.SqliteSnapshot) -
+            answer every lookup from this registry snapshot, None for the
+            live registries
+        recorder - snapshot every retrieved document is written to
+
+    Returns:
+        None
+    """
+    global _session  # pylint: disable=global-statement
+    with _lock:
+        for key in ("timeout", "retries", "cache", "offline", "refresh", "snapshot", "recorder"):
+            if key in settings:
+                _settings[key] = settings[key]
+        if concurrency is not None:
+            _settings["concurrency"] = max(1, int(concurrency))
+        if per_host_limit is not None:
+            _settings["per_host_limit"] = max(1, int(per_host_limit))
+            # semaphores and connection pools are sized on creation, so
+            # rebuild them lazily
+            _host_semaphores.clear()
+            _session = None
+        if "rate_limit" in settings:
+            _settings["rate_limit"] = settings["rate_limit"]
+            _host_buckets.clear()
+
+
+def stats():
+    """Return counters of requests sent, retried, throttled and failed.
+
+    Returns:
+        dict - requests, retries, throttled (429 answers), failures
+            (requests still failing after every retry) and coalesced
+            (lookups that waited for the same document already in flight)
+    """
+    with _lock:
+        return dict(_stats)
+
+
+def _count(key):
+    """Increment one of the request counters."""
+    with _lock:
+        _stats[key] += 1
+
+
+def _get_session():
+    """Return the shared session, whose pools keep connections alive."""
+    # requests takes long to import, so runs without registry lookups
+    # never load it
+    # pylint: disable=import-outside-toplevel
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    global _session  # pylint: disable=global-statement
+    with _lock:
+        if _session is None:
+            adapter = HTTPAdapter(pool_maxsize=_settings["per_host_limit"])
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def _host_semaphore(url):
+    """Return the semaphore limiting requests to the host of url."""
+    host = urlsplit(url).netloc
+    with _lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(_settings["per_host_limit"])
+            _host_semaphores[host] = semaphore
+    return semaphore
+
+
+def _host_bucket(url):
+    """Return the token bucket pacing requests to the host of url."""
+    host = urlsplit(url).netloc
+    with _lock:
+        bucket = _host_buckets.get(host)
+        if bucket is None:
+            bucket = _TokenBucket(_settings["rate_limit"])
+            _host_buckets[host] = bucket
+    return bucket
+
+
+class _TokenBucket:
+    """Pace requests to one host, and pause the host when it throttles.
+
+    Args:
+        rate (float) - tokens added per second, None for no pacing
+    """
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.capacity = max(1.0, rate or 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = self.paused_until - now
+                if wait <= 0 and self.rate:
+                    self.tokens = min(
+                        self.capacity, self.tokens + (now - self.updated) * self.rate
+                    )
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                elif wait <= 0:
+                    return
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold back every request to the host for a number of seconds."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def _retry_after(response):
+    """Seconds to wait according to a Retry-After header, None if absent."""
+    import email.utils  # pylint: disable=import-outside-toplevel
+
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def _backoff(attempt):
+    """Exponential backoff with full jitter for a retry attempt."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+
+def get(url, **kwargs):
+    """Perform a GET request while respecting the per-host limits.
+
+    Requests reuse pooled keep-alive connections and use the configured
+    timeouts. Timeouts, connection errors, 429 and 5xx answers are
+    retried with exponential backoff and jitter, waiting at least as
+    long as a Retry-After header asks; a 429 pauses every request to
+    that host for that long.
+
+    Args:
+        url (str) - URL to request
+        **kwargs - passed through to requests.Session.get
+
+    Returns:
+        requests.Response - the registry response, which is the last
+            error answer if every retry failed
+
+    Raises:
+        requests.RequestException - if the last attempt failed to connect
+            or timed out
+    """
+    import requests  # pylint: disable=import-outside-toplevel
+
+    kwargs.setdefault("timeout", _settings["timeout"])
+    bucket = _host_bucket(url)
+    attempt = 0
+    while True:
+        bucket.acquire()
+        _count("requests")
+        start = profiling.clock()
+        try:
+            with _host_semaphore(url):
+                response = _get_session().get(url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as error:
+            profiling.record_request(url, start)
+            if attempt >= _settings["retries"]:
+                _count("failures")
+                raise
+            delay = _backoff(attempt)
+            logger.debug("Retrying %s in %.2fs after %s", url, delay, error)
+        else:
+            if start is not None:
+                profiling.record_request(url, start, response.status_code, len(response.content))
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            if response.status_code == 429:
+                _count("throttled")
+            if attempt >= _settings["retries"]:
+                _count("failures")
+                logger.warning(
+                    "Giving up on %s after %d attempts (HTTP %d)",
+                    url,
+                    attempt + 1,
+                    response.status_code,
+                )
+                return response
+            delay = max(_backoff(attempt), _retry_after(response) or 0)
+            if response.status_code == 429:
+                bucket.pause(delay)
+            logger.debug("Retrying %s in %.2fs after HTTP %d", url, delay, response.status_code)
+        _count("retries")
+        attempt += 1
+        time.sleep(delay)
+
+
+def get_json(url, headers=None, **kwargs):
+    """Perform a GET request and decode the JSON body.
+
+    With a registry snapshot configured, documents are read from it and
+    the network is never touched. Otherwise, when a response cache is
+    configured, fresh entries are answered without touching the network
+    and stale entries are revalidated with If-None-Match /
+    If-Modified-Since. With a snapshot recorder configured, every
+    successfully retrieved document is also written to it. Concurrent
+    lookups of the same document share one request.
+
+    Args:
+        url (str) - URL to request
+        headers (dict) - extra request headers
+        **kwargs - passed through to requests.get
+
+    Returns:
+        dict - the decoded JSON document, empty if offline and uncached
+            or missing from the snapshot
+    """
+    snapshot = _settings["snapshot"]
+    if snapshot is not None:
+        body = snapshot.lookup(url)
+        profiling.record_lookup("snapshot", "misses" if body is None else "hits")
+        return {} if body is None else _decode(200, body)
+
+    status, body = _coalesce(_cache_key(url, headers), _get_document, url, headers, **kwargs)
+    return _decode(status, body)
+
+
+def _coalesce(key, func, *args, **kwargs):
+    """Call func once for every concurrent caller asking for the same key.
+
+    The first caller runs func; callers arriving while it runs wait for
+    its result (or exception) instead of repeating the work.
+    """
+    with _lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+        else:
+            _stats["coalesced"] += 1
+    if not leader:
+        return future.result()
+    try:
+        result = func(*args, **kwargs)
+    except BaseException as error:
+        future.set_exception(error)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _lock:
+            del _inflight[key]
+
+
+def _get_document(url, headers=None, **kwargs):
+    """Return the (status, body) of a document, recording it in the snapshot being built."""
+    status, body = _get_body(url, headers, **kwargs)
+    recorder = _settings["recorder"]
+    # content-negotiated variants (abbreviated packuments) are not
+    # recorded, so the snapshot keeps the full documents
+    if recorder is not None and status == 200 and not (headers or {}).get("Accept"):
+        recorder.record(url, body)
+    return status, body
+
+
+def _get_body(url, headers=None, **kwargs):
+    """Return the (status, body) of a GET request, going through the cache."""
+    cache = _settings["cache"]
+    if cache is None:
+        response = get(url, headers=headers, **kwargs)
+        return response.status_code, response.content
+
+    key = _cache_key(url, headers)
+    entry = cache.lookup(key)
+    if entry and (_settings["offline"] or (entry["fresh"] and not _settings["refresh"])):
+        profiling.record_lookup("cache", "hits")
+        return entry["status"], entry["body"]
+    profiling.record_lookup("cache", "misses" if entry is None else "revalidated")
+    if _settings["offline"]:
+        logger.warning("Offline mode: no cached response for %s", url)
+        return None, b""
+
+    request_headers = dict(headers or {})
+    if entry:
+        if entry["etag"]:
+            request_headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            request_headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = get(url, headers=request_headers, **kwargs)
+    if entry and response.status_code == 304:
+        cache.refresh(key)
+        return entry["status"], entry["body"]
+    if response.status_code in CACHEABLE_STATUSES:
+        cache.store(
+            key,
+            response.status_code,
+            response.content,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+    return response.status_code, response.content
+
+
+def _decode(status, body):
+    """Decode a JSON body; error answers without a JSON body become {}."""
+    try:
+        with profiling.stage("decode_json"):
+            return json.loads(body)
+    except ValueError:
+        if status == 200:
+            raise
+        return {}
+
+
+def _cache_key(url, headers):
+    """Build the cache key for a request, including content negotiation."""
+    accept = (headers or {}).get("Accept")
+    return url if not accept else url + " " + accept
+
+
+def fetch_map(func, items, concurrency=None):
+    """Apply func to every item using a bounded thread pool.
+
+    Results are returned in the same order as items so callers can
+    zip them back together with their inputs.
+
+    Args:
+        func (callable) - function performing a single lookup
+        items (iterable) - arguments to pass to func one at a time
+        concurrency (int) - override for the configured concurrency
+
+    Returns:
+        list - func(item) for each item, in input order
+    """
+    items = list(items)
+    workers = min(concurrency or _settings["concurrency"], len(items))
+    if workers <= 1:
+        return [func(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, items))
+
+
+def fetch_imap(func, items, concurrency=None):
+    """Lazily apply func to every item using a bounded thread pool.
+
+    Results are yielded in input order as soon as they are ready, and
+    only a couple of lookups per worker are queued at a time, so items
+    can be a huge lazy iterable and callers can stream the results.
+
+    Args:
+        func (callable) - function performing a single lookup
+        items (iterable) - arguments to pass to func one at a time
+        concurrency (int) - override for the configured concurrency
+
+    Yields:
+        func(item) for each item, in input order
+    """
+    workers = concurrency or _settings["concurrency"]
+    if workers <= 1:
+        yield from map(func, items)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
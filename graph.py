@@ -0,0 +1,559 @@
+"""Compact dependency graphs and the criticality of the repositories in them.
+
+A DependencyGraph collects the edges the resolvers produce for any
+number of manifests. Nodes are interned to integer ids; edges are kept
+in flat integer arrays and turned into CSR adjacency (indptr, indices)
+NumPy arrays for analysis, so graphs with 100k+ nodes stay small and
+every metric is computed in vectorized passes:
+
+- fan_in: number of direct dependents
+- reach: number of manifests depending on a node, directly or
+  transitively
+- pagerank: PageRank with importance flowing from dependents to their
+  dependencies
+
+Metrics are aggregated per normalized repository by rank_repos. NumPy
+is only needed for the metrics and the GraphML and Parquet exports, and
+pyarrow only for Parquet; the edge list needs neither.
+"""
+
+import os
+import sys
+from array import array
+from html import escape
+
+from constants import GRAPH_FORMATS
+from urls import repo_key
+
+
+# ecosystem of the nodes standing for manifests
+MANIFEST = "manifest"
+
+
+def _numpy():
+    """Import numpy, which only graph metrics and exports need."""
+    try:
+        import numpy  # pylint: disable=import-outside-toplevel
+    except ImportError as error:
+        raise ImportError("dependency graph metrics need numpy: pip install numpy") from error
+    return numpy
+
+
+def _pyarrow():
+    """Import pyarrow, which only the Parquet export needs."""
+    try:
+        # pylint: disable=import-outside-toplevel
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError("the Parquet graph export needs pyarrow: pip install pyarrow") from error
+    return pyarrow
+
+
+class DependencyGraph:
+    """Resolved dependency graphs of many manifests as one graph.
+
+    Packages are nodes keyed by (ecosystem, name), versions being
+    collapsed as they share a repository; each manifest is a node with
+    ecosystem MANIFEST and an edge to every package it lists. Edges go
+    from dependent to dependency.
+    """
+
+    def __init__(self):
+        self._ids = {}  # (ecosystem, name) -> node id
+        self.nodes = []  # node id -> (ecosystem, name)
+        self.repos = []  # node id -> repository URL, empty if unknown
+        self._sources = array("q")
+        self._targets = array("q")
+        self._csr = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def intern(self, ecosystem, name):
+        """Return the id of a node, adding it on first use.
+
+        Args:
+            ecosystem (str) - ecosystem of the package, or MANIFEST
+            name (str) - package name or manifest path
+
+        Returns:
+            int - node id
+        """
+        key = (ecosystem, name)
+        node_id = self._ids.get(key)
+        if node_id is None:
+            node_id = self._ids[key] = len(self.nodes)
+            self.nodes.append(key)
+            self.repos.append("")
+        return node_id
+
+    def add_edge(self, ecosystem, dependent, dependency):
+        """Record that one package depends on another."""
+        self._sources.append(self.intern(ecosystem, dependent))
+        self._targets.append(self.intern(ecosystem, dependency))
+        self._csr = None
+
+    def add_manifest(self, manifest, ecosystem, names):
+        """Record the packages a manifest depends on.
+
+        Args:
+            manifest (str) - manifest path
+            ecosystem (str) - ecosystem of the packages
+            names (iterable of str) - packages the manifest lists
+
+        Returns:
+            None
+        """
+        manifest_id = self.intern(MANIFEST, manifest)
+        for name in names:
+            self._sources.append(manifest_id)
+            self._targets.append(self.intern(ecosystem, name))
+        self._csr = None
+
+    def add_resolution(self, ecosystem, resolution):
+        """Record the graph a resolver returned.
+
+        Args:
+            ecosystem (str) - ecosystem of the resolved packages
+            resolution (dict) - closure, not_found and edges, see
+                EcosystemBackend.resolve_graph; nodes are names or
+                (name, version) pairs
+
+        Returns:
+            None
+        """
+        for node in resolution["closure"]:
+            self.intern(ecosystem, _node_name(node))
+        for name in resolution["not_found"]:
+            self.intern(ecosystem, name)
+        for dependent, dependency in resolution.get("edges", ()):
+            self.add_edge(ecosystem, _node_name(dependent), _node_name(dependency))
+
+    def set_repo(self, ecosystem, name, repo_url):
+        """Attach the repository a package was found to come from."""
+        self.repos[self.intern(ecosystem, name)] = repo_url or ""
+
+    def label(self, node_id):
+        """Return "ecosystem:name" for a node."""
+        return ":".join(self.nodes[node_id])
+
+    def csr(self):
+        """Return the deduplicated adjacency in compressed sparse row form.
+
+        Returns:
+            tuple - (indptr, indices) int64 arrays; the dependencies of
+                node i are indices[indptr[i]:indptr[i + 1]], sorted
+        """
+        if self._csr is None:
+            np = _numpy()
+            count = len(self.nodes)
+            # copies, as the edge arrays cannot grow while a view exports them
+            sources = np.frombuffer(self._sources, dtype=np.int64).copy()
+            targets = np.frombuffer(self._targets, dtype=np.int64).copy()
+            # drop duplicate edges and self-loops
+            keys = np.unique((sources * count + targets)[sources != targets])
+            sources, indices = np.divmod(keys, max(count, 1))
+            indptr = np.zeros(count + 1, dtype=np.int64)
+            np.cumsum(np.bincount(sources, minlength=count), out=indptr[1:])
+            self._csr = (indptr, indices)
+        return self._csr
+
+    def fan_in(self):
+        """Return the number of direct dependents of every node."""
+        np = _numpy()
+        _, indices = self.csr()
+        return np.bincount(indices, minlength=len(self.nodes))
+
+    def reach_bits(self):
+        """Mark the manifests each node is reachable from.
+
+        Bit j of row i is set when manifest j depends on node i directly
+        or transitively. Without manifest nodes, the nodes nothing
+        depends on are used instead. Bits flow along the edges in
+        topological order, one level of nodes at a time, so each edge
+        is visited once; dependency cycles are first collapsed into
+        single nodes.
+
+        Returns:
+            tuple - (bits, roots): a (nodes, words) uint64 array and the
+                ids of the root nodes the bits stand for
+        """
+        np = _numpy()
+        indptr, indices = self.csr()
+        count = len(self.nodes)
+        roots = np.array(
+            [node_id for node_id, node in enumerate(self.nodes) if node[0] == MANIFEST],
+            dtype=np.int64,
+        )
+        if not len(roots):
+            roots = np.flatnonzero(self.fan_in() == 0)
+        bits = np.zeros((count, max(1, (len(roots) + 63) // 64)), dtype=np.uint64)
+        positions = np.arange(len(roots))
+        bits[roots, positions // 64] = np.left_shift(
+            np.uint64(1), (positions % 64).astype(np.uint64)
+        )
+
+        sources = np.repeat(np.arange(count), np.diff(indptr))
+        settled = _flow_bits(bits, sources, indices)
+        if not settled.all():
+            # collapse the cycles the topological order stopped at; every
+            # node of a cycle is reachable from the same manifests
+            unsettled = np.flatnonzero(~settled)
+            labels = _component_labels(indptr, indices, unsettled)
+            _merge_bits(bits, unsettled, labels[unsettled])
+            remaining = ~settled[sources]
+            sources, targets = labels[sources[remaining]], labels[indices[remaining]]
+            between = sources != targets
+            _flow_bits(bits, sources[between], targets[between])
+            bits[unsettled] = bits[labels[unsettled]]
+        return bits, roots
+
+    def reach(self):
+        """Return the number of manifests depending on every node, see reach_bits."""
+        bits, roots = self.reach_bits()
+        # roots reach themselves
+        counts = _popcount(bits)
+        counts[roots] -= 1
+        return counts
+
+    def pagerank(self, damping=0.85, tolerance=1e-10, max_iterations=100):
+        """Score nodes by PageRank, rank flowing from dependents to dependencies.
+
+        Nodes without dependencies spread their rank evenly over every
+        node, so scores sum to 1.
+
+        Args:
+            damping (float) - probability of following an edge
+            tolerance (float) - stop once scores change less than this
+                in total
+            max_iterations (int) - upper bound on power iterations
+
+        Returns:
+            numpy.ndarray - float64 score per node
+        """
+        np = _numpy()
+        indptr, indices = self.csr()
+        count = len(self.nodes)
+        if not count:
+            return np.zeros(0)
+        out_degree = np.diff(indptr)
+        sources = np.repeat(np.arange(count), out_degree)
+        dangling = out_degree == 0
+        inverse_degree = np.divide(1.0, out_degree, out=np.zeros(count), where=~dangling)
+        rank = np.full(count, 1.0 / count)
+        for _ in range(max_iterations):
+            flow = np.bincount(indices, weights=(rank * inverse_degree)[sources], minlength=count)
+            updated = (1 - damping) / count + damping * (flow + rank[dangling].sum() / count)
+            converged = np.abs(updated - rank).sum() < tolerance
+            rank = updated
+            if converged:
+                break
+        return rank
+
+    def metrics(self):
+        """Return fan_in, reach and pagerank arrays, indexed by node id."""
+        return {"fan_in": self.fan_in(), "reach": self.reach(), "pagerank": self.pagerank()}
+
+    def rank_repos(self, top=None):
+        """Rank the repositories behind the packages by criticality.
+
+        Packages are grouped by normalized repository (see
+        urls.repo_key). A repository's fan_in counts the distinct nodes
+        depending on any of its packages from outside the repository,
+        its reach the manifests depending on any of its packages, and
+        its pagerank sums its packages' scores.
+
+        Args:
+            top (int) - only return the highest ranked, all by default
+
+        Returns:
+            list of dict - repo_url, packages, fan_in, reach and pagerank,
+                by descending pagerank
+        """
+        np = _numpy()
+        repo_ids = {}  # repo key -> group
+        repo_urls = []
+        groups = np.full(len(self.nodes), -1, dtype=np.int64)
+        for node_id, repo_url in enumerate(self.repos):
+            if repo_url and self.nodes[node_id][0] != MANIFEST:
+                key = repo_key(repo_url) or repo_url
+                if key not in repo_ids:
+                    repo_ids[key] = len(repo_urls)
+                    repo_urls.append(repo_url)
+                groups[node_id] = repo_ids[key]
+        if not repo_urls:
+            return []
+        group_count = len(repo_urls)
+
+        indptr, indices = self.csr()
+        sources = np.repeat(np.arange(len(self.nodes)), np.diff(indptr))
+        target_groups = groups[indices]
+        outside = (target_groups >= 0) & (groups[sources] != target_groups)
+        dependents = np.unique(sources[outside] * group_count + target_groups[outside])
+        fan_in = np.bincount(dependents % group_count, minlength=group_count)
+
+        grouped = np.flatnonzero(groups >= 0)
+        grouped = grouped[np.argsort(groups[grouped], kind="stable")]
+        starts = np.flatnonzero(
+            np.concatenate(([True], groups[grouped][1:] != groups[grouped][:-1]))
+        )
+        bits, roots = self.reach_bits()
+        reach = _popcount(np.bitwise_or.reduceat(bits[grouped], starts, axis=0))
+        pagerank = np.bincount(groups[grouped], weights=self.pagerank()[grouped])
+        packages = np.bincount(groups[grouped], minlength=group_count)
+        # roots reach themselves, but not towards their own repository
+        root_groups = groups[roots]
+        reach -= np.bincount(root_groups[root_groups >= 0], minlength=group_count)
+
+        order = np.argsort(-pagerank, kind="stable")[:top]
+        return [
+            {
+                "repo_url": repo_urls[group],
+                "packages": int(packages[group]),
+                "fan_in": int(fan_in[group]),
+                "reach": int(reach[group]),
+                "pagerank": float(pagerank[group]),
+            }
+            for group in order
+        ]
+
+    def print_ranking(self, top=20, stream=None):
+        """Print the most critical repositories as a table.
+
+        Args:
+            top (int) - number of repositories to print
+            stream (file) - where to print, stderr by default
+
+        Returns:
+            None
+        """
+        stream = stream or sys.stderr
+        print(
+            f"{'repository':<60} {'packages':>8} {'fan-in':>8} {'reach':>8} {'pagerank':>10}",
+            file=stream,
+        )
+        for repo in self.rank_repos(top):
+            print(
+                f"{repo['repo_url']:<60} {repo['packages']:>8} {repo['fan_in']:>8} "
+                f"{repo['reach']:>8} {repo['pagerank']:>10.6f}",
+                file=stream,
+            )
+
+    def iter_edges(self):
+        """Yield every distinct (dependent, dependency) pair of node ids."""
+        seen = set()
+        for edge in zip(self._sources, self._targets):
+            if edge[0] != edge[1] and edge not in seen:
+                seen.add(edge)
+                yield edge
+
+    def write(self, path, graph_format="graphml"):
+        """Export the graph in one of GRAPH_FORMATS."""
+        if graph_format not in GRAPH_FORMATS:
+            raise ValueError(f"unknown graph format: {graph_format}")
+        getattr(self, f"write_{graph_format}")(path)
+
+    def write_edgelist(self, path):
+        """Write one tab-separated "ecosystem:name" pair per edge."""
+        with open(path, "w", encoding="UTF-8") as edge_file:
+            for source, target in self.iter_edges():
+                edge_file.write(f"{self.label(source)}\t{self.label(target)}\n")
+
+    def write_graphml(self, path):
+        """Write GraphML with each node's ecosystem, name, repository and metrics."""
+        metrics = self.metrics()
+        indptr, indices = self.csr()
+        attributes = (
+            ("ecosystem", "string"),
+            ("name", "string"),
+            ("repo_url", "string"),
+            ("fan_in", "int"),
+            ("reach", "int"),
+            ("pagerank", "double"),
+        )
+        with open(path, "w", encoding="UTF-8") as graph_file:
+            graph_file.write(
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+            )
+            for name, kind in attributes:
+                graph_file.write(
+                    f'  <key id="{name}" for="node" attr.name="{name}" attr.type="{kind}"/>\n'
+                )
+            graph_file.write('  <graph id="dependencies" edgedefault="directed">\n')
+            for node_id, (ecosystem, name) in enumerate(self.nodes):
+                values = (
+                    ecosystem,
+                    name,
+                    self.repos[node_id],
+                    metrics["fan_in"][node_id],
+                    metrics["reach"][node_id],
+                    metrics["pagerank"][node_id],
+                )
+                data = "".join(
+                    f'<data key="{key}">{escape(str(value))}</data>'
+                    for (key, _), value in zip(attributes, values)
+                )
+                graph_file.write(f'    <node id="n{node_id}">{data}</node>\n')
+            for source in range(len(self.nodes)):
+                for target in indices[indptr[source]:indptr[source + 1]]:
+                    graph_file.write(f'    <edge source="n{source}" target="n{target}"/>\n')
+            graph_file.write("  </graph>\n</graphml>\n")
+
+    def write_parquet(self, path):
+        """Write the nodes with their metrics to path and the edges next to it.
+
+        The edges go to path with "_edges" before its extension, as
+        source and target node ids.
+        """
+        pyarrow = _pyarrow()
+        np = _numpy()
+        metrics = self.metrics()
+        indptr, indices = self.csr()
+        nodes = pyarrow.table(
+            {
+                "id": np.arange(len(self.nodes)),
+                "ecosystem": pyarrow.array(
+                    [ecosystem for ecosystem, _ in self.nodes]
+                ).dictionary_encode(),
+                "name": [name for _, name in self.nodes],
+                "repo_url": self.repos,
+                "fan_in": metrics["fan_in"],
+                "reach": metrics["reach"],
+                "pagerank": metrics["pagerank"],
+            }
+        )
+        edges = pyarrow.table(
+            {"source": np.repeat(np.arange(len(self.nodes)), np.diff(indptr)), "target": indices}
+        )
+        root, extension = os.path.splitext(path)
+        pyarrow.parquet.write_table(nodes, path)
+        pyarrow.parquet.write_table(edges, f"{root}_edges{extension or '.parquet'}")
+
+
+def _node_name(node):
+    """Return the package name of a resolver node, a name or (name, version)."""
+    return node[0] if isinstance(node, tuple) else node
+
+
+def _flow_bits(bits, sources, targets):
+    """OR bit rows along edges in topological order (Kahn's algorithm).
+
+    Args:
+        bits (numpy.ndarray) - (nodes, words) bit rows, updated in place
+        sources (numpy.ndarray) - edge sources
+        targets (numpy.ndarray) - edge targets
+
+    Returns:
+        numpy.ndarray - bool mask of the nodes that were reached in
+            topological order, i.e. neither on nor below a cycle
+    """
+    np = _numpy()
+    count = len(bits)
+    order = np.argsort(sources, kind="stable")
+    sources, targets = sources[order], targets[order]
+    indptr = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=count), out=indptr[1:])
+    remaining = np.bincount(targets, minlength=count)
+    settled = np.zeros(count, dtype=bool)
+    level = np.flatnonzero(remaining == 0)
+    while len(level):
+        settled[level] = True
+        level_sources, level_targets = _out_edges(indptr, targets, level)
+        _merge_bits(bits, level_sources, level_targets)
+        remaining -= np.bincount(level_targets, minlength=count)
+        level = np.unique(level_targets[remaining[level_targets] == 0])
+    return settled
+
+
+def _component_labels(indptr, indices, nodes):
+    """Label strongly connected components with an iterative Tarjan search.
+
+    Args:
+        indptr, indices (numpy.ndarray) - CSR adjacency
+        nodes (numpy.ndarray) - node ids to search, edges leaving them
+            are ignored
+
+    Returns:
+        numpy.ndarray - for every node, the id of a node standing for its
+            component; nodes outside the search stand for themselves
+    """
+    np = _numpy()
+    labels = list(range(len(indptr) - 1))
+    inside = np.zeros(len(labels), dtype=bool)
+    inside[nodes] = True
+    inside = inside.tolist()
+    starts = indptr.tolist()
+    adjacency = indices.tolist()
+    order = [-1] * len(labels)  # discovery order, -1 before discovery
+    low = [0] * len(labels)
+    on_stack = [False] * len(labels)
+    stack = []
+    discovered = 0
+    for root in nodes.tolist():
+        if order[root] >= 0:
+            continue
+        order[root] = low[root] = discovered
+        discovered += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, starts[root])]
+        while work:
+            node, position = work[-1]
+            end = starts[node + 1]
+            while position < end:
+                child = adjacency[position]
+                position += 1
+                if not inside[child]:
+                    continue
+                if order[child] < 0:
+                    break
+                if on_stack[child] and order[child] < low[node]:
+                    low[node] = order[child]
+            else:
+                # every child is done
+                work.pop()
+                if work and low[node] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[node]
+                if low[node] == order[node]:
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        labels[member] = node
+                        if member == node:
+                            break
+                continue
+            work[-1] = (node, position)
+            order[child] = low[child] = discovered
+            discovered += 1
+            stack.append(child)
+            on_stack[child] = True
+            work.append((child, starts[child]))
+    return np.array(labels, dtype=np.int64)
+
+
+def _out_edges(indptr, indices, nodes):
+    """Return the (sources, targets) arrays of the edges leaving some nodes."""
+    np = _numpy()
+    counts = indptr[nodes + 1] - indptr[nodes]
+    offsets = np.repeat(indptr[nodes] - (np.cumsum(counts) - counts), counts)
+    return np.repeat(nodes, counts), indices[offsets + np.arange(counts.sum())]
+
+
+def _merge_bits(bits, sources, targets):
+    """OR the bit rows of sources into those of targets, grouped per target."""
+    np = _numpy()
+    if not len(targets):
+        return
+    order = np.argsort(targets, kind="stable")
+    sources, targets = sources[order], targets[order]
+    starts = np.flatnonzero(np.concatenate(([True], targets[1:] != targets[:-1])))
+    bits[targets[starts]] |= np.bitwise_or.reduceat(bits[sources], starts, axis=0)
+
+
+def _popcount(bits):
+    """Count the set bits of every row of a uint64 array."""
+    np = _numpy()
+    table = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.int64)
+    return table[np.ascontiguousarray(bits).view(np.uint8)].sum(axis=1)
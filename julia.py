@@ -1,10 +1,53 @@
 """Julia-related functionality"""
 
-import glob
+import hashlib
+import json
+import os
+import subprocess
+import tarfile
 
 import tomli
 
-from utils import find_all_paths
+import profiling
+from backends import EcosystemBackend
+from utils import iter_all_paths, parallel_imap
+
+
+JULIA_INDEX_FILENAME = ".deps2repos-index.json"
+JULIA_INDEX_VERSION = 1
+
+
+class JuliaBackend(EcosystemBackend):
+    """Resolve Project.toml files against a local julia registry.
+
+    Args:
+        registry (str) - registry checkout or a dir with package.tomls
+        index (dict) - prebuilt result of build_julia_package_index
+    """
+
+    ecosystem = "julia"
+
+    def __init__(self, registry, index=None):
+        super().__init__()
+        self.registry = registry
+        self.index = index if index is not None else build_julia_package_index(registry)
+
+    def parse_manifest(self, filepath):
+        """List the [deps] of a Project.toml, which carry no versions."""
+        return dict.fromkeys(parse_julia_project_dot_toml(filepath))
+
+    def resolve_graph(self, specs):
+        """Walk the registry, see resolve_julia_dependencies."""
+        return resolve_julia_dependencies(list(specs), self.registry, index=self.index)
+
+    def fetch_metadata(self, package):
+        """Return the parsed package.toml, None if it is not registered."""
+        path = self.index["by_name"].get(package)
+        return None if path is None else parse_julia_package_dot_toml(path)
+
+    def extract_repo(self, metadata):
+        """Return the repo field of a package.toml."""
+        return extract_repo_link_from_toml_dict(metadata)
 
 
 def generate_julia_source_links(filepath):
@@ -19,14 +62,172 @@ def generate_julia_source_links(filepath):
     Returns:
         list - all source links from all discovered package.toml files
     """
-    links = []
-    paths = find_all_paths(path_endings=["package.toml"], base=filepath)
-    for path in paths:
-        toml_dict = parse_julia_package_dot_toml(path)
-        link = extract_repo_link_from_toml_dict(toml_dict)
-        links.append(link)
+    return list(iter_julia_source_links(filepath))
+
+
+def iter_julia_source_links(filepath, processes=None):
+    """Lazily yield the julia source links found in a directory.
+
+    Links are produced while the tree is still being walked, so output
+    starts immediately and memory stays flat on the full General
+    registry. With processes set, the package.toml files are parsed in a
+    pool of worker processes.
+
+    Args:
+       filepath (str): filepath to a dir with 1 or more package.tomls
+       processes (int): number of TOML parsing processes, None for serial
+
+    Yields:
+        str - source link of each discovered package.toml file
+    """
+    paths = iter_all_paths(path_endings=["package.toml"], base=filepath)
+    yield from parallel_imap(_repo_link_from_path, paths, processes=processes)
+
+
+def iter_julia_source_links_from_tarball(filepath):
+    """Lazily yield the julia source links inside a registry tarball.
+
+    The archive (e.g. a General registry tarball from a Julia package
+    server, compressed or not) is read as a stream, so it is never
+    extracted to disk nor loaded into memory as a whole.
+
+    Args:
+       filepath (str): filepath to a .tar, .tar.gz or similar archive
+
+    Yields:
+        str - source link of each package.toml in the archive
+    """
+    with tarfile.open(filepath, mode="r|*") as archive:
+        yield from _iter_links_from_tar_stream(archive)
+
+
+def iter_julia_source_links_from_git(repo_path, ref="HEAD"):
+    """Lazily yield the julia source links stored in a registry git repo.
+
+    The files are streamed out of the git object store with git archive,
+    so a bare clone or a checkout at another revision works without
+    extracting the tree.
+
+    Args:
+       repo_path (str): path to a git clone of the registry
+       ref (str): commit, branch or tag to read
+
+    Yields:
+        str - source link of each package.toml at ref
+    """
+    command = ["git", "-C", repo_path, "archive", "--format=tar", ref]
+    with subprocess.Popen(command, stdout=subprocess.PIPE) as process:
+        with tarfile.open(fileobj=process.stdout, mode="r|") as archive:
+            yield from _iter_links_from_tar_stream(archive)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+
+def update_julia_index(filepath, index_path=None, full_rebuild=False):
+    """Refresh an on-disk index of a julia registry's repo links.
+
+    The index records the mtime, size, SHA-256 and repo link of every
+    package.toml. On later runs a file is only re-parsed when its mtime
+    or size changed and its content hash no longer matches, so nightly
+    runs over a mostly unchanged registry cost little more than a stat
+    per package.
+
+    Args:
+        filepath (str): filepath to a dir with 1 or more package.tomls
+        index_path (str): where to keep the index, defaults to a hidden
+            file in filepath
+        full_rebuild (bool): re-parse every package.toml instead of reusing
+            the indexed links; the diff is still against the existing index
+
+    Returns:
+        tuple - (list of all repo links, dict with "added" and "removed"
+            links and "changed" (old, new) link pairs since the last run)
+    """
+    if index_path is None:
+        index_path = os.path.join(os.path.expanduser(filepath), JULIA_INDEX_FILENAME)
+
+    old_entries = _load_julia_index(index_path)
+    new_entries = {}
+    diff = {"added": [], "removed": [], "changed": []}
+
+    for path in iter_all_paths(path_endings=["package.toml"], base=filepath):
+        # key entries relative to the registry so the index is portable
+        key = os.path.relpath(path, filepath)
+        stat = os.stat(path)
+        old_entry = old_entries.get(key)
+        if (
+            old_entry
+            and not full_rebuild
+            and old_entry["mtime_ns"] == stat.st_mtime_ns
+            and old_entry["size"] == stat.st_size
+        ):
+            new_entries[key] = old_entry
+            continue
+
+        with open(path, "rb") as toml_file:
+            content = toml_file.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if old_entry and not full_rebuild and old_entry["sha256"] == digest:
+            repo = old_entry["repo"]
+        else:
+            with profiling.stage("parse_toml"):
+                toml_dict = tomli.loads(content.decode("UTF-8"))
+            repo = extract_repo_link_from_toml_dict(toml_dict)
+            if old_entry is None:
+                diff["added"].append(repo)
+            elif old_entry["repo"] != repo:
+                diff["changed"].append((old_entry["repo"], repo))
+
+        new_entries[key] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": digest,
+            "repo": repo,
+        }
+
+    diff["removed"] = [
+        entry["repo"] for key, entry in old_entries.items() if key not in new_entries
+    ]
+    _save_julia_index(index_path, new_entries)
+
+    links = [entry["repo"] for entry in new_entries.values()]
+    return links, diff
 
-    return links
+
+def _load_julia_index(index_path):
+    """Read index entries, treating a missing or outdated index as empty."""
+    try:
+        with open(index_path, "r") as index_file:
+            index = json.load(index_file)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if index.get("version") != JULIA_INDEX_VERSION:
+        return {}
+    return index["entries"]
+
+
+def _save_julia_index(index_path, entries):
+    """Atomically write index entries to index_path."""
+    directory = os.path.dirname(os.path.abspath(index_path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "w") as index_file:
+        json.dump({"version": JULIA_INDEX_VERSION, "entries": entries}, index_file)
+    os.replace(tmp_path, index_path)
+
+
+def _iter_links_from_tar_stream(archive):
+    """Yield repo links of the package.toml members of an open tar stream."""
+    for member in archive:
+        if member.isfile() and os.path.basename(member.name) == "package.toml":
+            with profiling.stage("parse_toml"):
+                toml_dict = tomli.loads(archive.extractfile(member).read().decode("UTF-8"))
+            yield extract_repo_link_from_toml_dict(toml_dict)
+
+
+def _repo_link_from_path(path):
+    """Parse a package.toml and return its repo link."""
+    return extract_repo_link_from_toml_dict(parse_julia_package_dot_toml(path))
 
 
 def parse_julia_package_dot_toml(filepath):
@@ -38,12 +239,25 @@ def parse_julia_package_dot_toml(filepath):
     Returns:
         dict - the toml file values
     """
-    with open(filepath, "rb") as toml_file:
+    with profiling.stage("parse_toml"), open(filepath, "rb") as toml_file:
         toml_dict = tomli.load(toml_file)
 
     return toml_dict
 
 
+def parse_julia_project_dot_toml(filepath):
+    """List the direct dependencies of a julia Project.toml.
+
+    Args:
+       filepath (str): filepath to a Project.toml file
+
+    Returns:
+        list - names of the packages in its [deps] section
+    """
+    with profiling.stage("parse_manifest"):
+        return list(parse_julia_package_dot_toml(filepath).get("deps", {}))
+
+
 def extract_repo_link_from_toml_dict(toml_dict):
     """Extract the repo (e.g. GitHub) link from the toml dict.
 
@@ -59,6 +273,10 @@ def extract_repo_link_from_toml_dict(toml_dict):
 def find_package_dot_toml_path(pkg, toml_path_list):
     """Find the path for a given julia package to its package.toml
 
+    The package directory name has to match exactly, so ACME does not
+    match the package.toml of ACMEExtras. For many lookups, build an
+    index with build_julia_package_index instead of scanning the list.
+
     Args:
         pkg (str) - name of the julia package
         toml_path_list (str) - paths of all package.toml files to search
@@ -66,5 +284,150 @@ def find_package_dot_toml_path(pkg, toml_path_list):
     Returns:
         str - the relative path to the correct package.toml
     """
-    pkg_path = next(x for x in toml_path_list if pkg in x)
+    pkg_path = next(
+        x for x in toml_path_list if os.path.basename(os.path.dirname(x)) == pkg
+    )
     return pkg_path
+
+
+def build_julia_package_index(filepath):
+    """Map julia package names and uuids to their package.toml paths.
+
+    Uses the registry's Registry.toml when present, which avoids opening
+    every package.toml; otherwise the tree is scanned once.
+
+    Args:
+        filepath (str): filepath to a registry or a dir with package.tomls
+
+    Returns:
+        dict - "by_name" (name -> path) and "by_uuid" (uuid -> path) maps
+    """
+    filepath = os.path.expanduser(filepath)
+    index = {"by_name": {}, "by_uuid": {}}
+
+    registry_toml_path = os.path.join(filepath, "Registry.toml")
+    if os.path.isfile(registry_toml_path):
+        packages = parse_julia_package_dot_toml(registry_toml_path).get("packages", {})
+        for uuid, entry in packages.items():
+            path = os.path.join(filepath, entry["path"], "package.toml")
+            index["by_name"].setdefault(entry["name"], path)
+            index["by_uuid"][uuid] = path
+        return index
+
+    for path in iter_all_paths(path_endings=["package.toml"], base=filepath):
+        toml_dict = parse_julia_package_dot_toml(path)
+        index["by_name"].setdefault(toml_dict["name"], path)
+        index["by_uuid"][toml_dict["uuid"]] = path
+    return index
+
+
+def resolve_julia_dependencies(pkgs, filepath, index=None):
+    """Resolve the transitive dependencies of julia packages in a registry.
+
+    Walks each package's deps.toml breadth first, using the dependency
+    sections that apply to the package's latest registered version (or
+    every section if the package has no versions.toml). Dependencies
+    missing from the registry, such as standard libraries, are reported
+    as not found.
+
+    Args:
+        pkgs (list of str) - names of the top-level julia packages
+        filepath (str) - filepath to the registry
+        index (dict) - prebuilt result of build_julia_package_index
+
+    Returns:
+        dict - closure: list of (name, version) in breadth-first order,
+            edges: list of (name, name) pairs,
+            links: name -> repo link,
+            not_found: names of packages missing from the registry
+    """
+    with profiling.stage("resolve_deps"):
+        return _resolve_julia_dependencies(pkgs, filepath, index)
+
+
+def _resolve_julia_dependencies(pkgs, filepath, index):
+    """Walk the registry for resolve_julia_dependencies."""
+    if index is None:
+        index = build_julia_package_index(filepath)
+
+    closure = []
+    edges = []
+    links = {}
+    not_found = []
+    visited = set()
+
+    # each frontier entry is (parent name or None, name, package.toml path)
+    frontier = [(None, pkg, index["by_name"].get(pkg)) for pkg in pkgs]
+    while frontier:
+        next_frontier = []
+        for parent, name, path in frontier:
+            if path is None:
+                if name not in not_found:
+                    not_found.append(name)
+                continue
+            if parent is not None:
+                edges.append((parent, name))
+            if name in visited:
+                continue
+            visited.add(name)
+
+            package_dir = os.path.dirname(path)
+            links[name] = extract_repo_link_from_toml_dict(
+                parse_julia_package_dot_toml(path)
+            )
+            version = _latest_julia_version(package_dir)
+            closure.append((name, version))
+            for dep_name, dep_uuid in _julia_dependencies(package_dir, version).items():
+                next_frontier.append((name, dep_name, index["by_uuid"].get(dep_uuid)))
+        frontier = next_frontier
+
+    return {"closure": closure, "edges": edges, "links": links, "not_found": not_found}
+
+
+def _latest_julia_version(package_dir):
+    """Return the highest non-yanked version in versions.toml, if any."""
+    versions_path = os.path.join(package_dir, "versions.toml")
+    if not os.path.isfile(versions_path):
+        return None
+    versions = [
+        version
+        for version, entry in parse_julia_package_dot_toml(versions_path).items()
+        if not entry.get("yanked", False)
+    ]
+    if not versions:
+        return None
+    return max(versions, key=_julia_version_tuple)
+
+
+def _julia_dependencies(package_dir, version):
+    """Collect name -> uuid deps from deps.toml sections covering version."""
+    deps_path = os.path.join(package_dir, "deps.toml")
+    if not os.path.isfile(deps_path):
+        return {}
+    deps = {}
+    for version_range, section in parse_julia_package_dot_toml(deps_path).items():
+        if version is None or _julia_range_contains(version_range, version):
+            deps.update(section)
+    return deps
+
+
+def _julia_version_tuple(version):
+    """Convert "1.2.3" (or a partial "1.2") into a tuple of ints."""
+    return tuple(int(part) for part in version.split("+")[0].split("-")[0].split("."))
+
+
+def _julia_range_contains(version_range, version):
+    """Check a registry range such as "0.9-1", "0.8" or "*" for a version.
+
+    Bounds may be partial: the lower bound is padded with zeros and the
+    upper bound covers every version starting with it.
+    """
+    version_range = version_range.strip()
+    if version_range == "*":
+        return True
+    lower, _, upper = version_range.partition("-")
+    version = _julia_version_tuple(version)
+    # tuples compare a missing trailing part as smaller, which pads lower
+    lower = _julia_version_tuple(lower.strip())
+    upper = _julia_version_tuple(upper.strip()) if upper.strip() else lower
+    return lower <= version and version[: len(upper)] <= upper
@@ -0,0 +1,581 @@
+"""Reading the resolved package sets recorded in lockfiles.
+
+A lockfile already pins every transitive dependency, so reading it
+replaces dependency resolution entirely. npm lockfiles are read
+incrementally: package-lock.json is scanned with a streaming JSON
+reader that decodes one package entry at a time, and yarn.lock and
+pnpm-lock.yaml are read line by line, so 50MB+ lockfiles are never
+loaded as a whole. Python lockfiles are TOML, except Pipfile.lock which
+is streamed like package-lock.json.
+"""
+
+import json
+import os
+import re
+
+import tomli
+
+
+# in the order they are preferred when a directory has several
+NPM_LOCKFILES = ("npm-shrinkwrap.json", "package-lock.json", "yarn.lock", "pnpm-lock.yaml")
+# Python manifest -> the lockfiles pinning it, most preferred first
+PYTHON_LOCKFILES = {
+    "Pipfile": ("Pipfile.lock",),
+    "pyproject.toml": ("poetry.lock", "uv.lock", "pdm.lock"),
+}
+CHUNK_SIZE = 1 << 16
+
+_NON_WHITESPACE = re.compile(r"\S")
+_STRUCTURE = re.compile(r'["\[\]{}]')
+# the rest of a JSON string after its opening quote
+_STRING_END = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+# "  version "1.2.3"" in yarn v1, "  version: 1.2.3" in yarn berry
+_YARN_VERSION = re.compile(r'^  version:? +"?([^"\s]+)"?\s*$')
+# header of requirements files written by pip-compile or uv pip compile
+_COMPILED_HEADER = re.compile(r"^#.*autogenerated by (pip-compile|uv)")
+# "name[extras]==version" at the start of a requirement line
+_PINNED_REQUIREMENT = re.compile(
+    r"^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[[^\]]*\])?\s*==\s*([^\s;\\]+)"
+)
+# "name[extras]" at the start of a PEP 508 string or a poetry extras entry
+_REQUIREMENT_NAME = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[([^\]]*)\])?")
+
+
+def find_lockfile(directory, names):
+    """Return the first of several lockfiles present in a directory.
+
+    Args:
+        directory (str) - directory to look in
+        names (tuple of str) - lockfile names, most preferred first
+
+    Returns:
+        str - the lockfile path, None if there is none
+    """
+    for name in names:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def iter_npm_lockfile(filepath):
+    """Read any npm, yarn or pnpm lockfile, chosen by its file name.
+
+    Args:
+        filepath (str) - path to one of NPM_LOCKFILES
+
+    Yields:
+        tuple - (package name, version) of every locked package
+    """
+    name = os.path.basename(filepath)
+    if name == "yarn.lock":
+        yield from iter_yarn_lock_packages(filepath)
+    elif name == "pnpm-lock.yaml":
+        yield from iter_pnpm_lock_packages(filepath)
+    else:
+        yield from iter_package_lock_packages(filepath)
+
+
+def iter_package_lock_packages(filepath):
+    """Stream the packages of a package-lock.json or npm-shrinkwrap.json.
+
+    Version 2 and 3 lockfiles list every installed package under
+    "packages", keyed by its node_modules path; version 1 lockfiles nest
+    them under "dependencies". Development-only packages, workspace
+    links and the root project are skipped.
+
+    Args:
+        filepath (str) - path to the lockfile
+
+    Yields:
+        tuple - (package name, version) of every locked package
+    """
+    lockfile_version = 1
+    with open(filepath, "r", encoding="UTF-8") as lock_file:
+        stream = _JsonStream(lock_file)
+        for key in stream.items():
+            if key == "lockfileVersion":
+                lockfile_version = stream.value()
+            elif key == "packages":
+                for path in stream.items():
+                    entry = stream.value()
+                    if "node_modules/" not in path or entry.get("link") or entry.get("dev"):
+                        continue
+                    name = entry.get("name") or path.rpartition("node_modules/")[2]
+                    yield name, entry.get("version")
+                # "packages" is complete, the rest only repeats it
+                return
+            elif key == "dependencies" and lockfile_version < 2:
+                for name in stream.items():
+                    yield from _iter_v1_dependency(name, stream.value())
+            else:
+                stream.skip()
+
+
+def _iter_v1_dependency(name, entry):
+    """Yield a version 1 lockfile entry and its nested dependencies."""
+    if not entry.get("dev"):
+        version = entry.get("version")
+        # aliases are locked as "npm:real-name@version"
+        if version and version.startswith("npm:"):
+            name, _, version = version[len("npm:"):].rpartition("@")
+        yield name, version
+    for child_name, child_entry in (entry.get("dependencies") or {}).items():
+        yield from _iter_v1_dependency(child_name, child_entry)
+
+
+def iter_yarn_lock_packages(filepath):
+    """Stream the packages of a yarn.lock, classic (v1) or berry.
+
+    Args:
+        filepath (str) - path to the lockfile
+
+    Yields:
+        tuple - (package name, version) of every locked package
+    """
+    name = None
+    with open(filepath, "r", encoding="UTF-8") as lock_file:
+        for line in lock_file:
+            if not line.strip() or line.startswith("#"):
+                continue
+            if not line[0].isspace():
+                # e.g. '"@babel/core@^7.0.0", "@babel/core@^7.1.0":'
+                spec = line.rstrip().rstrip(":").split(",")[0].strip().strip('"')
+                name = _yarn_spec_name(spec)
+                continue
+            match = _YARN_VERSION.match(line) if name else None
+            if match:
+                yield name, match.group(1)
+                name = None
+
+
+def _yarn_spec_name(spec):
+    """Return the package of a yarn.lock entry, None for non-packages."""
+    at = spec.find("@", 1)
+    if at < 0 or spec[at + 1:].startswith(("workspace:", "link:", "portal:")):
+        return None
+    return spec[:at]
+
+
+def iter_pnpm_lock_packages(filepath):
+    """Stream the packages of a pnpm-lock.yaml (lockfile version 5 to 9).
+
+    Only the top-level "packages" section is read, line by line, so the
+    YAML document is never parsed as a whole. Packages marked dev: true
+    are skipped.
+
+    Args:
+        filepath (str) - path to the lockfile
+
+    Yields:
+        tuple - (package name, version) of every locked package
+    """
+    lockfile_version = 9.0
+    section = None
+    key = None
+    dev = False
+    with open(filepath, "r", encoding="UTF-8") as lock_file:
+        for line in lock_file:
+            stripped = line.strip()
+            if not stripped or stripped.startswith("#"):
+                continue
+            indent = len(line) - len(line.lstrip(" "))
+            if indent == 0 or (indent == 2 and stripped.endswith(":")):
+                if key is not None and not dev:
+                    yield _parse_pnpm_key(key, lockfile_version)
+                key = None
+            if indent == 0:
+                section, _, value = stripped.partition(":")
+                if section == "lockfileVersion":
+                    lockfile_version = float(value.strip().strip("'\""))
+            elif section == "packages" and indent == 2 and stripped.endswith(":"):
+                key = stripped[:-1].strip("'\"")
+                dev = False
+            elif key is not None and indent == 4 and stripped == "dev: true":
+                dev = True
+        if key is not None and not dev:
+            yield _parse_pnpm_key(key, lockfile_version)
+
+
+def _parse_pnpm_key(key, lockfile_version):
+    """Split a pnpm package key into (name, version).
+
+    Keys look like /name/1.0.0_peer@2 (version 5), /name@1.0.0(peer@2)
+    (version 6) and name@1.0.0(peer@2) (version 9).
+    """
+    key = key.lstrip("/")
+    if lockfile_version < 6:
+        name, _, version = key.rpartition("/")
+        return name, version.split("_")[0]
+    key = key.split("(")[0]
+    at = key.find("@", 1)
+    return key[:at], key[at + 1:]
+
+
+def iter_python_lockfile(filepath):
+    """Read a Pipfile.lock, poetry.lock, uv.lock, pdm.lock or compiled requirements file.
+
+    Args:
+        filepath (str) - path to the lockfile, see find_python_lockfile
+
+    Yields:
+        tuple - (package name, version) of every locked package
+    """
+    name = os.path.basename(filepath)
+    if name == "Pipfile.lock":
+        yield from iter_pipfile_lock_packages(filepath)
+    elif name.endswith(".lock"):
+        yield from iter_toml_lock_packages(filepath)
+    else:
+        yield from iter_compiled_requirements(filepath)
+
+
+def find_python_lockfile(filepath):
+    """Find the lockfile pinning a Python manifest's whole dependency tree.
+
+    A Pipfile is pinned by its Pipfile.lock and a pyproject.toml by a
+    poetry.lock, uv.lock or pdm.lock; a requirements file pins its own
+    tree when pip-compile or uv pip compile wrote it.
+
+    Args:
+        filepath (str) - manifest or lockfile path
+
+    Returns:
+        str - the lockfile path, None if the manifest is not locked
+    """
+    name = os.path.basename(filepath)
+    if name == "Pipfile.lock" or name in PYTHON_LOCKFILES["pyproject.toml"]:
+        return filepath
+    if name in PYTHON_LOCKFILES:
+        return find_lockfile(os.path.dirname(filepath), PYTHON_LOCKFILES[name])
+    return filepath if is_compiled_requirements(filepath) else None
+
+
+def iter_pipfile_lock_packages(filepath):
+    """Stream the default (non-development) packages of a Pipfile.lock.
+
+    Args:
+        filepath (str) - path to the lockfile
+
+    Yields:
+        tuple - (package name, version) of every locked package, the
+            version None for VCS and path requirements
+    """
+    with open(filepath, "r", encoding="UTF-8") as lock_file:
+        stream = _JsonStream(lock_file)
+        for key in stream.items():
+            if key != "default":
+                stream.skip()
+                continue
+            for name in stream.items():
+                version = stream.value().get("version", "")
+                yield name, version.lstrip("=") or None
+
+
+def iter_toml_lock_packages(filepath):
+    """Read the [[package]] tables of a poetry.lock, uv.lock or pdm.lock.
+
+    The project itself (uv's editable or virtual source) and packages
+    only locked for development are skipped. Poetry before 1.5 marks
+    those with a dev category, Poetry 2 and pdm with groups lacking
+    "main"/"default". uv.lock and Poetry 1.5-1.8 locks record neither,
+    so there only the packages reachable from the project's runtime
+    dependencies are kept: uv's root package lists them, for a
+    poetry.lock they are read from the pyproject.toml next to it (if
+    that is missing, every package is reported).
+
+    Args:
+        filepath (str) - path to the lockfile
+
+    Yields:
+        tuple - (package name, version) of every locked package
+    """
+    with open(filepath, "rb") as lock_file:
+        lock = tomli.load(lock_file)
+    packages = lock.get("package", [])
+    roots = _lock_roots(filepath, packages)
+    runtime = None if roots is None else _reachable_packages(packages, roots)
+    for package in packages:
+        source = package.get("source", {})
+        if "editable" in source or "virtual" in source:
+            continue
+        if package.get("category", "main") != "main":
+            continue
+        if not {"main", "default"} & set(package.get("groups", ["main"])):
+            continue
+        if runtime is not None and _normalize_name(package["name"]) not in runtime:
+            continue
+        yield package["name"], package.get("version")
+
+
+def _normalize_name(name):
+    """Normalize a package or extra name as in PEP 503."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def _lock_roots(filepath, packages):
+    """List the project's runtime dependencies when a TOML lock has no groups.
+
+    Args:
+        filepath (str) - path to the lockfile
+        packages (list of dict) - its [[package]] tables
+
+    Returns:
+        list - (name, extras) pairs, None when the lock marks development
+        packages itself or the project's dependencies are unknown
+    """
+    if any("category" in package or "groups" in package for package in packages):
+        return None
+    projects = [
+        package
+        for package in packages
+        if {"editable", "virtual"} & set(package.get("source", {}))
+    ]
+    if projects:
+        return [root for project in projects for root in _locked_dependencies(project)]
+    pyproject_path = os.path.join(os.path.dirname(filepath), "pyproject.toml")
+    if os.path.basename(filepath) != "poetry.lock" or not os.path.isfile(pyproject_path):
+        return None
+    with open(pyproject_path, "rb") as toml_file:
+        pyproject = tomli.load(toml_file)
+    roots = []
+    for spec in pyproject.get("project", {}).get("dependencies", []):
+        match = _REQUIREMENT_NAME.match(spec)
+        if match:
+            roots.append((match.group(1), (match.group(2) or "").split(",")))
+    poetry_dependencies = pyproject.get("tool", {}).get("poetry", {}).get("dependencies", {})
+    for name, constraint in poetry_dependencies.items():
+        if name.lower() != "python" and not _poetry_optional(constraint):
+            roots.append((name, _poetry_extras(constraint)))
+    return roots
+
+
+def _reachable_packages(packages, roots):
+    """Walk a TOML lock's dependency graph from the project's dependencies.
+
+    Args:
+        packages (list of dict) - the lock's [[package]] tables
+        roots (list) - (name, extras) pairs to start from
+
+    Returns:
+        set - normalized names of every package reached
+    """
+    by_name = {}
+    for package in packages:
+        by_name.setdefault(_normalize_name(package["name"]), []).append(package)
+    reached = set()
+    enabled = set()
+    pending = list(roots)
+    while pending:
+        name, extras = pending.pop()
+        key = _normalize_name(name)
+        if key not in by_name:
+            continue
+        extras = {_normalize_name(extra) for extra in extras if extra.strip()}
+        extras -= {extra for pkg, extra in enabled if pkg == key}
+        enabled.update((key, extra) for extra in extras)
+        for package in by_name[key]:
+            if key not in reached:
+                pending.extend(_locked_dependencies(package))
+            for extra in extras:
+                pending.extend(_locked_dependencies(package, extra))
+        reached.add(key)
+    return reached
+
+
+def _locked_dependencies(package, extra=None):
+    """List the (name, extras) dependencies of a uv or poetry [[package]] table.
+
+    Args:
+        package (dict) - the [[package]] table
+        extra (str) - list what this extra adds instead of the base dependencies
+
+    Returns:
+        list - (name, extras) pairs
+    """
+    dependencies = package.get("dependencies", [])
+    if isinstance(dependencies, list):
+        # uv: [{name, extra}], extras in [package.optional-dependencies]
+        if extra is not None:
+            optional = package.get("optional-dependencies", {})
+            dependencies = next(
+                (deps for name, deps in optional.items() if _normalize_name(name) == extra), []
+            )
+        return [(dep["name"], dep.get("extra", [])) for dep in dependencies]
+    # poetry: {name: constraint}, optional ones enabled through [package.extras]
+    constraints = {_normalize_name(name): value for name, value in dependencies.items()}
+    if extra is None:
+        names = [name for name, value in dependencies.items() if not _poetry_optional(value)]
+    else:
+        specs = next(
+            (
+                specs
+                for name, specs in package.get("extras", {}).items()
+                if _normalize_name(name) == extra
+            ),
+            [],
+        )
+        names = [match.group(1) for match in map(_REQUIREMENT_NAME.match, specs) if match]
+    return [(name, _poetry_extras(constraints.get(_normalize_name(name)))) for name in names]
+
+
+def _poetry_constraints(constraint):
+    """List the tables of a poetry dependency given as a string, table or list."""
+    if isinstance(constraint, dict):
+        return [constraint]
+    if isinstance(constraint, list):
+        return [item for item in constraint if isinstance(item, dict)]
+    return []
+
+
+def _poetry_optional(constraint):
+    """Return whether a poetry dependency is only installed through an extra."""
+    tables = _poetry_constraints(constraint)
+    return bool(tables) and all(table.get("optional") for table in tables)
+
+
+def _poetry_extras(constraint):
+    """List the extras a poetry dependency requests."""
+    return [extra for table in _poetry_constraints(constraint) for extra in table.get("extras", [])]
+
+
+def is_compiled_requirements(filepath):
+    """Return whether pip-compile or uv pip compile wrote a requirements file."""
+    with open(filepath, "r", encoding="UTF-8") as requirements_file:
+        for line in requirements_file:
+            if not line.startswith("#"):
+                return False
+            if _COMPILED_HEADER.match(line):
+                return True
+    return False
+
+
+def iter_compiled_requirements(filepath):
+    """Read the name==version pins of a compiled requirements file.
+
+    Args:
+        filepath (str) - path to a requirements file written by
+            pip-compile or uv pip compile
+
+    Yields:
+        tuple - (package name, version) of every pinned requirement
+    """
+    with open(filepath, "r", encoding="UTF-8") as requirements_file:
+        for line in requirements_file:
+            match = _PINNED_REQUIREMENT.match(line)
+            if match:
+                yield match.group(1), match.group(2)
+
+
+class _JsonStream:
+    """Decode a large JSON document piece by piece.
+
+    items() walks the keys of an object; after each key the caller
+    consumes its value with value(), skip() or a nested items().
+
+    Args:
+        file (file) - text file positioned at the document
+        chunk_size (int) - characters read at a time
+    """
+
+    def __init__(self, file, chunk_size=CHUNK_SIZE):
+        self._file = file
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self):
+        """Read another chunk, dropping what was consumed; False at EOF."""
+        if self._eof:
+            return False
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        """Return the next non-whitespace character, empty at EOF."""
+        while True:
+            match = _NON_WHITESPACE.search(self._buffer, self._pos)
+            if match:
+                self._pos = match.start()
+                return match.group()
+            self._pos = len(self._buffer)
+            if not self._fill():
+                return ""
+
+    def _expect(self, char):
+        """Consume one structural character."""
+        if self._peek() != char:
+            raise ValueError(f"expected {char!r} in JSON document")
+        self._pos += 1
+
+    def value(self):
+        """Decode and return the next value."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # a number at the end of the buffer may continue in the next chunk
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def skip(self):
+        """Consume the next value without decoding it."""
+        if self._peek() not in ("[", "{"):
+            self.value()
+            return
+        depth = 0
+        while True:
+            match = _STRUCTURE.search(self._buffer, self._pos)
+            if match is None:
+                self._pos = len(self._buffer)
+                if not self._fill():
+                    raise ValueError("unexpected end of JSON document")
+                continue
+            if match.group() == '"':
+                end = _STRING_END.match(self._buffer, match.end())
+                if end is None:
+                    # the string continues in the next chunk
+                    self._pos = match.start()
+                    if not self._fill():
+                        raise ValueError("unexpected end of JSON document")
+                    continue
+                self._pos = end.end()
+                continue
+            self._pos = match.end()
+            depth += 1 if match.group() in "[{" else -1
+            if depth == 0:
+                return
+
+    def items(self):
+        """Iterate over the keys of the next object.
+
+        Yields:
+            str - each key, after which its value must be consumed
+        """
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self._expect(":")
+            yield key
+            char = self._peek()
+            self._pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError("expected ',' or '}' in JSON document")
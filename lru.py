@@ -0,0 +1,157 @@
+"""Bounded in-memory caches for registry metadata and resolutions.
+
+A one-off run keeps everything it retrieved until it exits, so the
+caches are unbounded by default. A long-running process (see serve.py)
+calls configure() to cap the entries of every cache, evicting the least
+recently used ones, and to expire entries so registry updates are seen.
+"""
+
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+
+_settings = {"max_entries": None, "ttl": None}
+_caches = weakref.WeakSet()
+_lock = threading.Lock()
+
+
+class LruCache:
+    """Mapping that evicts its least recently used entries.
+
+    Supports the dict operations the metadata caches use: in, [],
+    setdefault and clear. A lookup that finds nothing stored is a miss
+    and returning a stored entry is a hit.
+
+    Args:
+        name (str) - what the cache holds, as reported by stats()
+        max_entries (int) - size cap, None for no cap
+        ttl (float) - seconds an entry is kept, None to keep it until
+            evicted
+    """
+
+    def __init__(self, name, max_entries=None, ttl=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+            return entry is not None
+
+    def __getitem__(self, key):
+        with self._lock:
+            value = self._entries[key][1]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def setdefault(self, key, value):
+        """Return the value stored under key, storing value if there is none."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][1]
+            self._store(key, value)
+            return value
+
+    def clear(self):
+        """Forget every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def resize(self, max_entries=None, ttl=None):
+        """Change the size cap and entry lifetime, evicting what no longer fits."""
+        with self._lock:
+            self.max_entries = max_entries
+            self.ttl = ttl
+            self._evict()
+
+    def _store(self, key, value):
+        """Store an entry, evicting the least recently used ones over the cap."""
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        """Drop the least recently used entries until the cap is met."""
+        while self.max_entries is not None and len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+def memory_cache(name):
+    """Create a cache bounded by the configured size cap and entry lifetime.
+
+    Args:
+        name (str) - what the cache holds, as reported by stats()
+
+    Returns:
+        LruCache
+    """
+    with _lock:
+        cache = LruCache(name, **_settings)
+        _caches.add(cache)
+    return cache
+
+
+def configure(max_entries=None, ttl=None):
+    """Bound every cache, including the ones created later.
+
+    Args:
+        max_entries (int) - entries kept per cache, None for no cap
+        ttl (float) - seconds an entry is kept, None to keep it until
+            evicted
+
+    Returns:
+        None
+    """
+    with _lock:
+        _settings["max_entries"] = max_entries
+        _settings["ttl"] = ttl
+        caches = list(_caches)
+    for cache in caches:
+        cache.resize(max_entries, ttl)
+
+
+def stats():
+    """Summarize the live caches, adding up the ones sharing a name.
+
+    Returns:
+        dict - name -> entries, hits, misses, evictions and hit_rate
+    """
+    with _lock:
+        caches = list(_caches)
+    summary = {}
+    for cache in caches:
+        counters = summary.setdefault(
+            cache.name, {"entries": 0, "hits": 0, "misses": 0, "evictions": 0}
+        )
+        counters["entries"] += len(cache)
+        counters["hits"] += cache.hits
+        counters["misses"] += cache.misses
+        counters["evictions"] += cache.evictions
+    for counters in summary.values():
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = round(counters["hits"] / lookups, 4) if lookups else None
+    return dict(sorted(summary.items()))
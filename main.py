@@ -1,20 +1,29 @@
 """Implement CLI for deps2repos"""
 
 import argparse
+import atexit
+import json
 import logging
+import os
 
-from julia import generate_julia_source_links
-from npm import js_package_dot_json_analysis, js_txt_file_analysis
-from pypi import python_requirements_dot_text_analysis
+import fetch
+import profiling
+from constants import (
+    DEFAULT_CACHE_PATH,
+    DEFAULT_RESULTS_PATH,
+    DEFAULT_TTL,
+    GRAPH_FORMATS,
+    QUERIES,
+    RESOLVERS,
+)
+from output import FIELDS, FORMATS, make_record, open_sink
 
-
-root = logging.getLogger()
-root.setLevel(logging.INFO)
-
-ch = logging.StreamHandler()
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-ch.setFormatter(formatter)
-root.addHandler(ch)
+# the ecosystem modules, and with them requests, requirements-parser,
+# packaging, tomli and ruamel.yaml, are imported by the pipeline that
+# needs them, so a run only pays for the ecosystems it analyzes; the
+# response cache, dependency graph and results store are likewise only
+# imported when their options are given
+# pylint: disable=import-outside-toplevel
 
 
 def parse_command_line_arguments():
@@ -26,17 +35,93 @@ def parse_command_line_arguments():
     parser.add_argument(
         "--python",
         default=False,  # default value is False
-        help="Convert requirements.txt file into GitHub links.",
+        help="Convert Python dependencies into GitHub links. Accepts a requirements.txt, "
+        "pyproject.toml, Pipfile, lockfile or project directory; a Pipfile.lock, poetry.lock, "
+        "uv.lock or pdm.lock pinning the manifest, or a requirements file compiled by "
+        "pip-compile or uv, is read instead of resolving dependencies.",
     )
     parser.add_argument(
         "--javascript",
         default=False,  # default value is False
-        help="Convert npm packages into GitHub links.",
+        help="Convert npm packages into GitHub links. Accepts a package.json, a directory, "
+        "a .txt list or a lockfile; a package-lock.json, npm-shrinkwrap.json, yarn.lock or "
+        "pnpm-lock.yaml next to the package.json is read instead of resolving it.",
     )
     parser.add_argument(
         "--julia",
         default=False,  # default value is False
-        help="Convert julia packages into source links.",
+        help="Convert julia packages into source links. Accepts a directory, "
+        "a registry tarball or, with --julia_git_ref, a registry git repository.",
+    )
+    parser.add_argument(
+        "--julia_processes",
+        type=int,
+        default=None,
+        help="Number of processes used to parse Julia package.toml files.",
+    )
+    parser.add_argument(
+        "--julia_git_ref",
+        default=None,
+        help="Read the Julia registry from this git revision instead of the working tree.",
+    )
+    parser.add_argument(
+        "--julia_deps",
+        default=None,
+        help="Comma-separated Julia packages whose transitive dependencies are "
+        "resolved against the registry given with --julia.",
+    )
+    parser.add_argument(
+        "--julia_incremental",
+        action="store_true",
+        help="Only re-parse package.toml files changed since the last indexed run.",
+    )
+    parser.add_argument(
+        "--julia_index",
+        default=None,
+        help="Location of the incremental Julia index (implies --julia_incremental). "
+        "Defaults to a hidden file inside the registry directory.",
+    )
+    parser.add_argument(
+        "--julia_full_rebuild",
+        action="store_true",
+        help="Re-parse every package.toml instead of reusing the incremental Julia "
+        "index; --julia_diff still compares against the previous index.",
+    )
+    parser.add_argument(
+        "--julia_diff",
+        action="store_true",
+        help="Print the repo links added, removed and changed since the last "
+        "indexed run instead of every link.",
+    )
+    parser.add_argument(
+        "--conda",
+        default=False,
+        help="Convert a directory of conda recipes (meta.yaml) into GitHub links.",
+    )
+    parser.add_argument(
+        "--conda_processes",
+        type=int,
+        default=None,
+        help="Number of processes used to render and parse conda recipes.",
+    )
+    parser.add_argument(
+        "--bulk",
+        nargs="+",
+        default=None,
+        help="Analyze many requirements.txt, package.json and Project.toml files "
+        "(or directories containing them) at once, looking up each unique "
+        "package only once. Records name their manifest.",
+    )
+    parser.add_argument(
+        "--bulk_julia_registry",
+        default=None,
+        help="Julia registry checkout used to resolve Project.toml files in --bulk.",
+    )
+    parser.add_argument(
+        "--bulk_summary",
+        default=None,
+        help="JSON file to write the --bulk repos of every manifest and their "
+        "org-wide union to.",
     )
     parser.add_argument(
         "--no_deps",
@@ -44,29 +129,529 @@ def parse_command_line_arguments():
         action="store_true",
         help="Whether to also analyze transitive dependencies.",
     )
+    parser.add_argument(
+        "--resolver",
+        choices=RESOLVERS,
+        default="builtin",
+        help="How Python dependencies are resolved: in-process from PyPI metadata "
+        "(builtin), by running pipgrip per requirement (pipgrip) or by running "
+        "pipgrip once for the whole file (pipgrip-batch).",
+    )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="text",
+        help="Output format: unique repository links (text) or one record per "
+        "package with ecosystem, package, version, repo_url, status and latency "
+        "(jsonl, csv). Records are written as soon as each lookup completes.",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="File to write results to instead of stdout.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=fetch.DEFAULT_CONCURRENCY,
+        help="Maximum number of registry lookups in flight at once.",
+    )
+    parser.add_argument(
+        "--per_host_limit",
+        type=int,
+        default=fetch.DEFAULT_PER_HOST_LIMIT,
+        help="Maximum number of concurrent requests to a single registry host.",
+    )
+    parser.add_argument(
+        "--connect_timeout",
+        type=float,
+        default=fetch.DEFAULT_TIMEOUT[0],
+        help="Seconds to wait for a connection to a registry.",
+    )
+    parser.add_argument(
+        "--read_timeout",
+        type=float,
+        default=fetch.DEFAULT_TIMEOUT[1],
+        help="Seconds to wait for a registry to send more data.",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=fetch.DEFAULT_RETRIES,
+        help="Times a request is retried after a timeout, connection error, "
+        "429 or 5xx answer, with exponential backoff honoring Retry-After.",
+    )
+    parser.add_argument(
+        "--rate_limit",
+        type=float,
+        default=None,
+        help="Maximum requests per second to a single registry host.",
+    )
+    parser.add_argument(
+        "--cache_path",
+        default=DEFAULT_CACHE_PATH,
+        help="SQLite file in which registry responses are cached.",
+    )
+    parser.add_argument(
+        "--cache_ttl",
+        type=float,
+        default=DEFAULT_TTL,
+        help="Seconds a cached registry response is used without revalidation.",
+    )
+    parser.add_argument(
+        "--cache_max_mb",
+        type=int,
+        default=1024,
+        help="Size cap of the response cache; least recently used entries are evicted.",
+    )
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Do not read or write the registry response cache.",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Answer registry lookups from the cache only.",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Revalidate every cached registry response with the registry.",
+    )
+    parser.add_argument(
+        "--cache_stats",
+        action="store_true",
+        help="Print response cache statistics after the run.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time every pipeline stage and registry request and print a summary "
+        "table (stage timers, per-host request counts, bytes and latencies, "
+        "cache hit rates) to stderr after the run.",
+    )
+    parser.add_argument(
+        "--profile_output",
+        default=None,
+        help="File to write the profile to, as JSON or as a Chrome trace (see "
+        "--profile_format). Implies profiling.",
+    )
+    parser.add_argument(
+        "--profile_format",
+        choices=profiling.PROFILE_FORMATS,
+        default="json",
+        help="Format of --profile_output: a JSON summary, or a Chrome trace with "
+        "one event per stage and request (open in chrome://tracing or Perfetto).",
+    )
+    parser.add_argument(
+        "--graph_output",
+        default=None,
+        help="File to export the resolved dependency graph of the --bulk, --python, "
+        "--javascript and --julia_deps runs to, with each node's fan-in, transitive "
+        "reach and PageRank (see --graph_format).",
+    )
+    parser.add_argument(
+        "--graph_format",
+        choices=GRAPH_FORMATS,
+        default="graphml",
+        help="Format of --graph_output: GraphML, Parquet node and edge tables "
+        "(needs pyarrow), or a tab-separated edge list.",
+    )
+    parser.add_argument(
+        "--graph_rank",
+        type=int,
+        default=0,
+        help="Print the given number of most critical repositories, ranked by the "
+        "PageRank of their packages in the dependency graph, to stderr after the run.",
+    )
+    parser.add_argument(
+        "--snapshot",
+        default=None,
+        help="Resolve PyPI and npm packages from this local registry snapshot "
+        "(a directory of JSON files or a .sqlite file) instead of the network.",
+    )
+    parser.add_argument(
+        "--snapshot_build",
+        default=None,
+        help="Record every PyPI and npm document retrieved during the run into "
+        "this snapshot (a directory, or a .sqlite file).",
+    )
+    parser.add_argument(
+        "--snapshot_import_bigquery",
+        default=None,
+        help="Import a PyPI BigQuery distribution_metadata JSONL export into the "
+        "--snapshot_build snapshot.",
+    )
+    parser.add_argument(
+        "--results_db",
+        nargs="?",
+        const=DEFAULT_RESULTS_PATH,
+        default=None,
+        help="Record every result of the run, with its manifest, in this SQLite "
+        f"results store ({DEFAULT_RESULTS_PATH} if no file is given) for the "
+        "query subcommand.",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    query = subparsers.add_parser(
+        "query",
+        help="Answer questions from the --results_db store without touching any registry.",
+        description="Answer questions from the results store recorded with --results_db: "
+        "which manifests depend on a repository (dependents), which repositories a "
+        "manifest depends on (repos), what was first seen after a scan (new) and "
+        "which scans were recorded (scans).",
+    )
+    query.add_argument("question", choices=QUERIES, help="What to ask the results store.")
+    query.add_argument(
+        "subject",
+        nargs="?",
+        default=None,
+        help="Repository URL for dependents, manifest path for repos.",
+    )
+    query.add_argument(
+        "--since",
+        type=int,
+        default=None,
+        help="For new, the scan id after which results count as new. Defaults to the "
+        "scan before the latest one.",
+    )
+    # given after the subcommand, or before it like in recording runs
+    query.add_argument(
+        "--results_db",
+        default=argparse.SUPPRESS,
+        help=f"SQLite results store to query, {DEFAULT_RESULTS_PATH} by default.",
+    )
+    query.add_argument("--format", choices=FORMATS, default=argparse.SUPPRESS)
+    query.add_argument("--output", default=argparse.SUPPRESS)
+    serve = subparsers.add_parser(
+        "serve",
+        help="Keep the backends and their caches resident and answer manifests over HTTP.",
+        description="Answer manifests sent to a local HTTP port or Unix socket with "
+        "resident backends and warm caches: POST /scan?filename=requirements.txt with the "
+        "manifest as body (or POST /scan?path=... for a local manifest) streams JSON "
+        "records back, GET /stats answers cache hit rates and latencies. The registry, "
+        "cache and snapshot options given before serve apply to every request.",
+    )
+    serve.add_argument("--host", default="127.0.0.1", help="Address to listen on.")
+    serve.add_argument("--port", type=int, default=8765, help="TCP port to listen on.")
+    serve.add_argument(
+        "--socket", default=None, help="Listen on this Unix socket instead of a TCP port."
+    )
+    serve.add_argument(
+        "--julia_registry",
+        default=None,
+        help="Julia registry checkout used to resolve Project.toml manifests.",
+    )
+    serve.add_argument(
+        "--max_entries",
+        type=int,
+        default=100000,
+        help="Entries kept in each in-memory metadata and resolution cache; least "
+        "recently used entries are evicted.",
+    )
+    serve.add_argument(
+        "--max_age",
+        type=float,
+        default=DEFAULT_TTL,
+        help="Seconds in-memory metadata and resolutions are reused before they are "
+        "retrieved again.",
+    )
     return parser.parse_args()
 
 
-if __name__ == "__main__":
+def _configure_logging():
+    """Send INFO and above to stderr with timestamps."""
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+
+    ch = logging.StreamHandler()
+    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    ch.setFormatter(formatter)
+    root.addHandler(ch)
+
+
+def _run_bulk(args, sink, graph):
+    """Analyze many manifests, looking up each unique package once."""
+    from bulk import analyze_manifests
+
+    results = analyze_manifests(
+        args.bulk, args.no_deps, julia_registry=args.bulk_julia_registry, sink=sink, graph=graph
+    )
+    if args.bulk_summary:
+        summary = {
+            "manifests": {
+                path: [record["repo_url"] for record in records if record["repo_url"]]
+                for path, records in results["manifests"].items()
+            },
+            "union": results["union"],
+        }
+        with open(args.bulk_summary, "w") as summary_file:
+            json.dump(summary, summary_file, indent=2)
+
+
+def _run_python(args, sink, graph):
+    """Parse a Python manifest or lockfile and generate GitHub links."""
+    from pypi import PYTHON_MANIFESTS, python_requirements_dot_text_analysis
+
+    filepath = args.python
+    if os.path.isdir(filepath):
+        manifests = [os.path.join(filepath, name) for name in PYTHON_MANIFESTS]
+        filepath = next((path for path in manifests if os.path.isfile(path)), manifests[0])
+    python_requirements_dot_text_analysis(
+        filepath, args.no_deps, resolver=args.resolver, sink=sink, graph=graph
+    )
+
+
+def _run_javascript(args, sink, graph):
+    """Parse a package.json, lockfile or .txt list of npm packages and generate GitHub links."""
+    from backends import lookup_records
+    from lockfiles import NPM_LOCKFILES
+    from npm import NpmBackend, js_package_dot_json_analysis, parse_npm_txt_file
+
+    filepath = args.javascript
+    if os.path.isdir(filepath):
+        filepath = os.path.join(filepath, "package.json")
+    if filepath.lower().endswith(".json") or os.path.basename(filepath) in NPM_LOCKFILES:
+        js_package_dot_json_analysis(filepath, args.no_deps, sink=sink, graph=graph)
+    elif filepath.lower().endswith(".txt"):
+        pkgs = parse_npm_txt_file(args.javascript)
+        lookup_records(NpmBackend(), ((pkg, None) for pkg in pkgs), sink, graph)
+
+
+def _run_julia(args, sink, graph):
+    """Parse julia package.tomls and write source links as they are found."""
+    import tarfile
+
+    from backends import lookup_records
+    from julia import (
+        JuliaBackend,
+        iter_julia_source_links,
+        iter_julia_source_links_from_git,
+        iter_julia_source_links_from_tarball,
+        update_julia_index,
+    )
+
+    if args.julia_deps:
+        backend = JuliaBackend(args.julia)
+        pkgs = backend.resolve(dict.fromkeys(args.julia_deps.split(",")), graph=graph)
+        lookup_records(backend, pkgs.items(), sink, graph)
+        links = []
+    elif args.julia_incremental or args.julia_index or args.julia_diff:
+        links, diff = update_julia_index(
+            args.julia, args.julia_index, full_rebuild=args.julia_full_rebuild
+        )
+        if args.julia_diff:
+            # a diff is not a set of package records, so it is always text
+            for link in diff["added"]:
+                print(f"+ {link}")
+            for link in diff["removed"]:
+                print(f"- {link}")
+            for old, new in diff["changed"]:
+                print(f"~ {old} -> {new}")
+            links = []
+    elif args.julia_git_ref:
+        links = iter_julia_source_links_from_git(args.julia, args.julia_git_ref)
+    elif os.path.isfile(args.julia) and tarfile.is_tarfile(args.julia):
+        links = iter_julia_source_links_from_tarball(args.julia)
+    else:
+        links = iter_julia_source_links(args.julia, processes=args.julia_processes)
+    # the link scans read package.toml repo fields only, without names
+    for link in links:
+        sink.write(make_record("julia", None, repo_url=link))
+
+
+def _run_conda(args, sink, graph):  # pylint: disable=unused-argument
+    """Parse a directory of conda recipes and write links as recipes are parsed."""
+    from conda import iter_conda_recipes
+
+    for recipe in iter_conda_recipes(args.conda, processes=args.conda_processes):
+        name = recipe["name"] or recipe["path"]
+        for link in recipe["repo_links"] or [""]:
+            sink.write(make_record("conda", name, recipe["version"], link))
+
+
+def _run_query(args):
+    """Answer a question from the results store and write the matching rows."""
+    from results import ResultsStore
+
+    path = args.results_db or DEFAULT_RESULTS_PATH
+    if not os.path.isfile(path):
+        raise SystemExit(f"No results store at {path}, record one with --results_db")
+    if args.question in ("dependents", "repos") and not args.subject:
+        raise SystemExit(f"query {args.question} needs a repository or manifest")
+    store = ResultsStore(path)
+    if args.question == "dependents":
+        rows = store.dependents(args.subject)
+    elif args.question == "repos":
+        rows = store.manifest_repos(args.subject)
+    elif args.question == "new":
+        rows = store.new_since(args.since)
+    else:
+        rows = store.scans()
+    store.close()
+
+    if args.format != "text":
+        sink = open_sink(args.format, args.output, fields=tuple(rows[0]) if rows else ())
+        for row in rows:
+            sink.write(row)
+        sink.close()
+        return
+    lines = [
+        "\t".join("" if value is None else str(value) for value in row.values()) for row in rows
+    ]
+    if args.output is None:
+        for line in lines:
+            print(line)
+    else:
+        with open(args.output, "w") as output_file:
+            output_file.writelines(line + "\n" for line in lines)
+
+
+def _run_serve(args):
+    """Answer manifests with resident backends until interrupted."""
+    from serve import ResolverService, serve
+
+    service = ResolverService(julia_registry=args.julia_registry, resolver=args.resolver)
+    serve(
+        service,
+        host=args.host,
+        port=args.port,
+        socket_path=args.socket,
+        max_entries=args.max_entries,
+        ttl=args.max_age,
+    )
+
+
+# CLI flag -> pipeline run when the flag is given, in this order
+PIPELINES = {
+    "bulk": _run_bulk,
+    "python": _run_python,
+    "javascript": _run_javascript,
+    "julia": _run_julia,
+    "conda": _run_conda,
+}
+# pipelines that look packages up in the PyPI and npm registries
+REGISTRY_PIPELINES = ("bulk", "python", "javascript")
+
+
+def _run_pipelines(args, pipelines):
+    """Run the selected pipelines into one sink, then export the graph."""
+    fields = FIELDS
+    if args.bulk:
+        from bulk import BULK_FIELDS
+
+        fields = BULK_FIELDS
+    sink = open_sink(args.format, args.output, fields=fields)
+    graph = None
+    if args.graph_output or args.graph_rank:
+        from graph import DependencyGraph
+
+        graph = DependencyGraph()
+    results_store = None
+    if args.results_db:
+        from results import ResultsSink, ResultsStore
+
+        results_store = ResultsStore(args.results_db)
+        results_store.begin_scan()
+    for flag in pipelines:
+        if results_store is None:
+            PIPELINES[flag](args, sink, graph)
+            continue
+        # bulk records name their manifest, the other runs analyze the flag's path
+        results_sink = ResultsSink(
+            results_store, sink, manifest=None if flag == "bulk" else getattr(args, flag)
+        )
+        PIPELINES[flag](args, results_sink, graph)
+        results_sink.flush()
+    sink.close()
+    if results_store is not None:
+        results_store.close()
+    if args.graph_output:
+        graph.write(args.graph_output, args.graph_format)
+    if args.graph_rank:
+        graph.print_ranking(args.graph_rank)
+
+
+def main():
+    """Run every pipeline selected on the command line."""
     args = parse_command_line_arguments()
+    if args.command == "query":
+        _run_query(args)
+        return
+    _configure_logging()
+    if args.profile or args.profile_output:
+        profiling.enable(trace=args.profile_output is not None and args.profile_format == "chrome")
+    pipelines = [flag for flag in PIPELINES if getattr(args, flag)]
+
+    # only open the response cache when something may use it
+    registry_cache = None
+    uses_registries = (
+        args.cache_stats
+        or args.command == "serve"
+        or any(flag in REGISTRY_PIPELINES for flag in pipelines)
+    )
+    if uses_registries and not args.no_cache:
+        from cache import RegistryCache
+
+        registry_cache = RegistryCache(
+            args.cache_path,
+            ttl=args.cache_ttl,
+            max_bytes=args.cache_max_mb * 1024 * 1024,
+        )
+        # written out however the run ends, including a serve run stopped
+        atexit.register(registry_cache.close)
+    fetch.configure(
+        concurrency=args.concurrency,
+        per_host_limit=args.per_host_limit,
+        timeout=(args.connect_timeout, args.read_timeout),
+        retries=args.retries,
+        rate_limit=args.rate_limit,
+        cache=registry_cache,
+        offline=args.offline,
+        refresh=args.refresh,
+    )
 
-    # parse specified Python requirements.txt file and generate GitHub links
-    if args.python:
-        python_requirements_dot_text_analysis(args.python, args.no_deps)
-
-    # parse specified package.json and generate GitHub links
-    # TODO: Analyze transitive dependencies too.
-    if args.javascript:
-        filepath = args.javascript
-        if filepath.lower().endswith(".json"):
-            js_package_dot_json_analysis(args.javascript)
-        elif filepath.lower().endswith(".txt"):
-            links = js_txt_file_analysis(args.javascript)
-            for link in links:
-                print(link)
-
-    # parse directory containing julia package.tomls and return source links
-    if args.julia:
-        links = generate_julia_source_links(args.julia)
-        for link in links:
-            print(link)
+    registry_snapshot = snapshot_recorder = None
+    if args.snapshot or args.snapshot_build:
+        from snapshot import import_bigquery_pypi, open_snapshot
+
+        registry_snapshot = open_snapshot(args.snapshot) if args.snapshot else None
+        snapshot_recorder = open_snapshot(args.snapshot_build) if args.snapshot_build else None
+        fetch.configure(snapshot=registry_snapshot, recorder=snapshot_recorder)
+    if args.snapshot_import_bigquery:
+        if snapshot_recorder is None:
+            raise SystemExit("--snapshot_import_bigquery needs --snapshot_build")
+        count = import_bigquery_pypi(args.snapshot_import_bigquery, snapshot_recorder)
+        logging.info("Imported %d PyPI projects into %s", count, args.snapshot_build)
+
+    if args.command == "serve":
+        _run_serve(args)
+    else:
+        _run_pipelines(args, pipelines)
+
+    for opened_snapshot in (registry_snapshot, snapshot_recorder):
+        if opened_snapshot is not None:
+            opened_snapshot.close()
+
+    request_stats = fetch.stats()
+    if request_stats["requests"]:
+        logging.info(
+            "Registry requests: %(requests)d, retries: %(retries)d, "
+            "throttled: %(throttled)d, failures: %(failures)d",
+            request_stats,
+        )
+
+    if args.profile:
+        profiling.print_report()
+    if args.profile_output and args.profile_format == "chrome":
+        profiling.write_chrome_trace(args.profile_output)
+    elif args.profile_output:
+        profiling.write_json(args.profile_output)
+
+    if args.cache_stats and registry_cache is not None:
+        for key, value in registry_cache.stats().items():
+            print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
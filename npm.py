@@ -2,74 +2,188 @@
 
 import csv
 import json
+import os
 import re
+import threading
+
+import profiling
+from backends import EcosystemBackend, run_pipeline
+from fetch import fetch_map, get_json
+from lockfiles import NPM_LOCKFILES, find_lockfile, iter_npm_lockfile
+from lru import memory_cache
+from npm_semver import max_satisfying, version_key
+from urls import normalize_repo_url
+from utils import clean_github_link
 
-import requests
 
-from utils import clean_github_link
+NPM_REGISTRY_URL = "https://registry.npmjs.org/"
+NPM_ABBREVIATED_ACCEPT = (
+    "application/vnd.npm.install-v1+json; q=1.0, application/json; q=0.8, */*"
+)
+
+# reduced packuments keyed by (package name, abbreviated)
+_packuments = memory_cache("npm_packuments")
+_packuments_lock = threading.Lock()
 
 
-def js_package_dot_json_analysis(filepath):
+def js_package_dot_json_analysis(filepath, no_deps=False, sink=None, graph=None):
     """Execute overall analysis of javascript's package.json
 
     Combines JavaScript-related functionality to perform end-to-end
-    analysis of package.json. Prints output to terminal.
+    analysis of package.json. Each package's result is written to the
+    sink as soon as its lookup completes.
+
+    Selecting no_deps switch means no dependencies other than
+    those explicitly specified are analyzed. Otherwise the tree locked
+    by a package-lock.json, npm-shrinkwrap.json, yarn.lock or
+    pnpm-lock.yaml next to the package.json is read instead of
+    resolving it through the registry.
 
     Args:
-        filepath (str): filepath to a package.json file
+        filepath (str): filepath to a package.json file or lockfile
+        no_deps (bool): whether to analyze dependencies too
+        sink: output sink (see output.open_sink), defaults to text on
+            stdout with warnings on stderr
+        graph (graph.DependencyGraph): receives the dependency graph
 
     Returns:
         None
     """
-    # retrieve only top-level packages
-    top_level_pkgs = parse_package_dot_json(filepath)
-
-    # create list of ALL dependencies, both top-level and transitive
-    # TODO: consider simplifying logic, too many branches
-    all_pkgs = []
-    pkgs_without_dependencies = []
-    for pkg in top_level_pkgs:
-        all_deps = get_npm_package_dependencies(pkg)
-        if all_deps:
-            for dep in all_deps:
-                if dep not in all_pkgs:
-                    all_pkgs.append(dep)
-        # TODO: likely need to differentiate between packages with no
-        # dependencies (which is rare, but does happen in npm) and package
-        # not on npm
-        # TODO: create category of packages that do not list dependencies,
-        # not packages without dependencies
-        else:
-            pkgs_without_dependencies.append(pkg)
-
-    github_urls = []
-    pkgs_without_github_urls = []
-    for pkg in all_pkgs:
-        github_url = get_github_link_from_npm_api(pkg)
-        if github_url:
-            github_urls.append(github_url)
-        else:
-            pkgs_without_github_urls.append(pkg)
-
-    # print all results, making sure to print any packages without
-    # an npm entry or without dependencies (no dependencies is rare in npm)
-    # and also packages without a GitHub link
-    if pkgs_without_dependencies:
-        print(
-            "\nWARNING: Some of these packages are either not on npm or do not have dependencies."
-        )
-        for pkg in pkgs_without_dependencies:
-            print(pkg)
-        print("")
-
-    if pkgs_without_github_urls:
-        print("\nWARNING: Some of these packages do not have a GitHub URL.")
-        for pkg in pkgs_without_github_urls:
-            print(pkg)
-        print("")
-
-    for url in github_urls:
-        print(url)
+    run_pipeline(NpmBackend(), filepath, no_deps, sink, graph)
+
+
+class NpmBackend(EcosystemBackend):
+    """Resolve package.json files through the npm registry."""
+
+    ecosystem = "npm"
+
+    def parse_manifest(self, filepath):
+        """Map each dependency to its version range, see parse_package_dot_json_specs.
+
+        The package.json next to a lockfile is read when given a lockfile.
+        """
+        if os.path.basename(filepath) in NPM_LOCKFILES:
+            filepath = os.path.join(os.path.dirname(filepath), "package.json")
+        return parse_package_dot_json_specs(filepath)
+
+    def find_lockfile(self, filepath):
+        """Return filepath if it is a lockfile, else the one next to it, if any."""
+        if os.path.basename(filepath) in NPM_LOCKFILES:
+            return filepath
+        return find_lockfile(os.path.dirname(filepath), NPM_LOCKFILES)
+
+    def parse_lockfile(self, lockfile):
+        """Stream the locked packages, see lockfiles.iter_npm_lockfile."""
+        return iter_npm_lockfile(lockfile)
+
+    def resolve_graph(self, specs):
+        """Resolve the full tree, see resolve_npm_dependency_graph."""
+        return resolve_npm_dependency_graph(specs)
+
+    def fetch_metadata(self, package):
+        """Return the reduced packument, see get_npm_packument."""
+        return get_npm_packument(package)
+
+    def extract_repo(self, metadata):
+        """Return the cleaned repository link of a packument."""
+        return extract_github_link_from_packument(metadata)
+
+    def latest_version(self, metadata):
+        """Return the version tagged latest, if any was published."""
+        return _latest_npm_version(metadata) if metadata["versions"] else None
+
+
+def resolve_npm_dependency_graph(top_level_specs, abbreviated=False):
+    """Resolve the full transitive dependency graph of npm packages.
+
+    Walks the graph breadth first. Every level's packuments are fetched
+    concurrently, each (package, range) pair is resolved to a concrete
+    version only once, and a visited set of package@version nodes keeps
+    shared subtrees from being expanded twice.
+
+    Args:
+        top_level_specs (dict) - package name -> version range, as in
+            the dependencies section of a package.json
+        abbreviated (bool) - fetch abbreviated metadata, useful when
+            repository links are not needed afterwards
+
+    Returns:
+        dict - closure: list of (name, version) in breadth-first order,
+            edges: list of ((name, version), (name, version)) pairs,
+            not_found: names of packages missing from npm
+    """
+    resolved_versions = {}
+    visited = set()
+    closure = []
+    edges = []
+    not_found = []
+
+    def fetch_packument(name):
+        return get_npm_packument(name, abbreviated=abbreviated)
+
+    # each frontier entry is (parent node or None, name, range)
+    frontier = [(None, name, spec) for name, spec in top_level_specs.items()]
+    while frontier:
+        frontier = [(parent,) + _unalias_npm_spec(name, spec) for parent, name, spec in frontier]
+        names = list(dict.fromkeys(name for _, name, _ in frontier))
+        packuments = dict(zip(names, fetch_map(fetch_packument, names)))
+
+        next_frontier = []
+        for parent, name, spec in frontier:
+            if (name, spec) not in resolved_versions:
+                resolved_versions[(name, spec)] = resolve_npm_version(
+                    packuments[name], spec
+                )
+            version = resolved_versions[(name, spec)]
+            if version is None:
+                if name not in not_found:
+                    not_found.append(name)
+                continue
+
+            node = (name, version)
+            if parent is not None:
+                edges.append((parent, node))
+            if node in visited:
+                continue
+            visited.add(node)
+            closure.append(node)
+
+            for dep, dep_spec in packuments[name]["versions"][version].items():
+                next_frontier.append((node, dep, dep_spec))
+        frontier = next_frontier
+
+    return {"closure": closure, "edges": edges, "not_found": not_found}
+
+
+def resolve_npm_version(packument, spec):
+    """Pick the version of a package that satisfies a range.
+
+    Args:
+        packument (dict) - reduced packument from get_npm_packument
+        spec (str) - version range or dist-tag from a dependency list
+
+    Returns:
+        str - resolved version, None if the package or version is missing
+    """
+    if not packument or not packument["versions"]:
+        return None
+    version = max_satisfying(packument["versions"], spec, packument["dist_tags"])
+    # fall back to latest rather than dropping the package entirely
+    if version not in packument["versions"]:
+        version = _latest_npm_version(packument)
+    return version
+
+
+def _unalias_npm_spec(name, spec):
+    """Resolve "npm:real-name@range" aliases into (real-name, range)."""
+    if isinstance(spec, str) and spec.startswith("npm:"):
+        target = spec[len("npm:"):]
+        # the name itself may be scoped, so split on the last @
+        at = target.rfind("@")
+        if at > 0:
+            return target[:at], target[at + 1:]
+        return target, "latest"
+    return name, spec if isinstance(spec, str) else "latest"
 
 
 def js_txt_file_analysis(filepath):
@@ -84,56 +198,161 @@ def js_txt_file_analysis(filepath):
     Returns:
         (list) packages
     """
+    links = fetch_map(get_github_link_from_npm_api, parse_npm_txt_file(filepath))
+
+    return links
+
+
+def parse_npm_txt_file(filepath):
+    """Read npm package names listed line by line in a .txt file
+
+    Args:
+        filepath (str): filepath to a .txt file
+
+    Returns:
+        list - package names
+    """
     # extract npm packages line-by-line into list
     pkgs = []
-    with open(filepath, "r") as file:
+    with profiling.stage("parse_manifest"), open(filepath, "r") as file:
         reader = csv.reader(file)
         for row in reader:
             pkgs.append(row[0])
 
-    links = []
-    for pkg in pkgs:
-        link = get_github_link_from_npm_api(pkg)
-        links.append(link)
+    return pkgs
 
-    return links
 
-
-def get_npm_package_dependencies(pkg):
+def get_npm_package_dependencies(pkg, abbreviated=False):
     """Retrieve a list of package dependencies.
 
     Args:
         pkg (str) - package name
+        abbreviated (bool) - fetch the smaller install metadata document
+            if the full packument has not been retrieved yet
 
     Returns:
         dep_list - list of dependencies
     """
-    npm_pkg_json = requests.get("https://registry.npmjs.org/" + pkg).json()
-
-    # check if npm contains package
-    if npm_pkg_json == {"error": "Not found"}:
-        dep_list = []
-    else:
-        # retrieve all package versions
-        pkg_versions = npm_pkg_json["versions"]
-        # because python dicts are ordered as of 3.7, the last
-        # item SHOULD be the most recent version. If this assumption
-        # is wrong, this code is wrong
-        last_version = list(pkg_versions)[-1]
-
-        # find dependencies for most recent version
-        try:
-            dep_array = pkg_versions[last_version]["dependencies"]
-        # if these keys are not present, simply return empty list
-        # to avoid crash
-        except KeyError:
-            dep_array = []
-
-        dep_list = []
-        for dep in dep_array:
-            dep_list.append(dep)
-
-    return dep_list
+    packument = get_npm_packument(pkg, abbreviated=abbreviated)
+    return extract_dependencies_from_packument(packument)
+
+
+def get_npm_packument(pkg, abbreviated=False):
+    """Retrieve the packument (package document) for an npm package.
+
+    Each package is fetched at most once per run: the packument is reduced
+    to the fields deps2repos needs and kept in memory, so later dependency
+    and repository lookups for the same package reuse it. An abbreviated
+    request is satisfied by an already fetched full packument, while a
+    full request always upgrades an abbreviated one.
+
+    Args:
+        pkg (str) - package name
+        abbreviated (bool) - request application/vnd.npm.install-v1+json,
+            which omits the repository field but is far smaller
+
+    Returns:
+        dict - the reduced packument, None if the package is not on npm
+    """
+    with _packuments_lock:
+        if (pkg, False) in _packuments:
+            return _packuments[(pkg, False)]
+        if abbreviated and (pkg, True) in _packuments:
+            return _packuments[(pkg, True)]
+
+    headers = {"Accept": NPM_ABBREVIATED_ACCEPT} if abbreviated else None
+    with profiling.stage("fetch_metadata"):
+        npm_pkg_json = get_json(NPM_REGISTRY_URL + pkg, headers=headers)
+        packument = reduce_npm_packument(npm_pkg_json, abbreviated=abbreviated)
+
+    with _packuments_lock:
+        return _packuments.setdefault((pkg, abbreviated), packument)
+
+
+def clear_npm_packument_cache():
+    """Forget every packument retrieved so far in this run."""
+    with _packuments_lock:
+        _packuments.clear()
+
+
+def reduce_npm_packument(npm_pkg_json, abbreviated=False):
+    """Keep only the packument fields needed to derive deps and repo.
+
+    Args:
+        npm_pkg_json (dict) - packument as returned by the npm registry
+        abbreviated (bool) - whether npm_pkg_json is abbreviated metadata
+
+    Returns:
+        dict - name, dist_tags, versions (version -> dependencies) and
+            repository_url, or None if the package is not on npm
+    """
+    # check if npm contains package (an empty document means an offline
+    # cache miss, which is treated the same way)
+    if not npm_pkg_json or npm_pkg_json == {"error": "Not found"}:
+        return None
+
+    versions = {}
+    for version, metadata in npm_pkg_json.get("versions", {}).items():
+        versions[version] = (metadata or {}).get("dependencies") or {}
+
+    # repository is either {"type": "git", "url": ...} or a bare string
+    repository = npm_pkg_json.get("repository")
+    if isinstance(repository, dict):
+        repository = repository.get("url")
+
+    return {
+        "name": npm_pkg_json.get("name"),
+        "dist_tags": npm_pkg_json.get("dist-tags", {}),
+        "versions": versions,
+        "repository_url": repository or None,
+        "abbreviated": abbreviated,
+    }
+
+
+def extract_dependencies_from_packument(packument):
+    """List the dependencies of the latest version in a packument.
+
+    Args:
+        packument (dict) - reduced packument from get_npm_packument
+
+    Returns:
+        dep_list - list of dependencies, empty if package not found
+    """
+    if not packument or not packument["versions"]:
+        return []
+
+    return list(packument["versions"][_latest_npm_version(packument)])
+
+
+def _latest_npm_version(packument):
+    """Return the version tagged latest, else the highest published one."""
+    latest = packument["dist_tags"].get("latest")
+    if latest in packument["versions"]:
+        return latest
+    # sort unparseable versions first so a valid one is preferred
+    return max(
+        packument["versions"],
+        key=lambda version: (version_key(version) is not None, version_key(version) or ()),
+    )
+
+
+def extract_github_link_from_packument(packument):
+    """Retrieve the cleaned repository link from a packument.
+
+    Args:
+        packument (dict) - reduced, non-abbreviated packument
+
+    Returns:
+        clean_github_url - URL to github, empty if not present
+    """
+    if not packument or not packument["repository_url"]:
+        return ""
+
+    # fall back to the normalizer for shorthands (github:owner/repo) and
+    # other code hosts
+    return clean_github_link(packument["repository_url"]) or normalize_repo_url(
+        packument["repository_url"]
+    )
 
 
 def parse_package_dot_json(filepath):
@@ -145,16 +364,22 @@ def parse_package_dot_json(filepath):
     Returns:
         dep_list -  list of packages
     """
-    with open(filepath) as json_file:
-        data = json.load(json_file)
+    return list(parse_package_dot_json_specs(filepath))
+
 
-    deps = data["dependencies"]
+def parse_package_dot_json_specs(filepath):
+    """Convert package.json to a mapping of package names to ranges
 
-    dep_list = []
-    for dep in deps:
-        dep_list.append(dep)
+    Args:
+        filepath (str): filepath to a package.json file
+
+    Returns:
+        dict - package name -> version range
+    """
+    with profiling.stage("parse_manifest"), open(filepath) as json_file:
+        data = json.load(json_file)
 
-    return dep_list
+    return dict(data.get("dependencies", {}))
 
 
 def get_github_link_from_npm_api(pkg):
@@ -166,22 +391,5 @@ def get_github_link_from_npm_api(pkg):
     Returns:
         clean_github_url - URL to github, empty if package not found
     """
-    npm_pkg_json = requests.get("https://registry.npmjs.org/" + pkg).json()
-
-    # check if npm contains package
-    if npm_pkg_json == {"error": "Not found"}:
-        clean_github_url = []
-    else:
-        try:
-            github_url = npm_pkg_json["repository"]["url"]
-            # only clean link if link exists
-            if github_url:
-                clean_github_url = clean_github_link(github_url)
-            else:
-                clean_github_url = []
-        # if ["repository"]["url"] keys are not present, simply return
-        # empty list to avoid crash
-        except KeyError:
-            clean_github_url = []
-
-    return clean_github_url
+    packument = get_npm_packument(pkg)
+    return extract_github_link_from_packument(packument)
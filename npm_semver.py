@@ -0,0 +1,218 @@
+"""Subset of npm's semver range semantics used to pick package versions."""
+
+import re
+
+
+_VERSION = re.compile(
+    r"^\s*[v=]?(\d+)\.(\d+)\.(\d+)(?:-([0-9A-Za-z.-]+))?(?:\+[0-9A-Za-z.-]+)?\s*$"
+)
+_PARTIAL = re.compile(
+    r"^[v=]?(\*|x|X|\d+)(?:\.(\*|x|X|\d+))?(?:\.(\*|x|X|\d+))?"
+    r"(?:-([0-9A-Za-z.-]+))?(?:\+[0-9A-Za-z.-]+)?$"
+)
+_OPERATOR = re.compile(r"^(<=|>=|<|>|=|~>|~|\^)?\s*(.*)$")
+_OPERATOR_SPACE = re.compile(r"(<=|>=|<|>|=|~>|~|\^)\s+")
+_HYPHEN = re.compile(r"^(\S+)\s+-\s+(\S+)$")
+_WILDCARDS = (None, "*", "x", "X")
+
+
+def version_key(version):
+    """Convert a semver string into a tuple that sorts like npm versions.
+
+    Args:
+        version (str) - a full version such as 1.2.3 or 2.0.0-beta.1
+
+    Returns:
+        tuple - sortable key, None if version is not valid semver
+    """
+    match = _VERSION.match(version)
+    if not match:
+        return None
+    major, minor, patch, prerelease = match.groups()
+    return _key(int(major), int(minor), int(patch), prerelease)
+
+
+def _key(major, minor, patch, prerelease=None, lowest=False):
+    """Build a version key; lowest gives the key below every prerelease."""
+    if lowest:
+        return (major, minor, patch, 0, ())
+    if prerelease is None:
+        return (major, minor, patch, 1, ())
+    identifiers = tuple(
+        (0, int(part), "") if part.isdigit() else (1, 0, part)
+        for part in prerelease.split(".")
+    )
+    return (major, minor, patch, 0, identifiers)
+
+
+def parse_range(range_string):
+    """Parse an npm range into comparator sets.
+
+    Args:
+        range_string (str) - e.g. "^1.2.0", "1.x || >=2.5.0 <3", "1 - 2"
+
+    Returns:
+        list - one list of (operator, key) comparators per || alternative
+
+    Raises:
+        ValueError - if the range is not a semver range (git URL, tag...)
+    """
+    comparator_sets = []
+    for alternative in range_string.split("||"):
+        alternative = alternative.strip()
+        hyphen = _HYPHEN.match(alternative)
+        if hyphen:
+            comparators = _desugar(">=" + hyphen.group(1)) + _desugar(
+                "<=" + hyphen.group(2)
+            )
+        else:
+            comparators = []
+            for token in _OPERATOR_SPACE.sub(r"\1", alternative).split():
+                comparators.extend(_desugar(token))
+        comparator_sets.append(comparators)
+    return comparator_sets
+
+
+def _desugar(token):
+    """Turn one range token into primitive (operator, key) comparators."""
+    # pylint: disable=too-many-return-statements,too-many-branches
+    operator, rest = _OPERATOR.match(token).groups()
+    operator = {None: "", "~>": "~"}.get(operator, operator)
+    match = _PARTIAL.match(rest) if rest else _PARTIAL.match("*")
+    if not match:
+        raise ValueError(f"not a semver range: {token}")
+
+    major, minor, patch, prerelease = match.groups()
+    if major in _WILDCARDS:
+        return []
+    major = int(major)
+    minor = None if minor in _WILDCARDS else int(minor)
+    patch = None if minor is None or patch in _WILDCARDS else int(patch)
+
+    if patch is not None:
+        exact = _key(major, minor, patch, prerelease)
+        if operator in ("", "="):
+            return [("=", exact)]
+        if operator == "~":
+            return [(">=", exact), ("<", _key(major, minor + 1, 0, lowest=True))]
+        if operator == "^":
+            if major:
+                upper = _key(major + 1, 0, 0, lowest=True)
+            elif minor:
+                upper = _key(0, minor + 1, 0, lowest=True)
+            else:
+                upper = _key(0, 0, patch + 1, lowest=True)
+            return [(">=", exact), ("<", upper)]
+        return [(operator, exact)]
+
+    # partial versions such as 1, 1.x or 1.2
+    if minor is None:
+        lower = _key(major, 0, 0, lowest=True)
+        upper = _key(major + 1, 0, 0, lowest=True)
+    else:
+        lower = _key(major, minor, 0, lowest=True)
+        if operator == "^" and major == 0 and minor == 0:
+            upper = _key(0, 1, 0, lowest=True)
+        elif operator == "^" and major:
+            upper = _key(major + 1, 0, 0, lowest=True)
+        else:
+            upper = _key(major, minor + 1, 0, lowest=True)
+
+    if operator in ("", "=", "~", "^"):
+        return [(">=", lower), ("<", upper)]
+    if operator == ">":
+        return [(">=", upper)]
+    if operator == ">=":
+        return [(">=", lower)]
+    if operator == "<":
+        return [("<", lower)]
+    # operator == "<="
+    return [("<", upper)]
+
+
+def _satisfies_set(key, comparators):
+    """Check a version key against one set of comparators."""
+    for operator, bound in comparators:
+        if operator == "=" and key != bound:
+            return False
+        if operator == ">=" and key < bound:
+            return False
+        if operator == ">" and key <= bound:
+            return False
+        if operator == "<" and key >= bound:
+            return False
+        if operator == "<=" and key > bound:
+            return False
+
+    # like npm, prereleases only match if the range names a prerelease
+    # of the same major.minor.patch
+    if key[3] == 0:
+        return any(
+            bound[:3] == key[:3] and bound[4] for _, bound in comparators
+        )
+    return True
+
+
+def satisfies(version, range_string):
+    """Check whether a version satisfies an npm range.
+
+    Args:
+        version (str) - full semver version
+        range_string (str) - npm range
+
+    Returns:
+        bool - True if version is inside the range
+    """
+    key = version_key(version)
+    if key is None:
+        return False
+    try:
+        comparator_sets = parse_range(range_string)
+    except ValueError:
+        return False
+    return any(_satisfies_set(key, comparators) for comparators in comparator_sets)
+
+
+def max_satisfying(versions, range_string, dist_tags=None):
+    """Pick the version npm would install for a range.
+
+    As npm does, a dist-tag name resolves to the tagged version and the
+    version tagged latest wins whenever it satisfies the range. Ranges
+    that are not semver (git URLs, tarballs, file: paths) fall back to
+    latest.
+
+    Args:
+        versions (iterable of str) - published versions
+        range_string (str) - npm range or dist-tag
+        dist_tags (dict) - the packument's dist-tags
+
+    Returns:
+        str - chosen version, None if nothing satisfies the range
+    """
+    dist_tags = dist_tags or {}
+    range_string = (range_string or "").strip()
+    if range_string in dist_tags:
+        return dist_tags[range_string]
+
+    try:
+        comparator_sets = parse_range(range_string)
+    except ValueError:
+        return dist_tags.get("latest")
+
+    def matches(version):
+        key = version_key(version)
+        return key is not None and any(
+            _satisfies_set(key, comparators) for comparators in comparator_sets
+        )
+
+    latest = dist_tags.get("latest")
+    if latest and matches(latest):
+        return latest
+
+    best, best_key = None, None
+    for version in versions:
+        if matches(version):
+            key = version_key(version)
+            if best_key is None or key > best_key:
+                best, best_key = version, key
+    return best
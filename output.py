@@ -0,0 +1,180 @@
+"""Streaming output of per-package results as text, JSONL or CSV."""
+
+import csv
+import json
+import sys
+
+from urls import repo_key
+
+
+FORMATS = ("text", "jsonl", "csv")
+FIELDS = ("ecosystem", "package", "version", "repo_url", "status", "latency")
+STATUS_OK = "ok"
+STATUS_NOT_FOUND = "not-found"
+STATUS_NO_REPO = "no-repo"
+STATUS_FAILED = "failed"
+
+# how each ecosystem's registry is named in warnings
+REGISTRY_NAMES = {"pypi": "PyPI", "npm": "npm", "julia": "the Julia registry", "conda": "conda"}
+
+
+def make_record(
+    ecosystem, package, version=None, repo_url="", found=True, latency=None, failed=False
+):
+    """Describe the outcome of looking up one package.
+
+    Args:
+        ecosystem (str) - e.g. "pypi", "npm", "julia" or "conda"
+        package (str) - package name
+        version (str) - resolved or latest version, None if unknown
+        repo_url (str) - repository link, empty if none was found
+        found (bool) - whether the package exists in the registry
+        latency (float) - seconds spent on the lookup, None if not timed
+        failed (bool) - whether the registry could not be reached
+
+    Returns:
+        dict - the FIELDS of the record, with status "ok", "not-found",
+            "no-repo" or "failed"
+    """
+    if failed:
+        status = STATUS_FAILED
+    elif not found:
+        status = STATUS_NOT_FOUND
+    elif not repo_url:
+        status = STATUS_NO_REPO
+    else:
+        status = STATUS_OK
+    return {
+        "ecosystem": ecosystem,
+        "package": package,
+        "version": version,
+        "repo_url": repo_url or "",
+        "status": status,
+        "latency": None if latency is None else round(latency, 6),
+    }
+
+
+class TextSink:
+    """Print each repository once, with warnings going to stderr.
+
+    Args:
+        stream (file) - where repository links are written
+        warnings (file) - where packages without a repository are reported
+    """
+
+    def __init__(self, stream, warnings=None):
+        self.stream = stream
+        self.warnings = warnings or sys.stderr
+        self._seen = set()
+
+    def write(self, record):
+        """Write one record as soon as it is available."""
+        registry = REGISTRY_NAMES.get(record["ecosystem"], record["ecosystem"])
+        if record["status"] == STATUS_NOT_FOUND:
+            print(f"WARNING: {record['package']} is not on {registry}", file=self.warnings)
+        elif record["status"] == STATUS_FAILED:
+            print(
+                f"WARNING: {record['package']} could not be looked up on {registry}",
+                file=self.warnings,
+            )
+        elif record["status"] == STATUS_NO_REPO:
+            print(
+                f"WARNING: {record['package']} on {registry} does not have a repository URL",
+                file=self.warnings,
+            )
+        else:
+            key = repo_key(record["repo_url"]) or record["repo_url"]
+            if key not in self._seen:
+                self._seen.add(key)
+                print(record["repo_url"], file=self.stream, flush=True)
+
+    def close(self):
+        """Flush the output streams."""
+        self.stream.flush()
+        self.warnings.flush()
+
+
+class JsonlSink:
+    """Write every record as one JSON object per line.
+
+    Args:
+        stream (file) - where records are written
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, record):
+        """Write one record as soon as it is available."""
+        self.stream.write(json.dumps(record) + "\n")
+        self.stream.flush()
+
+    def close(self):
+        """Flush the output stream."""
+        self.stream.flush()
+
+
+class CsvSink:
+    """Write every record as a CSV row below a header of its fields.
+
+    Args:
+        stream (file) - where records are written, opened with newline=""
+        fields (tuple of str) - columns, FIELDS by default
+    """
+
+    def __init__(self, stream, fields=FIELDS):
+        self.stream = stream
+        self._writer = csv.DictWriter(stream, fieldnames=fields)
+        self._writer.writeheader()
+
+    def write(self, record):
+        """Write one record as soon as it is available."""
+        self._writer.writerow(record)
+        self.stream.flush()
+
+    def close(self):
+        """Flush the output stream."""
+        self.stream.flush()
+
+
+class _FileSink:
+    """Wrap a sink so closing it also closes the file it writes to."""
+
+    def __init__(self, sink, file):
+        self._sink = sink
+        self._file = file
+
+    def write(self, record):
+        """Write one record as soon as it is available."""
+        self._sink.write(record)
+
+    def close(self):
+        """Flush the sink and close its file."""
+        self._sink.close()
+        self._file.close()
+
+
+def open_sink(output_format="text", path=None, fields=FIELDS):
+    """Create the sink for an output format.
+
+    Args:
+        output_format (str) - one of FORMATS
+        path (str) - file to write to, None for stdout
+        fields (tuple of str) - CSV columns, FIELDS by default
+
+    Returns:
+        sink with write(record) and close() methods
+    """
+    if output_format not in FORMATS:
+        raise ValueError(f"unknown output format: {output_format}")
+    stream = sys.stdout
+    if path is not None:
+        stream = open(path, "w", newline="")  # pylint: disable=consider-using-with
+
+    if output_format == "csv":
+        sink = CsvSink(stream, fields)
+    elif output_format == "jsonl":
+        sink = JsonlSink(stream)
+    else:
+        sink = TextSink(stream)
+    return sink if path is None else _FileSink(sink, stream)
@@ -0,0 +1,351 @@
+"""Opt-in timing of pipeline stages and registry requests.
+
+Profiling is off by default, and every hook then returns after checking
+a single module global, so the instrumentation left in the pipelines
+costs next to nothing. enable() starts collecting:
+
+- per-stage timers (parse_manifest, resolve_deps, fetch_metadata,
+  decode_json, parse_toml, extract_url, walk_tree)
+- per-host request counts, errors, bytes downloaded and latency histograms
+- response cache and registry snapshot hit rates
+
+Stages nest (fetch_metadata runs inside resolve_deps) and are timed in
+every thread, so stage totals are inclusive and can add up to more than
+the wall time. Worker processes (e.g. --julia_processes) are not profiled.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from urllib.parse import urlsplit
+
+
+PROFILE_FORMATS = ("json", "chrome")
+# upper bounds of the request latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+_NULL_STAGE = nullcontext()
+_profile = None
+
+
+class _Profile:
+    """Counters and timers collected while profiling is enabled.
+
+    Args:
+        trace (bool) - also keep every stage and request as a timed
+            event, for write_chrome_trace
+    """
+
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.started = time.perf_counter()
+        self.stages = {}  # name -> [calls, total seconds, max seconds]
+        self.hosts = {}  # host -> counters, see _host
+        self.lookups = {
+            "cache": {"hits": 0, "misses": 0, "revalidated": 0},
+            "snapshot": {"hits": 0, "misses": 0},
+        }
+        self.events = []
+        self.lock = threading.Lock()
+
+    def _host(self, host):
+        """Return the counters of one host, creating them on first use."""
+        counters = self.hosts.get(host)
+        if counters is None:
+            counters = {
+                "requests": 0,
+                "errors": 0,
+                "bytes": 0,
+                "seconds": 0.0,
+                "max_ms": 0.0,
+                "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            }
+            self.hosts[host] = counters
+        return counters
+
+    def add_stage(self, name, start, seconds):
+        """Account one completed stage."""
+        with self.lock:
+            totals = self.stages.setdefault(name, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] = max(totals[2], seconds)
+            if self.trace:
+                self.events.append(("stage", name, start, seconds, threading.get_ident(), None))
+
+    def add_request(self, url, start, seconds, status, size):
+        """Account one HTTP request."""
+        host = urlsplit(url).netloc
+        latency_ms = seconds * 1000
+        with self.lock:
+            counters = self._host(host)
+            counters["requests"] += 1
+            counters["bytes"] += size
+            counters["seconds"] += seconds
+            counters["max_ms"] = max(counters["max_ms"], latency_ms)
+            counters["histogram"][bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+            if status is None or status >= 400:
+                counters["errors"] += 1
+            if self.trace:
+                args = {"url": url, "status": status, "bytes": size}
+                self.events.append(("request", host, start, seconds, threading.get_ident(), args))
+
+    def add_lookup(self, kind, outcome):
+        """Count a cache or snapshot lookup outcome."""
+        with self.lock:
+            self.lookups[kind][outcome] += 1
+
+
+class _Stage:
+    """Time the body of a with statement as one stage."""
+
+    __slots__ = ("profile", "name", "start")
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.add_stage(self.name, self.start, time.perf_counter() - self.start)
+
+
+def enable(trace=False):
+    """Start collecting a fresh profile.
+
+    Args:
+        trace (bool) - keep individual events for a Chrome trace, which
+            costs memory proportional to the number of requests
+
+    Returns:
+        None
+    """
+    global _profile  # pylint: disable=global-statement
+    _profile = _Profile(trace=trace)
+
+
+def disable():
+    """Stop profiling and drop what was collected."""
+    global _profile  # pylint: disable=global-statement
+    _profile = None
+
+
+def enabled():
+    """Return whether a profile is being collected."""
+    return _profile is not None
+
+
+def stage(name):
+    """Time a pipeline stage.
+
+    Use as ``with profiling.stage("resolve_deps"): ...``; a shared no-op
+    context manager is returned while profiling is disabled.
+
+    Args:
+        name (str) - stage name
+
+    Returns:
+        context manager
+    """
+    profile = _profile
+    if profile is None:
+        return _NULL_STAGE
+    return _Stage(profile, name)
+
+
+def clock():
+    """Return a start time for record_request, None while disabled."""
+    return None if _profile is None else time.perf_counter()
+
+
+def record_request(url, start, status=None, size=0):
+    """Account one HTTP request started at clock().
+
+    Args:
+        url (str) - requested URL, whose host the request is counted for
+        start (float) - clock() before the request, None if disabled
+        status (int) - HTTP status, None if no answer was received
+        size (int) - bytes of the response body
+
+    Returns:
+        None
+    """
+    profile = _profile
+    if profile is not None and start is not None:
+        profile.add_request(url, start, time.perf_counter() - start, status, size)
+
+
+def record_lookup(kind, outcome):
+    """Count the outcome of a local lookup.
+
+    Args:
+        kind (str) - "cache" or "snapshot"
+        outcome (str) - "hits", "misses" or, for the cache, "revalidated"
+
+    Returns:
+        None
+    """
+    profile = _profile
+    if profile is not None:
+        profile.add_lookup(kind, outcome)
+
+
+def summary():
+    """Summarize the collected profile.
+
+    Returns:
+        dict - wall_seconds, stages (name -> calls, total_seconds,
+            max_seconds), hosts (host -> requests, errors, bytes,
+            total_seconds, max_ms and a latency_ms histogram keyed by
+            bucket upper bound) and lookups (cache and snapshot hits,
+            misses and hit_rate); empty while disabled
+    """
+    profile = _profile
+    if profile is None:
+        return {}
+    with profile.lock:
+        stages = {
+            name: {
+                "calls": calls,
+                "total_seconds": round(total, 6),
+                "max_seconds": round(peak, 6),
+            }
+            for name, (calls, total, peak) in profile.stages.items()
+        }
+        bounds = [f"<={bound}" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}"]
+        hosts = {}
+        for host, counters in profile.hosts.items():
+            hosts[host] = {
+                "requests": counters["requests"],
+                "errors": counters["errors"],
+                "bytes": counters["bytes"],
+                "total_seconds": round(counters["seconds"], 6),
+                "max_ms": round(counters["max_ms"], 3),
+                "latency_ms": dict(zip(bounds, counters["histogram"])),
+            }
+        lookups = {}
+        for kind, outcomes in profile.lookups.items():
+            total = sum(outcomes.values())
+            hit_rate = round(outcomes["hits"] / total, 4) if total else None
+            lookups[kind] = dict(outcomes, hit_rate=hit_rate)
+    return {
+        "wall_seconds": round(time.perf_counter() - profile.started, 6),
+        "stages": stages,
+        "hosts": hosts,
+        "lookups": lookups,
+    }
+
+
+def _percentile_ms(histogram, fraction):
+    """Approximate a latency percentile by its histogram bucket bound."""
+    threshold = fraction * sum(histogram)
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS_MS + (float("inf"),), histogram):
+        seen += count
+        if count and seen >= threshold:
+            return bound
+    return 0
+
+
+def print_report(stream=None):
+    """Print the collected profile as tables.
+
+    Latency percentiles are the upper bound of the histogram bucket
+    they fall in.
+
+    Args:
+        stream (file) - where to print, stderr by default
+
+    Returns:
+        None
+    """
+    stream = stream or sys.stderr
+    report = summary()
+    if not report:
+        return
+    print(f"Profile of {report['wall_seconds']:.3f}s run", file=stream)
+    print(
+        f"{'stage':<16} {'calls':>8} {'total s':>10} {'mean ms':>10} {'max ms':>10}",
+        file=stream,
+    )
+    stages = sorted(report["stages"].items(), key=lambda item: -item[1]["total_seconds"])
+    for name, totals in stages:
+        mean_ms = 1000 * totals["total_seconds"] / totals["calls"]
+        print(
+            f"{name:<16} {totals['calls']:>8} {totals['total_seconds']:>10.3f} "
+            f"{mean_ms:>10.3f} {1000 * totals['max_seconds']:>10.3f}",
+            file=stream,
+        )
+
+    if report["hosts"]:
+        print(
+            f"{'host':<24} {'requests':>8} {'errors':>6} {'bytes':>12} "
+            f"{'p50 ms':>7} {'p95 ms':>7} {'max ms':>9}",
+            file=stream,
+        )
+        for host, counters in report["hosts"].items():
+            histogram = list(counters["latency_ms"].values())
+            print(
+                f"{host:<24} {counters['requests']:>8} {counters['errors']:>6} "
+                f"{counters['bytes']:>12} {_percentile_ms(histogram, 0.5):>7} "
+                f"{_percentile_ms(histogram, 0.95):>7} {counters['max_ms']:>9.1f}",
+                file=stream,
+            )
+
+    for kind, outcomes in report["lookups"].items():
+        if outcomes["hit_rate"] is not None:
+            counts = ", ".join(
+                f"{count} {outcome}"
+                for outcome, count in outcomes.items()
+                if outcome != "hit_rate"
+            )
+            print(f"{kind}: {counts} ({outcomes['hit_rate']:.1%} hit rate)", file=stream)
+
+
+def write_json(path):
+    """Write summary() to a JSON file."""
+    with open(path, "w") as profile_file:
+        json.dump(summary(), profile_file, indent=2)
+
+
+def write_chrome_trace(path):
+    """Write the collected events in the Chrome trace event format.
+
+    The file opens in chrome://tracing or Perfetto, with one row per
+    thread. Only events collected with enable(trace=True) are written.
+
+    Args:
+        path (str) - output file
+
+    Returns:
+        None
+    """
+    profile = _profile
+    events = []
+    if profile is not None:
+        with profile.lock:
+            recorded = list(profile.events)
+        pid = os.getpid()
+        for category, name, start, seconds, thread, args in recorded:
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round((start - profile.started) * 1e6, 3),
+                "dur": round(seconds * 1e6, 3),
+                "pid": pid,
+                "tid": thread,
+            }
+            if args:
+                event["args"] = args
+            events.append(event)
+    with open(path, "w") as trace_file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
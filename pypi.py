@@ -1,91 +1,180 @@
 """PyPI-related functionality"""
 
-import ast
+import json
+import logging
+import os
 import subprocess
+import threading
 import urllib
 
 
-import requests
-import requirements
-
-from utils import clean_github_link
-
-
-def python_requirements_dot_text_analysis(filepath, no_deps):
+from packaging.version import InvalidVersion, Version
+
+import profiling
+from backends import EcosystemBackend, run_pipeline
+from constants import RESOLVERS
+from fetch import fetch_map, get_json
+from lru import memory_cache
+from urls import iter_repo_urls, mentions_repo_host, parse_repo_url
+
+
+PYPI_URL = "https://pypi.org/pypi/"
+# manifests looked for in a project directory, most preferred first
+PYTHON_MANIFESTS = ("pyproject.toml", "Pipfile", "requirements.txt")
+
+# how much a repository link is trusted depending on where it was found
+PROJECT_URL_CONFIDENCE = {
+    "source": 0.95,
+    "source code": 0.95,
+    "repository": 0.95,
+    "code": 0.95,
+    "github": 0.95,
+    "homepage": 0.85,
+    "home": 0.85,
+}
+OTHER_PROJECT_URL_CONFIDENCE = 0.6
+HOME_PAGE_CONFIDENCE = 0.85
+DOWNLOAD_URL_CONFIDENCE = 0.7
+DESCRIPTION_CONFIDENCE = 0.4
+CORROBORATION_BONUS = 0.05
+# first path segments of GitHub pages that are not repositories
+NON_REPO_OWNERS = {"sponsors", "orgs", "features", "marketplace", "topics", "settings"}
+
+# reduced PyPI project documents keyed by canonical name, and
+# requires_dist lists keyed by (canonical name, version)
+_projects = memory_cache("pypi_projects")
+_requires_dist = memory_cache("pypi_requires_dist")
+_projects_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+# requirements-parser and most of packaging take long to import, so
+# they are imported by the functions using them rather than up front
+# pylint: disable=import-outside-toplevel
+
+
+def python_requirements_dot_text_analysis(
+    filepath, no_deps, resolver="builtin", sink=None, graph=None
+):
     """Execute overall analysis of Python's requirements.txt
 
     Combines python-related functionality to perform end-to-end
-    analysis of requirements.txt. Prints output to terminal.
+    analysis of requirements.txt. Each package's result is written to
+    the sink as soon as its lookup completes.
 
     Selecting no_deps switch means no dependencies other than
-    those explicitly specified are analyzed.
+    those explicitly specified are analyzed. Otherwise a lockfile
+    pinning the manifest (see lockfiles.find_python_lockfile) is read
+    instead of resolving it.
 
     Args:
-        filepath (str): filepath to a requirements.txt file
+        filepath (str): filepath to a requirements.txt, pyproject.toml,
+            Pipfile or Python lockfile
         no_deps (bool): whether to analyze dependencies too
+        resolver (str): "builtin" to resolve in-process from PyPI
+            metadata, "pipgrip" to run pipgrip once per requirement,
+            "pipgrip-batch" to run pipgrip once for all requirements
+        sink: output sink (see output.open_sink), defaults to text on
+            stdout with warnings on stderr
+        graph (graph.DependencyGraph): receives the dependency graph
 
     Returns:
         None
     """
-    # pylint: disable=too-many-branches
-    top_level_pkgs = parse_requirements_dot_text(filepath)
+    run_pipeline(PypiBackend(resolver), filepath, no_deps, sink, graph)
 
-    # Retrieve all dependencies, both top-level and transitive, and keep a
-    # unique list
-    all_pkgs = []
-    # skip adding transitive dependencies if no_deps selected
-    if no_deps:
-        all_pkgs = top_level_pkgs
-    else:
-        for pkg in top_level_pkgs:
-            all_deps = get_pypi_package_dependencies(pkg)
-            for dep in all_deps:
-                if dep not in all_pkgs:
-                    all_pkgs.append(dep)
-
-    # retrieve github urls for unique pypi packages and store date
-    # on any packages without a PyPI entry or a gitHub
-    github_urls = []
-    pkgs_without_pypi_data = []
-    pkgs_without_githubs = []
-    for pkg in all_pkgs:
-
-        pypi_json = get_pypi_data_json(pkg)
-        if not pypi_json:
-            pkgs_without_pypi_data.append(pkg)
-
-        github_url = get_github_url_from_pypi_json(pypi_json)
-        if pypi_json and not github_url:
-            pkgs_without_githubs.append(pkg)
-
-        if github_url:
-            github_urls.append(github_url)
-
-    # print all results, making sure to print any packages without
-    # a PyPI entry or GitHub first to ensure an informed user
-    if pkgs_without_pypi_data:
-        print("\nWARNING: Some of these packages are not on PyPI:")
-        for pkg in pkgs_without_pypi_data:
-            print(pkg)
-        print("")
-
-    if pkgs_without_githubs:
-        print("\nWARNING: Some of the packages found on PyPI do not have GitHubs:")
-        for pkg in pkgs_without_githubs:
-            print(pkg)
-        print("")
-
-    for url in github_urls:
-        print(url)
+
+class PypiBackend(EcosystemBackend):
+    """Resolve Python manifests through the PyPI JSON API.
+
+    Args:
+        resolver (str) - one of RESOLVERS, see
+            python_requirements_dot_text_analysis
+    """
+
+    ecosystem = "pypi"
+
+    def __init__(self, resolver="builtin"):
+        super().__init__()
+        if resolver not in RESOLVERS:
+            raise ValueError(f"unknown resolver: {resolver}")
+        self.resolver = resolver
+
+    def parse_manifest(self, filepath):
+        """Map each requirement's name to its PEP 508 string.
+
+        Reads requirements files, pyproject.toml and Pipfile; given a
+        lockfile, the manifest it pins is read.
+        """
+        from lockfiles import PYTHON_LOCKFILES
+
+        name = os.path.basename(filepath)
+        for manifest, lockfiles in PYTHON_LOCKFILES.items():
+            if name in lockfiles:
+                name = manifest
+                filepath = os.path.join(os.path.dirname(filepath), manifest)
+        if name == "pyproject.toml":
+            return dict(_parse_pyproject_specs(filepath))
+        if name == "Pipfile":
+            return dict(_parse_pipfile_specs(filepath))
+        return dict(_parse_requirement_specs(filepath))
+
+    def find_lockfile(self, filepath):
+        """Find the lockfile pinning a manifest, see lockfiles.find_python_lockfile."""
+        from lockfiles import find_python_lockfile
+
+        return find_python_lockfile(filepath)
+
+    def parse_lockfile(self, lockfile):
+        """Read the locked packages by canonical name, see lockfiles.iter_python_lockfile."""
+        from lockfiles import iter_python_lockfile
+
+        return (
+            (self.canonical_name(name), version) for name, version in iter_python_lockfile(lockfile)
+        )
+
+    def resolve(self, specs, no_deps=False, graph=None):
+        """List every package, resolving with the configured resolver.
+
+        Only the builtin resolver reports edges to graph.
+        """
+        if no_deps or self.resolver == "builtin":
+            return super().resolve(specs, no_deps, graph)
+        with profiling.stage("resolve_deps"):
+            if self.resolver == "pipgrip-batch":
+                return dict(get_pypi_dependencies_batch(list(specs.values())))
+            all_pkgs = {}
+            for all_deps in fetch_map(get_pypi_package_dependencies, list(specs)):
+                for dep, version in all_deps.items():
+                    all_pkgs.setdefault(dep, version)
+            return all_pkgs
+
+    def resolve_graph(self, specs):
+        """Resolve in-process, see resolve_pypi_dependency_graph."""
+        return resolve_pypi_dependency_graph(list(specs.values()))
+
+    def fetch_metadata(self, package):
+        """Return the reduced project document, see get_pypi_project."""
+        return get_pypi_project(package)
+
+    def extract_repo(self, metadata):
+        """Return the best ranked GitHub repository of a project."""
+        return get_github_url_from_pypi_json(metadata)
+
+    def latest_version(self, metadata):
+        """Return the latest release of a project."""
+        return metadata["info"].get("version")
+
+    def canonical_name(self, name):
+        """Normalize a requirement's name as in PEP 503."""
+        from packaging.utils import canonicalize_name
+
+        return canonicalize_name(name)
 
 
 def parse_requirements_dot_text(filepath):
     """Convert requirements.txt to list of package names
 
-    TODO: considering making this parsing more general such that
-    pipfiles can be parsed too. See this library for one
-    potential solution: https://github.com/sarugaku/requirementslib
-
     Args:
         filepath (str): filepath to a requirements.txt file
 
@@ -94,15 +183,342 @@ def parse_requirements_dot_text(filepath):
     """
 
     # pylint: disable="no-member"
+    import requirements
 
     pkgs = []
-    with open(filepath, "r") as file:
+    with profiling.stage("parse_manifest"), open(filepath, "r") as file:
         for req in requirements.parse(file):
             pkgs.append(req.name)
 
     return pkgs
 
 
+def parse_requirements_dot_text_specs(filepath):
+    """Convert requirements.txt to PEP 508 requirement strings
+
+    Unlike parse_requirements_dot_text, extras and version specifiers
+    are kept, e.g. "requests[socks]>=2.31,<3".
+
+    Args:
+        filepath (str): filepath to a requirements.txt file
+
+    Returns:
+        list - requirement strings, skipping entries without a name
+    """
+
+    return [spec for _, spec in _parse_requirement_specs(filepath)]
+
+
+def _parse_requirement_specs(filepath):
+    """List (name, PEP 508 string) pairs of a requirements.txt's entries."""
+
+    # pylint: disable="no-member"
+    import requirements
+
+    specs = []
+    with profiling.stage("parse_manifest"), open(filepath, "r") as file:
+        for req in requirements.parse(file):
+            if not req.name:
+                continue
+            spec = req.name
+            if req.extras:
+                spec += "[" + ",".join(req.extras) + "]"
+            spec += ",".join(operator + version for operator, version in req.specs)
+            specs.append((req.name, spec))
+
+    return specs
+
+
+def _parse_pyproject_specs(filepath):
+    """List (name, PEP 508 string) pairs of a pyproject.toml's dependencies.
+
+    Reads the PEP 621 [project] dependencies and Poetry's
+    [tool.poetry.dependencies]; optional and development dependencies
+    are left out, as are [project] entries that are not valid PEP 508.
+    """
+    import tomli
+
+    with profiling.stage("parse_manifest"), open(filepath, "rb") as toml_file:
+        pyproject = tomli.load(toml_file)
+    specs = []
+    for spec in pyproject.get("project", {}).get("dependencies", []):
+        req = _parse_requirement(spec)
+        if req is None:
+            logger.warning("skipping invalid requirement %r in %s", spec, filepath)
+            continue
+        specs.append((req.name, spec))
+    poetry_dependencies = pyproject.get("tool", {}).get("poetry", {}).get("dependencies", {})
+    for name, constraint in poetry_dependencies.items():
+        if name.lower() == "python":
+            continue
+        if isinstance(constraint, list):
+            # multiple constraints, one table per python version or platform
+            tables = [
+                table
+                for table in constraint
+                if isinstance(table, dict) and not table.get("optional")
+            ]
+            if not tables:
+                continue
+            constraint = tables[0]
+        if isinstance(constraint, dict):
+            if constraint.get("optional"):
+                continue
+            constraint = constraint.get("version", "*")
+        specs.append((name, name + _poetry_specifier(constraint)))
+    return specs
+
+
+def _parse_pipfile_specs(filepath):
+    """List (name, PEP 508 string) pairs of a Pipfile's [packages]."""
+    import tomli
+
+    with profiling.stage("parse_manifest"), open(filepath, "rb") as toml_file:
+        pipfile = tomli.load(toml_file)
+    specs = []
+    for name, specifier in pipfile.get("packages", {}).items():
+        if isinstance(specifier, dict):
+            specifier = specifier.get("version", "*")
+        specs.append((name, name if specifier == "*" else name + specifier))
+    return specs
+
+
+def _poetry_specifier(constraint):
+    """Translate a Poetry version constraint into a PEP 440 specifier.
+
+    Caret (^1.2 means >=1.2,<2.0.0) and tilde (~1.2 means >=1.2,<1.3.0)
+    constraints are expanded and bare versions pinned; alternatives
+    (1.0 || 2.0) are dropped, others are PEP 440 already.
+    """
+    constraint = constraint.strip()
+    if constraint in ("", "*") or "||" in constraint:
+        return ""
+    if constraint[0].isdigit():
+        return "==" + constraint
+    if constraint[0] not in "^~" or constraint.startswith("~="):
+        return constraint
+    version = constraint[1:].strip()
+    parts = [int(part) for part in version.split(".") if part.isdigit()]
+    if constraint[0] == "^":
+        # bump the first non-zero component, or the last one given
+        position = next((index for index, part in enumerate(parts) if part), len(parts) - 1)
+    else:
+        position = 0 if len(parts) == 1 else 1
+    upper = parts[:position] + [parts[position] + 1]
+    upper += [0] * (3 - len(upper))
+    return f">={version},<{'.'.join(map(str, upper))}"
+
+
+def resolve_pypi_dependency_graph(requirement_strings, environment=None):
+    """Resolve the transitive dependencies of Python requirements in-process.
+
+    Reads requires_dist from the PyPI JSON API and walks every requirement
+    as one graph, breadth first, fetching each level concurrently. Each
+    project is resolved to a single version the first time it is reached
+    (later specifiers for the same project are not backtracked over), so
+    the cost grows with the number of unique projects. Environment markers
+    are evaluated with packaging against the current interpreter.
+
+    Args:
+        requirement_strings (list of str) - PEP 508 requirements
+        environment (dict) - marker environment overriding the defaults
+
+    Returns:
+        dict - closure: list of (name, version) in breadth-first order,
+            edges: list of ((name, version), (name, version)) pairs,
+            not_found: names of requirements missing from PyPI
+    """
+    # pylint: disable=too-many-locals
+    from packaging.markers import default_environment
+    from packaging.utils import canonicalize_name
+
+    marker_environment = default_environment()
+    marker_environment.update(environment or {})
+
+    versions = {}  # canonical name -> chosen version, None if missing
+    expanded_extras = {}  # node -> extras whose requirements were expanded
+    requires_dist = {}  # node -> declared requirements
+    closure = []
+    edges = []
+    seen_edges = set()
+    not_found = []
+
+    frontier = [(None, _parse_requirement(spec)) for spec in requirement_strings]
+    while frontier:
+        # the first specifier seen for a project decides its version
+        specifiers = {}
+        for _, req in frontier:
+            if req is not None:
+                specifiers.setdefault(canonicalize_name(req.name), req.specifier)
+        names = [name for name in specifiers if name not in versions]
+        for name, project in zip(names, fetch_map(get_pypi_project, names)):
+            versions[name] = project and select_pypi_version(project, specifiers[name])
+
+        # requires_dist of every newly reached node, fetched concurrently
+        new_nodes = [
+            (name, versions[name]) for name in specifiers
+            if versions[name] and (name, versions[name]) not in expanded_extras
+        ]
+        for node, requires in zip(new_nodes, fetch_map(_get_requires_dist_for_node, new_nodes)):
+            expanded_extras[node] = set()
+            requires_dist[node] = [
+                req for req in map(_parse_requirement, requires) if req is not None
+            ]
+            closure.append(node)
+
+        next_frontier = []
+        for parent, req in frontier:
+            if req is None:
+                continue
+            name = canonicalize_name(req.name)
+            if not versions[name]:
+                if name not in not_found:
+                    not_found.append(name)
+                continue
+            node = (name, versions[name])
+            if parent is not None and (parent, node) not in seen_edges:
+                seen_edges.add((parent, node))
+                edges.append((parent, node))
+
+            extras = ({""} | set(req.extras)) - expanded_extras[node]
+            expanded_extras[node] |= extras
+            for dep_req in requires_dist[node]:
+                if _marker_matches(dep_req, extras, marker_environment):
+                    next_frontier.append((node, dep_req))
+        frontier = next_frontier
+
+    return {"closure": closure, "edges": edges, "not_found": not_found}
+
+
+def select_pypi_version(project, specifier=""):
+    """Pick the newest non-yanked release matching a specifier.
+
+    Prereleases are only chosen when no final release matches, as pip
+    does.
+
+    Args:
+        project (dict) - reduced project document from get_pypi_project
+        specifier (SpecifierSet or str) - e.g. ">=2.0,<3"
+
+    Returns:
+        str - chosen version, None if no release matches
+    """
+    from packaging.specifiers import SpecifierSet
+
+    candidates = {}
+    for version in project["versions"]:
+        try:
+            candidates[Version(version)] = version
+        except InvalidVersion:
+            continue
+
+    matching = list(SpecifierSet(str(specifier)).filter(candidates))
+    if not matching:
+        return None
+    return candidates[max(matching)]
+
+
+def get_pypi_project(pkg):
+    """Retrieve a reduced PyPI project document, once per run.
+
+    The document keeps the "info" section (so it can be passed to
+    get_github_url_from_pypi_json) and the list of installable,
+    non-yanked release versions.
+
+    Args:
+        pkg (str): the name of a python package found on PyPI
+
+    Returns:
+        dict - info and versions, None if the package is not on PyPI
+    """
+    from packaging.utils import canonicalize_name
+
+    name = canonicalize_name(pkg)
+    with _projects_lock:
+        if name in _projects:
+            return _projects[name]
+
+    with profiling.stage("fetch_metadata"):
+        pypi_pkg_json = get_pypi_data_json(name)
+    project = None
+    if pypi_pkg_json and "info" in pypi_pkg_json:
+        project = {
+            "info": pypi_pkg_json["info"],
+            "versions": [
+                version for version, files in pypi_pkg_json.get("releases", {}).items()
+                if files and not all(file.get("yanked") for file in files)
+            ],
+        }
+        # the project document already carries the latest requires_dist
+        latest = (name, pypi_pkg_json["info"].get("version"))
+        with _projects_lock:
+            _requires_dist.setdefault(latest, pypi_pkg_json["info"].get("requires_dist") or [])
+
+    with _projects_lock:
+        return _projects.setdefault(name, project)
+
+
+def get_pypi_requires_dist(pkg, version):
+    """Retrieve the requirements declared by one release of a package.
+
+    Args:
+        pkg (str): the name of a python package found on PyPI
+        version (str): the release version
+
+    Returns:
+        list - PEP 508 requirement strings, empty if none are declared
+    """
+    from packaging.utils import canonicalize_name
+
+    name = canonicalize_name(pkg)
+    with _projects_lock:
+        if (name, version) in _requires_dist:
+            return _requires_dist[(name, version)]
+
+    with profiling.stage("fetch_metadata"):
+        release_json = get_json(PYPI_URL + name + "/" + version + "/json")
+    requires = (release_json.get("info") or {}).get("requires_dist") or []
+
+    with _projects_lock:
+        return _requires_dist.setdefault((name, version), requires)
+
+
+def clear_pypi_project_cache():
+    """Forget every PyPI project document retrieved so far in this run."""
+    with _projects_lock:
+        _projects.clear()
+        _requires_dist.clear()
+
+
+def _get_requires_dist_for_node(node):
+    """Call get_pypi_requires_dist with a (name, version) tuple."""
+    return get_pypi_requires_dist(*node)
+
+
+def _parse_requirement(spec):
+    """Parse a PEP 508 string, returning None if it is not valid."""
+    from packaging.requirements import InvalidRequirement, Requirement
+
+    try:
+        return Requirement(spec)
+    except InvalidRequirement:
+        return None
+
+
+def _marker_matches(req, extras, environment):
+    """Check a requirement's marker for any of the newly active extras.
+
+    The empty extra stands for the base requirements of a package, so
+    requirements whose marker does not mention an extra only match it.
+    """
+    if req.marker is None or "extra" not in str(req.marker):
+        base = "" in extras
+        return base and (req.marker is None or req.marker.evaluate(dict(environment, extra="")))
+    return any(
+        req.marker.evaluate(dict(environment, extra=extra)) for extra in extras if extra
+    )
+
+
 def get_pypi_package_dependencies(pkg):
     """Determine dependencies for a PyPI package
 
@@ -121,7 +537,7 @@ def get_pypi_package_dependencies(pkg):
 
         # convert ouput to string and then dict
         str_result = result.stdout.decode("UTF-8")
-        dict_result = ast.literal_eval(str_result)
+        dict_result = json.loads(str_result)
     # if pkg doesn't exist, return empty dict
     except subprocess.CalledProcessError:
         dict_result = {}
@@ -129,6 +545,40 @@ def get_pypi_package_dependencies(pkg):
     return dict_result
 
 
+def get_pypi_dependencies_batch(requirement_strings):
+    """Determine dependencies for many requirements with one pipgrip run
+
+    Every requirement is handed to a single pipgrip resolution, so shared
+    subtrees are resolved once and only one process is spawned. If the
+    joint resolution fails (e.g. one requirement is not on PyPI), each
+    requirement is resolved on its own instead so the others still
+    produce results.
+
+    Args:
+        requirement_strings (list of str): requirements with specifiers
+
+    Returns:
+        dict: package name -> resolved version for the whole set
+    """
+    if not requirement_strings:
+        return {}
+
+    try:
+        command = ["pipgrip", "--json"] + list(requirement_strings)
+        result = subprocess.run(command, capture_output=True, check=True)
+        return json.loads(result.stdout.decode("UTF-8"))
+    except subprocess.CalledProcessError:
+        logger.warning(
+            "pipgrip could not resolve the requirements together, "
+            "falling back to one resolution per requirement"
+        )
+
+    dict_result = {}
+    for deps in fetch_map(get_pypi_package_dependencies, requirement_strings):
+        dict_result.update(deps)
+    return dict_result
+
+
 def get_pypi_data_json(pkg):
     """Return PyPI json associated with a python package.
 
@@ -139,9 +589,8 @@ def get_pypi_data_json(pkg):
         dict: data related to a PyPI package
     """
     try:
-        pkg_url = "https://pypi.org/pypi/" + pkg + "/json"
-        response = requests.get(pkg_url)
-        pypi_pkg_json = response.json()
+        pkg_url = PYPI_URL + pkg + "/json"
+        pypi_pkg_json = get_json(pkg_url)
     # if no package found, return empty json
     except urllib.error.HTTPError:
         pypi_pkg_json = {}
@@ -152,42 +601,98 @@ def get_pypi_data_json(pkg):
 def get_github_url_from_pypi_json(pypi_pkg_json):
     """Retrieve GitHub URL associated with a PyPI json.
 
-    Search for potential GitHub URLs, identify them,
-    and then return a properly formatted GitHub repository link.
+    Picks the highest ranked GitHub candidate from
+    rank_repo_url_candidates and returns it as a properly formatted
+    GitHub repository link.
 
     Args:
         pypi_pkg_json: a json blob of PyPI package data
 
     Returns:
-        str: GitHub URL
-    """
-    github_page = ""
-    potential_github_fields = []
-
-    # check home page url
-    if pypi_pkg_json["info"]["home_page"] is not None and "github.com" in pypi_pkg_json["info"]["home_page"]:
-        potential_github_fields.append(pypi_pkg_json["info"]["home_page"])
-
-    # check project url fields if url fields present
-    if pypi_pkg_json["info"]["project_urls"]:
-        for _, url in pypi_pkg_json["info"]["project_urls"].items():
-            if "github.com" in url:
-                potential_github_fields.append(url)
-
-    # check PyPI description text for any GitHub mentions
-    description = pypi_pkg_json["info"]["description"]
-    if potential_github_fields == [] and description:
-        for token in description.split():
-            if "github.com" in token:
-                potential_github_fields.append(token)
-
-    for field in potential_github_fields:
-        # Any field with github in it must be github link
-        if "github" in field:
-            github_page = field
-            break
-
-    if github_page:
-        github_page = clean_github_link(github_page)
-
-    return github_page
+        str: GitHub URL, empty if none was found
+    """
+    for candidate in rank_repo_url_candidates(pypi_pkg_json):
+        if candidate["host"] == "github.com":
+            return candidate["url"]
+    return ""
+
+
+def extract_repo_url_from_pypi_json(pypi_pkg_json):
+    """Retrieve the most likely repository URL on any supported code host.
+
+    Args:
+        pypi_pkg_json: a json blob of PyPI package data
+
+    Returns:
+        dict: best candidate from rank_repo_url_candidates, None if none
+    """
+    candidates = rank_repo_url_candidates(pypi_pkg_json)
+    return candidates[0] if candidates else None
+
+
+def rank_repo_url_candidates(pypi_pkg_json):
+    """Score every repository URL mentioned in PyPI metadata.
+
+    Candidates come from project_urls (a "Source"/"Repository"/"Code"
+    entry is trusted most, "Homepage" next, others such as "Issues"
+    less), home_page and download_url. When none of those is on GitHub
+    (say project_urls only has a GitLab mirror and the docs), the
+    description is scanned too, in one compiled-regex pass that keeps
+    its first repository link and stops at the first GitHub one. Each
+    field that agrees on the same repository adds a little confidence.
+
+    Args:
+        pypi_pkg_json: a json blob of PyPI package data
+
+    Returns:
+        list of dict: url (https://host/owner/repo), host, source (the
+            metadata field) and confidence in [0, 1], best first
+    """
+    info = (pypi_pkg_json or {}).get("info") or {}
+    fields = []
+    for label, url in (info.get("project_urls") or {}).items():
+        confidence = PROJECT_URL_CONFIDENCE.get(
+            label.strip().lower(), OTHER_PROJECT_URL_CONFIDENCE
+        )
+        fields.append((f"project_urls.{label}", url, confidence))
+    fields.append(("home_page", info.get("home_page"), HOME_PAGE_CONFIDENCE))
+    fields.append(("download_url", info.get("download_url"), DOWNLOAD_URL_CONFIDENCE))
+
+    candidates = {}
+    for source, url, confidence in fields:
+        parsed = parse_repo_url(url) if mentions_repo_host(url) else None
+        if parsed is None or parsed[1].lower() in NON_REPO_OWNERS:
+            continue
+        _add_repo_url_candidate(candidates, parsed, source, confidence)
+
+    if not any(candidate["host"] == "github.com" for candidate in candidates.values()):
+        described = False
+        for parsed in iter_repo_urls(info.get("description")):
+            if parsed[1].lower() in NON_REPO_OWNERS:
+                continue
+            if parsed[0] == "github.com" or not described:
+                _add_repo_url_candidate(candidates, parsed, "description", DESCRIPTION_CONFIDENCE)
+                described = True
+            if parsed[0] == "github.com":
+                break
+
+    return sorted(candidates.values(), key=lambda candidate: -candidate["confidence"])
+
+
+def _add_repo_url_candidate(candidates, parsed, source, confidence):
+    """Record a candidate, corroborating an already seen repository."""
+    key = "/".join(parsed).lower()
+    if key in candidates:
+        candidate = candidates[key]
+        if confidence > candidate["confidence"]:
+            candidate["source"] = source
+        candidate["confidence"] = min(
+            1.0, max(confidence, candidate["confidence"]) + CORROBORATION_BONUS
+        )
+        return
+    candidates[key] = {
+        "url": "https://" + "/".join(parsed),
+        "host": parsed[0],
+        "source": source,
+        "confidence": confidence,
+    }
@@ -0,0 +1,258 @@
+"""Persistent, queryable store of package -> repository results."""
+
+import os
+import sqlite3
+import threading
+import time
+
+from constants import DEFAULT_RESULTS_PATH
+from urls import repo_key
+
+
+BATCH_SIZE = 10000
+QUERY_FIELDS = ("manifest", "ecosystem", "package", "version", "repo_url", "status")
+
+# one row per manifest, package and link, upserted by every scan: first_scan
+# is kept from the scan that first recorded the row, last_scan and seen_at
+# follow the latest one. Rows a new scan of their manifest no longer reports
+# are dropped when the scan finishes, so the table describes the latest scan
+# of every manifest.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS results (
+    manifest TEXT NOT NULL,
+    ecosystem TEXT NOT NULL,
+    package TEXT NOT NULL,
+    version TEXT,
+    repo_url TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    status TEXT NOT NULL,
+    first_scan INTEGER NOT NULL,
+    last_scan INTEGER NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (manifest, ecosystem, package, repo_url)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_repo ON results (repo, manifest);
+CREATE INDEX IF NOT EXISTS results_first_scan ON results (first_scan);
+"""
+_UPSERT = """
+INSERT INTO results (
+    manifest, ecosystem, package, version, repo_url, repo, status,
+    first_scan, last_scan, seen_at
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (manifest, ecosystem, package, repo_url) DO UPDATE SET
+    version = excluded.version,
+    repo = excluded.repo,
+    status = excluded.status,
+    last_scan = excluded.last_scan,
+    seen_at = excluded.seen_at
+"""
+_SELECT = "SELECT " + ", ".join(QUERY_FIELDS) + " FROM results "
+
+
+def _manifest_key(manifest):
+    """Identify a manifest by its absolute path, empty if unknown."""
+    return os.path.abspath(manifest) if manifest else ""
+
+
+class ResultsStore:
+    """SQLite index of the repositories every scanned manifest depends on.
+
+    Records are written in batches through executemany, all of a scan in
+    one transaction, and indexed both by manifest and by repository, so
+    reverse lookups over thousands of manifests need no registry access.
+
+    Args:
+        path (str) - SQLite file, created if missing
+    """
+
+    def __init__(self, path=DEFAULT_RESULTS_PATH):
+        self.path = os.path.expanduser(path)
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.scan = None
+        self._manifests = set()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+
+    def begin_scan(self):
+        """Start recording a scan.
+
+        Returns:
+            int - id of the scan
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT INTO scans (started_at) VALUES (?)", (time.time(),)
+            )
+            self.scan = cursor.lastrowid
+            self._manifests = set()
+        return self.scan
+
+    def add_many(self, records, manifest=None):
+        """Record the results of the current scan.
+
+        Args:
+            records (iterable of dict) - records of output.make_record,
+                optionally with a "manifest" field
+            manifest (str) - manifest of the records without one
+        """
+        if self.scan is None:
+            self.begin_scan()
+        now = time.time()
+        # a batch repeats few manifests and repositories, normalize each once
+        manifests = {}
+        repos = {}
+        rows = []
+        for record in records:
+            manifest_name = record.get("manifest") or manifest
+            path = manifests.get(manifest_name)
+            if path is None:
+                path = manifests[manifest_name] = _manifest_key(manifest_name)
+            repo_url = record["repo_url"] or ""
+            repo = repos.get(repo_url)
+            if repo is None:
+                repo = repos[repo_url] = repo_key(repo_url) or repo_url
+            rows.append((
+                path,
+                record["ecosystem"],
+                record["package"] or "",
+                record["version"],
+                repo_url,
+                repo,
+                record["status"],
+                self.scan,
+                self.scan,
+                now,
+            ))
+        self._manifests.update(manifests.values())
+        with self._lock:
+            self._connection.executemany(_UPSERT, rows)
+
+    def finish_scan(self):
+        """Drop what the scanned manifests no longer report and commit the scan."""
+        if self.scan is None:
+            return
+        with self._lock:
+            self._connection.executemany(
+                "DELETE FROM results WHERE manifest = ? AND last_scan < ?",
+                ((manifest, self.scan) for manifest in self._manifests),
+            )
+            self._connection.execute(
+                "UPDATE scans SET finished_at = ? WHERE id = ?", (time.time(), self.scan)
+            )
+            self._connection.commit()
+            self.scan = None
+            self._manifests = set()
+
+    def _select(self, where, params):
+        """Return the result rows matching a WHERE clause as dicts."""
+        with self._lock:
+            rows = self._connection.execute(_SELECT + where, params).fetchall()
+        return [dict(zip(QUERY_FIELDS, row)) for row in rows]
+
+    def dependents(self, repo):
+        """List the manifests depending on a repository, directly or transitively.
+
+        Args:
+            repo (str) - repository URL, e.g. github.com/urllib3/urllib3
+
+        Returns:
+            list of dict - the QUERY_FIELDS of every package of every
+                manifest that maps to the repository
+        """
+        return self._select(
+            "WHERE repo = ? ORDER BY manifest, package", (repo_key(repo) or repo,)
+        )
+
+    def manifest_repos(self, manifest):
+        """List the packages of a manifest and their repositories.
+
+        Args:
+            manifest (str) - path of the manifest as it was scanned
+
+        Returns:
+            list of dict - the QUERY_FIELDS of every package of the manifest
+        """
+        return self._select(
+            "WHERE manifest = ? ORDER BY ecosystem, package", (_manifest_key(manifest),)
+        )
+
+    def new_since(self, scan=None):
+        """List the results first recorded after a scan.
+
+        Args:
+            scan (int) - id of the earlier scan, by default the one before
+                the latest finished scan
+
+        Returns:
+            list of dict - the QUERY_FIELDS of every new result
+        """
+        if scan is None:
+            with self._lock:
+                finished = self._connection.execute(
+                    "SELECT id FROM scans WHERE finished_at IS NOT NULL "
+                    "ORDER BY id DESC LIMIT 2"
+                ).fetchall()
+            scan = finished[1][0] if len(finished) > 1 else 0
+        return self._select("WHERE first_scan > ? ORDER BY manifest, package", (scan,))
+
+    def scans(self):
+        """List the recorded scans, oldest first.
+
+        Returns:
+            list of dict - id, started_at and finished_at (None for an
+                unfinished scan) of every scan
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, started_at, finished_at FROM scans ORDER BY id"
+            ).fetchall()
+        return [dict(zip(("id", "started_at", "finished_at"), row)) for row in rows]
+
+    def close(self):
+        """Finish the current scan and close the database."""
+        self.finish_scan()
+        with self._lock:
+            self._connection.close()
+
+
+class ResultsSink:
+    """Wrap a sink so every record is also recorded in a ResultsStore.
+
+    Records are buffered and written in batches of BATCH_SIZE.
+
+    Args:
+        store (ResultsStore) - where records are recorded
+        sink - output sink the records are passed on to
+        manifest (str) - manifest of the records without a "manifest" field
+    """
+
+    def __init__(self, store, sink, manifest=None):
+        self._store = store
+        self._sink = sink
+        self._manifest = manifest
+        self._pending = []
+
+    def write(self, record):
+        """Write one record as soon as it is available."""
+        self._sink.write(record)
+        self._pending.append(record)
+        if len(self._pending) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Record the buffered records."""
+        if self._pending:
+            self._store.add_many(self._pending, self._manifest)
+            self._pending = []
+
+    def close(self):
+        """Record the buffered records and close the wrapped sink."""
+        self.flush()
+        self._sink.close()
@@ -0,0 +1,296 @@
+"""Long-running resolver service keeping backends and caches warm.
+
+Every CLI run is a fresh process that imports the ecosystem modules,
+opens new registry connections and forgets everything it retrieved on
+exit. serve() instead keeps one backend per ecosystem resident, with the
+pooled keep-alive connections of the fetch engine and the bounded
+metadata and resolution caches of lru.py, and answers manifests sent
+over a local HTTP port or Unix socket:
+
+- POST /scan?filename=requirements.txt with the manifest as body, or
+  POST /scan?path=/checkout/package.json to read a local manifest (and
+  the lockfile next to it), streams one JSON record per package back
+  as each lookup completes. Add no_deps=1 to skip transitive
+  dependencies.
+- GET /stats answers the scan count and latencies, the cache hit rates
+  and the per-host request profile as JSON.
+"""
+
+import io
+import json
+import logging
+import os
+import signal
+import socketserver
+import tempfile
+import threading
+import time
+from collections import deque
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import fetch
+import lru
+import profiling
+from backends import get_backend, lookup_records
+from bulk import MANIFEST_ECOSYSTEMS
+from output import JsonlSink
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_ENTRIES = 100000
+LATENCY_WINDOW = 1000  # scans kept for the latency percentiles
+
+logger = logging.getLogger(__name__)
+
+
+class ResolverService:
+    """Backends and metrics shared by every request of a server.
+
+    Args:
+        julia_registry (str) - Julia registry checkout for Project.toml
+            manifests, None to reject them
+        resolver (str) - how Python dependencies are resolved, see
+            pypi.RESOLVERS
+    """
+
+    def __init__(self, julia_registry=None, resolver="builtin"):
+        self.julia_registry = julia_registry
+        self.resolver = resolver
+        self.started = time.monotonic()
+        self.scans = 0
+        self.failures = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._backends = {}
+        self._lock = threading.Lock()
+
+    def ecosystem(self, filename):
+        """Name the ecosystem of a manifest file, None if it is not supported."""
+        ecosystem = MANIFEST_ECOSYSTEMS.get(os.path.basename(filename))
+        if ecosystem == "julia" and self.julia_registry is None:
+            return None
+        return ecosystem
+
+    def backend(self, ecosystem):
+        """Return the resident backend of an ecosystem, creating it on first use."""
+        with self._lock:
+            if ecosystem not in self._backends:
+                if ecosystem == "julia":
+                    options = {"registry": self.julia_registry}
+                elif ecosystem == "pypi":
+                    options = {"resolver": self.resolver}
+                else:
+                    options = {}
+                self._backends[ecosystem] = get_backend(ecosystem, **options)
+            return self._backends[ecosystem]
+
+    def scan(self, manifest, sink, no_deps=False):
+        """Write the record of every package a manifest depends on.
+
+        Args:
+            manifest (str) - manifest path, see MANIFEST_ECOSYSTEMS
+            sink - output sink receiving the records as lookups complete
+            no_deps (bool) - only look up the packages the manifest names
+
+        Returns:
+            int - number of records written
+        """
+        start = time.perf_counter()
+        try:
+            backend = self.backend(self.ecosystem(manifest))
+            pkgs = backend.list_packages(manifest, no_deps)
+            lookup_records(backend, pkgs.items(), sink)
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        with self._lock:
+            self.scans += 1
+            self._latencies.append(time.perf_counter() - start)
+        return len(pkgs)
+
+    def stats(self):
+        """Summarize what the service did so far.
+
+        Returns:
+            dict - uptime_seconds, scans, failures, scan_latency_ms (p50,
+                p95 and max over the last LATENCY_WINDOW scans), fetch
+                (fetch.stats), caches (lru.stats) and profile (per-stage
+                and per-host timings, see profiling.summary)
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            scans, failures = self.scans, self.failures
+        scan_latency = {}
+        if latencies:
+            scan_latency = {
+                "p50": _percentile_ms(latencies, 0.5),
+                "p95": _percentile_ms(latencies, 0.95),
+                "max": _percentile_ms(latencies, 1),
+            }
+        return {
+            "uptime_seconds": round(time.monotonic() - self.started, 3),
+            "scans": scans,
+            "failures": failures,
+            "scan_latency_ms": scan_latency,
+            "fetch": fetch.stats(),
+            "caches": lru.stats(),
+            "profile": profiling.summary(),
+        }
+
+
+def _percentile_ms(latencies, fraction):
+    """Pick a percentile of sorted latencies in seconds, in milliseconds."""
+    index = min(len(latencies) - 1, int(len(latencies) * fraction))
+    return round(latencies[index] * 1000, 3)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """Answer /scan and /stats requests with the server's ResolverService."""
+
+    server_version = "deps2repos"
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Answer GET /stats."""
+        if urlsplit(self.path).path != "/stats":
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        body = json.dumps(self.server.service.stats(), indent=2).encode()
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Answer POST /scan, streaming JSON records back."""
+        url = urlsplit(self.path)
+        if url.path != "/scan":
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        query = parse_qs(url.query)
+        no_deps = query.get("no_deps", ["0"])[0].lower() in ("1", "true", "yes")
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if "path" in query:
+            manifest = query["path"][0]
+            if not os.path.exists(manifest):
+                self.send_error(HTTPStatus.NOT_FOUND, f"no manifest at {manifest}")
+                return
+            self._scan(manifest, no_deps)
+            return
+        filename = os.path.basename(query.get("filename", [""])[0])
+        if not filename:
+            self.send_error(HTTPStatus.BAD_REQUEST, "give the manifest filename or path")
+            return
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = os.path.join(directory, filename)
+            with open(manifest, "wb") as manifest_file:
+                manifest_file.write(body)
+            self._scan(manifest, no_deps)
+
+    def _scan(self, manifest, no_deps):
+        """Stream the records of a manifest as JSON lines."""
+        service = self.server.service
+        if service.ecosystem(manifest) is None:
+            self.send_error(
+                HTTPStatus.BAD_REQUEST, f"not a supported manifest: {os.path.basename(manifest)}"
+            )
+            return
+        # records are streamed as they complete, so the response has no
+        # length and ends when the connection closes
+        self.close_connection = True
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        stream = io.TextIOWrapper(self.wfile, encoding="utf-8", write_through=True)
+        try:
+            service.scan(manifest, JsonlSink(stream), no_deps)
+        except Exception as error:  # pylint: disable=broad-except
+            # the status line is already sent, so the error ends the stream
+            logger.exception("Scan of %s failed", manifest)
+            stream.write(json.dumps({"error": str(error)}) + "\n")
+        finally:
+            stream.detach()
+
+    def address_string(self):
+        """Name the client, which has no address on a Unix socket."""
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return "unix-socket"
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Log requests through logging instead of printing them."""
+        logger.info("%s %s", self.address_string(), format % args)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server listening on a Unix socket, one thread per request."""
+
+    daemon_threads = True
+
+
+def _terminate(signum, frame):  # pylint: disable=unused-argument
+    """Stop serving on SIGTERM like on Ctrl-C."""
+    raise SystemExit(0)
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+    """Create the HTTP server answering requests with a service.
+
+    Args:
+        service (ResolverService) - answers every request
+        host (str) - address to listen on
+        port (int) - TCP port, 0 for any free port
+        socket_path (str) - listen on this Unix socket instead of TCP
+
+    Returns:
+        socketserver.BaseServer - call serve_forever() to answer requests
+    """
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = _UnixHTTPServer(socket_path, _RequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), _RequestHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def serve(
+    service,
+    host=DEFAULT_HOST,
+    port=DEFAULT_PORT,
+    socket_path=None,
+    max_entries=DEFAULT_MAX_ENTRIES,
+    ttl=None,
+):
+    """Answer manifests with resident backends until interrupted or terminated.
+
+    Args:
+        service (ResolverService) - answers every request
+        host (str) - address to listen on
+        port (int) - TCP port
+        socket_path (str) - listen on this Unix socket instead of TCP
+        max_entries (int) - entries kept per metadata and resolution cache
+        ttl (float) - seconds cached metadata and resolutions are reused
+
+    Returns:
+        None
+    """
+    lru.configure(max_entries=max_entries, ttl=ttl)
+    if not profiling.enabled():
+        profiling.enable()
+    server = make_server(service, host, port, socket_path)
+    logger.info("Serving on %s", socket_path or f"http://{host}:{server.server_address[1]}")
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        logger.info("Shutting down")
+    finally:
+        server.server_close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.unlink(socket_path)
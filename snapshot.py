@@ -0,0 +1,246 @@
+"""Local registry snapshots for resolving packages without the network."""
+
+import json
+import os
+import sqlite3
+import threading
+from urllib.parse import unquote
+
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion, Version
+
+from npm import NPM_REGISTRY_URL
+from pypi import PYPI_URL
+
+
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+MMAP_SIZE = 1 << 30
+COMMIT_EVERY = 1000
+
+
+def snapshot_key(url):
+    """Map a registry URL to the key its document is stored under.
+
+    PyPI project documents are keyed pypi/{name}, release documents
+    pypi/{name}/{version} (names canonicalized) and npm packuments
+    npm/{name}, so npm/@scope/name for scoped packages.
+
+    Args:
+        url (str) - PyPI JSON API or npm registry URL
+
+    Returns:
+        str - the key, None for URLs of other registries
+    """
+    if url.startswith(PYPI_URL):
+        parts = [part for part in url[len(PYPI_URL):].split("/") if part]
+        if parts and parts[-1] == "json":
+            parts.pop()
+        if not parts:
+            return None
+        return "/".join(["pypi", canonicalize_name(parts[0])] + parts[1:])
+    if url.startswith(NPM_REGISTRY_URL):
+        name = unquote(url[len(NPM_REGISTRY_URL):]).strip("/")
+        return "npm/" + name if name else None
+    return None
+
+
+class _Snapshot:
+    """Address documents by registry URL on top of key-based storage."""
+
+    def lookup(self, url):
+        """Return the stored document body for a URL, None if absent."""
+        key = snapshot_key(url)
+        return None if key is None else self.lookup_key(key)
+
+    def record(self, url, body):
+        """Store the document body retrieved from a URL."""
+        key = snapshot_key(url)
+        if key is not None:
+            self.store_key(key, body)
+
+    def lookup_key(self, key):
+        """Return the document body stored under a key, None if absent."""
+        raise NotImplementedError
+
+    def store_key(self, key, body):
+        """Store a document body under a key."""
+        raise NotImplementedError
+
+    def close(self):
+        """Release the snapshot."""
+
+
+class DirectorySnapshot(_Snapshot):
+    """Registry documents stored as one JSON file per key.
+
+    A project lives in {root}/pypi/{name}.json with its releases in
+    {root}/pypi/{name}/{version}.json, a packument in {root}/npm/{name}.json.
+
+    Args:
+        root (str) - snapshot directory
+    """
+
+    def __init__(self, root):
+        self.root = os.path.expanduser(root)
+
+    def _path(self, key):
+        """Return the file a key is stored in."""
+        return os.path.join(self.root, *key.split("/")) + ".json"
+
+    def lookup_key(self, key):
+        """Return the document body stored under a key, None if absent."""
+        try:
+            with open(self._path(key), "rb") as document_file:
+                return document_file.read()
+        except FileNotFoundError:
+            return None
+
+    def store_key(self, key, body):
+        """Store a document body under a key."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as document_file:
+            document_file.write(body)
+        os.replace(tmp_path, path)
+
+
+class SqliteSnapshot(_Snapshot):
+    """Registry documents stored in a single SQLite file.
+
+    Lookups go through the primary key index and the file is memory
+    mapped, so the snapshot is never loaded into memory as a whole.
+
+    Args:
+        path (str) - SQLite file, created if missing
+    """
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS documents "
+            "(key TEXT PRIMARY KEY, body BLOB NOT NULL) WITHOUT ROWID"
+        )
+        self._connection.commit()
+
+    def lookup_key(self, key):
+        """Return the document body stored under a key, None if absent."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body FROM documents WHERE key = ?", (key,)
+            ).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def store_key(self, key, body):
+        """Store a document body under a key."""
+        self.store_many([(key, body)])
+
+    def store_many(self, documents):
+        """Store many (key, body) pairs, committing in large transactions."""
+        with self._lock:
+            cursor = self._connection.executemany(
+                "INSERT OR REPLACE INTO documents (key, body) VALUES (?, ?)", documents
+            )
+            self._pending += cursor.rowcount
+            if self._pending >= COMMIT_EVERY:
+                self._connection.commit()
+                self._pending = 0
+
+    def close(self):
+        """Commit pending documents and close the database."""
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
+
+
+def open_snapshot(path):
+    """Open a directory or SQLite snapshot, creating it if needed.
+
+    Args:
+        path (str) - a directory, or a file ending in .sqlite, .sqlite3
+            or .db
+
+    Returns:
+        DirectorySnapshot or SqliteSnapshot
+    """
+    path = os.path.expanduser(path)
+    if os.path.isfile(path) or path.endswith(SQLITE_SUFFIXES):
+        return SqliteSnapshot(path)
+    return DirectorySnapshot(path)
+
+
+def import_bigquery_pypi(jsonl_path, snapshot):
+    """Import a PyPI BigQuery metadata export into a snapshot.
+
+    Reads newline-delimited JSON rows of the
+    bigquery-public-data.pypi.distribution_metadata table (one row per
+    uploaded file; name, version, summary, home_page, download_url,
+    project_urls as "Label, URL" strings, requires_dist and description)
+    and writes a release document per version and a project document per
+    package. Rows are streamed, and only the version list of each project
+    is kept in memory.
+
+    Args:
+        jsonl_path (str) - exported JSONL file
+        snapshot (SqliteSnapshot or DirectorySnapshot) - where to write
+
+    Returns:
+        int - number of projects imported
+    """
+    versions = {}  # canonical name -> set of versions
+    latest = {}  # canonical name -> (sort key, version string), finals first
+    with open(jsonl_path, "r") as jsonl_file:
+        for line in jsonl_file:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            name = canonicalize_name(row["name"])
+            version = str(row["version"])
+            if version in versions.setdefault(name, set()):
+                continue  # one row per uploaded file of a release
+            versions[name].add(version)
+            snapshot.store_key(
+                f"pypi/{name}/{version}", json.dumps({"info": _bigquery_info(row)}).encode("UTF-8")
+            )
+            try:
+                parsed = Version(version)
+            except InvalidVersion:
+                continue
+            if name not in latest or (not parsed.is_prerelease, parsed) > latest[name][0]:
+                latest[name] = ((not parsed.is_prerelease, parsed), version)
+
+    for name, project_versions in versions.items():
+        info = {"name": name, "version": None}
+        if name in latest:
+            info = json.loads(snapshot.lookup_key(f"pypi/{name}/{latest[name][1]}"))["info"]
+        project = {
+            "info": info,
+            "releases": {version: [{"yanked": False}] for version in sorted(project_versions)},
+        }
+        snapshot.store_key(f"pypi/{name}", json.dumps(project).encode("UTF-8"))
+    return len(versions)
+
+
+def _bigquery_info(row):
+    """Build a PyPI JSON API "info" section from a BigQuery row."""
+    project_urls = {}
+    for entry in row.get("project_urls") or []:
+        label, _, url = entry.partition(",")
+        if url.strip():
+            project_urls[label.strip()] = url.strip()
+    return {
+        "name": row["name"],
+        "version": str(row["version"]),
+        "summary": row.get("summary"),
+        "home_page": row.get("home_page"),
+        "download_url": row.get("download_url"),
+        "project_urls": project_urls or None,
+        "requires_dist": row.get("requires_dist") or None,
+        "description": row.get("description"),
+    }
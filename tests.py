@@ -1,26 +1,81 @@
 """Tests for deps2repos."""
 
+import io
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
 import unittest
+from http.client import HTTPConnection
+from unittest import mock
+from xml.etree import ElementTree
 
+import requests
+import tomli
+
+import fetch
+import lru
+import profiling
+from backends import EcosystemBackend, get_backend, run_pipeline
+from bulk import analyze_manifests, find_manifests
+from cache import RegistryCache
+from conda import iter_conda_recipes, parse_conda_recipe, render_conda_jinja
+from graph import DependencyGraph
 from julia import (
+    build_julia_package_index,
     extract_repo_link_from_toml_dict,
     find_package_dot_toml_path,
     generate_julia_source_links,
+    iter_julia_source_links,
+    iter_julia_source_links_from_tarball,
     parse_julia_package_dot_toml,
+    resolve_julia_dependencies,
+    update_julia_index,
+)
+from lockfiles import (
+    _JsonStream,
+    find_python_lockfile,
+    iter_npm_lockfile,
+    iter_package_lock_packages,
+    iter_pnpm_lock_packages,
+    iter_python_lockfile,
+    iter_yarn_lock_packages,
 )
 from pypi import (
+    PypiBackend,
+    clear_pypi_project_cache,
     get_github_url_from_pypi_json,
     get_pypi_data_json,
+    get_pypi_dependencies_batch,
     get_pypi_package_dependencies,
     parse_requirements_dot_text,
+    parse_requirements_dot_text_specs,
+    rank_repo_url_candidates,
+    resolve_pypi_dependency_graph,
 )
 from npm import (
+    NpmBackend,
+    clear_npm_packument_cache,
     get_github_link_from_npm_api,
     js_txt_file_analysis,
     parse_package_dot_json,
     get_npm_package_dependencies,
+    resolve_npm_dependency_graph,
 )
-from utils import clean_github_link, find_all_paths
+from lru import LruCache, memory_cache
+from npm_semver import max_satisfying, satisfies
+from output import CsvSink, JsonlSink, TextSink, make_record
+from results import ResultsSink, ResultsStore
+from serve import ResolverService, make_server
+from snapshot import DirectorySnapshot, SqliteSnapshot, import_bigquery_pypi, snapshot_key
+from urls import dedupe_repo_urls, normalize_repo_urls, repo_key
+from utils import clean_github_link, find_all_paths, iter_all_paths
 
 # pylint: disable="attribute-defined-outside-init"
 
@@ -48,6 +103,67 @@ class TestPypiMethods(unittest.TestCase):
             "https://github.com/IQTLabs/NetworkML",
         )
 
+    def test_rank_repo_url_candidates(self):
+        """Check repo links are ranked by the metadata field they came from."""
+        with open("test/pypi_json/requests.json", "r") as json_file:
+            self.requests_test_json = json.load(json_file)
+        self.requests_test_candidates = rank_repo_url_candidates(self.requests_test_json)
+        self.assertEqual(
+            self.requests_test_candidates[0]["url"], "https://github.com/psf/requests"
+        )
+        self.assertEqual(self.requests_test_candidates[0]["source"], "project_urls.Source")
+        self.assertGreater(self.requests_test_candidates[0]["confidence"], 0.9)
+        # tensorflow only links GitHub from download_url (a /tags page)
+        with open("test/pypi_json/tensorflow.json", "r") as json_file:
+            self.tensorflow_test_json = json.load(json_file)
+        self.assertEqual(
+            get_github_url_from_pypi_json(self.tensorflow_test_json),
+            "https://github.com/tensorflow/tensorflow",
+        )
+        self.assertEqual(
+            rank_repo_url_candidates(self.tensorflow_test_json)[0]["source"], "download_url"
+        )
+
+    def test_rank_repo_url_candidates_description(self):
+        """Check the description is only a low-confidence fallback."""
+        with open("test/pypi_json/docutils.json", "r") as json_file:
+            self.docutils_test_json = json.load(json_file)
+        self.docutils_test_candidates = rank_repo_url_candidates(self.docutils_test_json)
+        self.assertEqual(len(self.docutils_test_candidates), 1)
+        self.assertEqual(self.docutils_test_candidates[0]["source"], "description")
+        self.assertLess(self.docutils_test_candidates[0]["confidence"], 0.5)
+        self.sponsor_test_json = {
+            "info": {
+                "home_page": "https://github.com/sponsors/someone",
+                "project_urls": None,
+                "description": "see github.com/owner/repo and github.com/owner/other",
+            }
+        }
+        self.assertEqual(
+            get_github_url_from_pypi_json(self.sponsor_test_json),
+            "https://github.com/owner/repo",
+        )
+        self.assertEqual(rank_repo_url_candidates({}), [])
+
+    def test_rank_repo_url_candidates_description_beside_other_hosts(self):
+        """Check a GitHub link in the description is found next to a GitLab project URL."""
+        self.mirror_test_json = {
+            "info": {
+                "home_page": None,
+                "project_urls": {
+                    "Source": "https://gitlab.com/owner/repo",
+                    "Documentation": "https://repo.readthedocs.io",
+                },
+                "description": "Mirrored at https://github.com/owner/repo-mirror.",
+            }
+        }
+        self.mirror_test_candidates = rank_repo_url_candidates(self.mirror_test_json)
+        self.assertEqual(self.mirror_test_candidates[0]["url"], "https://gitlab.com/owner/repo")
+        self.assertEqual(
+            get_github_url_from_pypi_json(self.mirror_test_json),
+            "https://github.com/owner/repo-mirror",
+        )
+
     def test_get_pypi_package_dependencies(self):
         """Check that pipgrip produces dependency list."""
         self.requests_test_deps = get_pypi_package_dependencies("requests")
@@ -64,10 +180,83 @@ class TestPypiMethods(unittest.TestCase):
             self.test_requirements, ["package_a", "package_b", "package_c"]
         )
 
+    def test_get_pypi_dependencies_batch(self):
+        """Check all requirements are resolved by a single pipgrip run."""
+        output = mock.Mock(stdout=b'{"requests": "2.31.0", "certifi": "2024.2.2"}')
+        with mock.patch("pypi.subprocess.run", return_value=output) as fake_run:
+            self.test_deps = get_pypi_dependencies_batch(["requests>=2", "certifi"])
+        fake_run.assert_called_once()
+        self.assertEqual(
+            fake_run.call_args.args[0], ["pipgrip", "--json", "requests>=2", "certifi"]
+        )
+        self.assertEqual(self.test_deps, {"requests": "2.31.0", "certifi": "2024.2.2"})
+
+    def test_parse_requirements_dot_text_specs(self):
+        """Check requirement strings keep their version specifiers"""
+        self.test_requirements = parse_requirements_dot_text_specs(
+            "test/test_requirements.txt"
+        )
+        self.assertEqual(
+            self.test_requirements,
+            ["package_a==0.0.1", "package_b==0.0.2", "package_c==0.0.3"],
+        )
+
+    def test_resolve_pypi_dependency_graph(self):
+        """Check in-process resolution over a small fake PyPI."""
+
+        def release(version, requires_dist=None):
+            return {"info": {"version": version, "requires_dist": requires_dist}}
+
+        projects = {
+            "web": ("2.1.0", ["2.0.0", "2.1.0", "3.0.0rc1"], {
+                "2.1.0": ["core>=1.0", "fast-json; extra == 'speed'"],
+            }),
+            "core": ("1.5.0", ["0.9.0", "1.5.0"], {
+                "0.9.0": ["legacy; python_version < '3.0'", "tiny-utils"],
+            }),
+            "tiny-utils": ("0.1.0", ["0.1.0"], {"0.1.0": None}),
+            "fast-json": ("4.0.0", ["4.0.0"], {"4.0.0": ["core"]}),
+        }
+
+        def fake_get_json(url):
+            parts = url[len("https://pypi.org/pypi/"):].split("/")
+            if parts[0] not in projects:
+                return {}
+            latest, versions, requires = projects[parts[0]]
+            if len(parts) == 3:
+                return release(parts[1], requires.get(parts[1]))
+            document = release(latest, requires.get(latest))
+            document["releases"] = {version: [{"yanked": False}] for version in versions}
+            return document
+
+        clear_pypi_project_cache()
+        with mock.patch("pypi.get_json", side_effect=fake_get_json):
+            graph = resolve_pypi_dependency_graph(
+                ["Web[speed]>=2.0", "core<1.0", "missing-pkg"],
+                environment={"python_version": "3.10"},
+            )
+        clear_pypi_project_cache()
+
+        self.assertEqual(
+            graph["closure"],
+            [("web", "2.1.0"), ("core", "0.9.0"), ("fast-json", "4.0.0"), ("tiny-utils", "0.1.0")],
+        )
+        self.assertIn((("fast-json", "4.0.0"), ("core", "0.9.0")), graph["edges"])
+        self.assertEqual(graph["not_found"], ["missing-pkg"])
+
 
 class TestNpmMethods(unittest.TestCase):
     """Test npm-related methods."""
 
+    def setUp(self):
+        # answer registry lookups from recorded packuments, not the network
+        clear_npm_packument_cache()
+        fetch.configure(snapshot=DirectorySnapshot("test/registry_snapshot"))
+
+    def tearDown(self):
+        fetch.configure(snapshot=None)
+        clear_npm_packument_cache()
+
     def test_parse_package_dot_json(self):
         """Check parsing package.json files"""
         self.test_package_json = parse_package_dot_json("test/test_package.json")
@@ -105,7 +294,7 @@ class TestNpmMethods(unittest.TestCase):
         self.doesnt_exist_github_link_test = get_github_link_from_npm_api("d3xjhdfh")
         self.assertEqual(
             self.doesnt_exist_github_link_test,
-            [],
+            "",
         )
 
     def test_get_npm_package_dependencies(self):
@@ -127,6 +316,87 @@ class TestNpmMethods(unittest.TestCase):
             [],
         )
 
+    def test_packument_fetched_once(self):
+        """Check deps and repo link are derived from a single fetch."""
+        clear_npm_packument_cache()
+        packument = {
+            "name": "d3-zoom",
+            "dist-tags": {"latest": "3.0.0"},
+            "versions": {"3.0.0": {"dependencies": {"d3-drag": "2 - 3"}}},
+            "repository": {"type": "git", "url": "https://github.com/d3/d3-zoom.git"},
+        }
+        with mock.patch("npm.get_json", return_value=packument) as fake_get_json:
+            self.assertEqual(get_npm_package_dependencies("d3-zoom"), ["d3-drag"])
+            self.assertEqual(
+                get_github_link_from_npm_api("d3-zoom"),
+                "https://github.com/d3/d3-zoom.git",
+            )
+            # an abbreviated request is answered by the full packument
+            get_npm_package_dependencies("d3-zoom", abbreviated=True)
+            self.assertEqual(fake_get_json.call_count, 1)
+        clear_npm_packument_cache()
+
+    def test_abbreviated_packument_request(self):
+        """Check abbreviated metadata is requested by content negotiation."""
+        clear_npm_packument_cache()
+        with mock.patch("npm.get_json", return_value={"error": "Not found"}) as fake_get_json:
+            self.assertEqual(get_npm_package_dependencies("nope", abbreviated=True), [])
+            self.assertIn(
+                "application/vnd.npm.install-v1+json",
+                fake_get_json.call_args.kwargs["headers"]["Accept"],
+            )
+        clear_npm_packument_cache()
+
+    def test_max_satisfying(self):
+        """Check npm range semantics used to pick versions."""
+        versions = ["0.1.0", "0.1.5", "1.2.3", "1.2.9", "1.3.0", "2.0.0-rc.1", "2.1.0"]
+        self.assertEqual(max_satisfying(versions, "^1.2.0"), "1.3.0")
+        self.assertEqual(max_satisfying(versions, "~1.2.0"), "1.2.9")
+        self.assertEqual(max_satisfying(versions, "^0.1.0"), "0.1.5")
+        self.assertEqual(max_satisfying(versions, ">=1.2.3 <1.3 || 0.1.0"), "1.2.9")
+        self.assertEqual(max_satisfying(versions, "1 - 2"), "2.1.0")
+        self.assertEqual(max_satisfying(versions, "*", {"latest": "1.3.0"}), "1.3.0")
+        self.assertEqual(max_satisfying(versions, "next", {"next": "2.0.0-rc.1"}), "2.0.0-rc.1")
+        self.assertIsNone(max_satisfying(versions, "^3.0.0"))
+        self.assertFalse(satisfies("2.0.0-rc.1", ">=1.0.0"))
+        self.assertTrue(satisfies("2.0.0-rc.1", ">=2.0.0-rc.0"))
+
+    def test_resolve_npm_dependency_graph(self):
+        """Check transitive resolution over a small fake registry."""
+        registry = {
+            "app-a": {"dist-tags": {"latest": "1.1.0"}, "versions": {
+                "1.0.0": {"dependencies": {}},
+                "1.1.0": {"dependencies": {"shared": "^2.0.0", "leaf": "1.x"}},
+            }},
+            "app-b": {"dist-tags": {"latest": "3.0.0"}, "versions": {
+                "3.0.0": {"dependencies": {"shared": "~2.1.0", "ghost": "*"}},
+            }},
+            "shared": {"dist-tags": {"latest": "2.1.4"}, "versions": {
+                "2.0.0": {}, "2.1.4": {"dependencies": {"leaf": "^1.0.0"}},
+            }},
+            "leaf": {"dist-tags": {"latest": "1.0.1"}, "versions": {"1.0.1": {}}},
+        }
+
+        def fake_get_json(url, headers=None):
+            return registry.get(url.rsplit("/", 1)[-1], {"error": "Not found"})
+
+        clear_npm_packument_cache()
+        with mock.patch("npm.get_json", side_effect=fake_get_json) as fake:
+            graph = resolve_npm_dependency_graph(
+                {"app-a": "^1.0.0", "app-b": "latest"}, abbreviated=True
+            )
+            self.assertEqual(fake.call_count, 5)
+        clear_npm_packument_cache()
+
+        self.assertEqual(
+            graph["closure"],
+            [("app-a", "1.1.0"), ("app-b", "3.0.0"), ("shared", "2.1.4"), ("leaf", "1.0.1")],
+        )
+        self.assertIn((("app-b", "3.0.0"), ("shared", "2.1.4")), graph["edges"])
+        self.assertIn((("shared", "2.1.4"), ("leaf", "1.0.1")), graph["edges"])
+        self.assertEqual(len(graph["edges"]), 4)
+        self.assertEqual(graph["not_found"], ["ghost"])
+
 
 class TestJuliaMethods(unittest.TestCase):
     """Test Julia-related methods."""
@@ -165,6 +435,61 @@ class TestJuliaMethods(unittest.TestCase):
             self.test_package_dot_toml_path, "test/julia_package_tree/ACME/package.toml"
         )
 
+    def test_find_package_dot_toml_path_prefix_collision(self):
+        """Check a package name does not match a longer package's path"""
+        self.test_package_dot_toml_path = find_package_dot_toml_path(
+            pkg="ACME",
+            toml_path_list=["A/ACMEExtras/package.toml", "A/ACME/package.toml"],
+        )
+        self.assertEqual(self.test_package_dot_toml_path, "A/ACME/package.toml")
+
+    def test_build_julia_package_index(self):
+        """Check name and uuid lookups from Registry.toml"""
+        self.test_index = build_julia_package_index("test/julia_package_tree")
+        self.assertEqual(
+            self.test_index["by_name"]["ACME"],
+            "test/julia_package_tree/ACME/package.toml",
+        )
+        self.assertEqual(
+            self.test_index["by_uuid"]["904a6c7d-4c1b-562f-9573-ab2e7e1c7946"],
+            "test/julia_package_tree/ADI/package.toml",
+        )
+
+    def test_resolve_julia_dependencies(self):
+        """Check transitive resolution through deps.toml files"""
+        packages = {
+            "App": ("1", {"1.0.0": {}, "1.1.0": {}}, {"1.0": {"Old": "2"}, "1.1-1": {"Lib": "3"}}),
+            "Lib": ("3", {"0.2.0": {}}, {"0": {"Base64": "9", "Util": "4"}}),
+            "Util": ("4", None, {"0-0.5": {"Lib": "3"}}),
+            "Old": ("2", None, None),
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, (uuid, versions, deps) in packages.items():
+                os.makedirs(f"{tmp_dir}/{name}")
+                with open(f"{tmp_dir}/{name}/package.toml", "w") as toml_file:
+                    toml_file.write(
+                        f'name = "{name}"\nuuid = "{uuid}"\n'
+                        f'repo = "https://github.com/x/{name}.jl.git"\n'
+                    )
+                for filename, sections in [("versions.toml", versions), ("deps.toml", deps)]:
+                    if sections is None:
+                        continue
+                    with open(f"{tmp_dir}/{name}/{filename}", "w") as toml_file:
+                        for section, entries in sections.items():
+                            toml_file.write(f'["{section}"]\n')
+                            for key, value in entries.items():
+                                toml_file.write(f'{key} = "{value}"\n')
+            self.test_graph = resolve_julia_dependencies(["App"], tmp_dir)
+
+        self.assertEqual(
+            self.test_graph["closure"], [("App", "1.1.0"), ("Lib", "0.2.0"), ("Util", None)]
+        )
+        self.assertEqual(
+            self.test_graph["edges"], [("App", "Lib"), ("Lib", "Util"), ("Util", "Lib")]
+        )
+        self.assertEqual(self.test_graph["links"]["Util"], "https://github.com/x/Util.jl.git")
+        self.assertEqual(self.test_graph["not_found"], ["Base64"])
+
     def test_generate_julia_source_links(self):
         """Check generate_julia_source_links()."""
         self.test_source_links = generate_julia_source_links("test")
@@ -175,6 +500,1075 @@ class TestJuliaMethods(unittest.TestCase):
             "https://github.com/HSU-ANT/ACME.jl.git" in self.test_source_links
         )
 
+    def test_iter_julia_source_links_parallel(self):
+        """Check parsing package.tomls in worker processes."""
+        self.test_source_links = list(
+            iter_julia_source_links("test/julia_package_tree", processes=2)
+        )
+        self.assertEqual(
+            self.test_source_links,
+            ["https://github.com/HSU-ANT/ACME.jl.git", "https://github.com/JuliaHCI/ADI.jl.git"],
+        )
+
+    def test_update_julia_index(self):
+        """Check incremental indexing only reports what changed."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for pkg, repo in [("Alpha", "alpha"), ("Beta", "beta")]:
+                os.makedirs(f"{tmp_dir}/{pkg}")
+                with open(f"{tmp_dir}/{pkg}/package.toml", "w") as toml_file:
+                    toml_file.write(f'name = "{pkg}"\nrepo = "https://github.com/x/{repo}.git"\n')
+
+            links, diff = update_julia_index(tmp_dir)
+            self.assertEqual(len(links), 2)
+            self.assertEqual(len(diff["added"]), 2)
+
+            with open(f"{tmp_dir}/Beta/package.toml", "w") as toml_file:
+                toml_file.write('name = "Beta"\nrepo = "https://gitlab.com/x/beta.git"\n')
+            shutil.rmtree(f"{tmp_dir}/Alpha")
+            with mock.patch("julia.tomli.loads", wraps=tomli.loads) as fake_loads:
+                links, diff = update_julia_index(tmp_dir)
+                self.assertEqual(fake_loads.call_count, 1)
+            self.assertEqual(links, ["https://gitlab.com/x/beta.git"])
+            self.assertEqual(
+                diff,
+                {
+                    "added": [],
+                    "removed": ["https://github.com/x/alpha.git"],
+                    "changed": [("https://github.com/x/beta.git", "https://gitlab.com/x/beta.git")],
+                },
+            )
+
+            # a full rebuild re-parses every file but still diffs against the index
+            os.makedirs(f"{tmp_dir}/Gamma")
+            with open(f"{tmp_dir}/Gamma/package.toml", "w") as toml_file:
+                toml_file.write('name = "Gamma"\nrepo = "https://github.com/x/gamma.git"\n')
+            with mock.patch("julia.tomli.loads", wraps=tomli.loads) as fake_loads:
+                links, diff = update_julia_index(tmp_dir, full_rebuild=True)
+                self.assertEqual(fake_loads.call_count, 2)
+            self.assertEqual(
+                diff, {"added": ["https://github.com/x/gamma.git"], "removed": [], "changed": []}
+            )
+
+    def test_iter_julia_source_links_from_tarball(self):
+        """Check reading source links straight from a registry tarball."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tarball_path = tmp_dir + "/registry.tar.gz"
+            with tarfile.open(tarball_path, "w:gz") as tarball:
+                tarball.add("test/julia_package_tree", arcname="General")
+            self.test_source_links = list(
+                iter_julia_source_links_from_tarball(tarball_path)
+            )
+        self.assertEqual(
+            sorted(self.test_source_links),
+            ["https://github.com/HSU-ANT/ACME.jl.git", "https://github.com/JuliaHCI/ADI.jl.git"],
+        )
+
+
+class TestCondaMethods(unittest.TestCase):
+    """Test conda recipe methods."""
+
+    def test_render_conda_jinja(self):
+        """Check Jinja variables, filters and calls are rendered"""
+        self.test_rendered = render_conda_jinja(
+            '{% set name = "AMAS" %}\n{% set version = "1.0" %}\n'
+            "url: https://x/{{ name[0] }}/{{ name|lower }}-{{ version }}.tar.gz\n"
+            "{% if win %}\nbuild:\n  - {{ compiler('c') }}\n{% endif %}\n"
+        )
+        self.assertEqual(
+            self.test_rendered,
+            "\n\nurl: https://x/A/amas-1.0.tar.gz\n\nbuild:\n  - c\n\n",
+        )
+
+    def test_parse_conda_recipe(self):
+        """Check extracting links and dependencies from a recipe"""
+        self.test_recipe = parse_conda_recipe("test/bioconda_package_tree/spades/meta.yaml")
+        self.assertEqual(self.test_recipe["name"], "spades")
+        self.assertEqual(self.test_recipe["version"], "3.15.3")
+        self.assertEqual(self.test_recipe["repo_links"], ["https://github.com/ablab/spades"])
+        self.assertEqual(
+            self.test_recipe["host"],
+            ["llvm-openmp", "openmp", "zlib", "bzip2", "sysroot_linux-64"],
+        )
+        self.assertIn("python", self.test_recipe["run"])
+
+    def test_iter_conda_recipes(self):
+        """Check nested recipes are found and parsed in worker processes"""
+        self.test_recipes = list(
+            iter_conda_recipes("test/bioconda_package_tree", processes=2)
+        )
+        self.assertEqual(len(self.test_recipes), 7)
+        self.assertTrue(all(recipe["error"] is None for recipe in self.test_recipes))
+        self.assertIn(
+            "https://github.com/tseemann/shovill",
+            [link for recipe in self.test_recipes for link in recipe["repo_links"]],
+        )
+        self.assertIn(
+            "test/bioconda_package_tree/amas/subfolder/meta.yaml",
+            [recipe["path"] for recipe in self.test_recipes],
+        )
+
+
+class TestLockfilesMethods(unittest.TestCase):
+    """Test reading locked dependency trees."""
+
+    def test_iter_package_lock_packages(self):
+        """Check v1 and v3 package-lock.json trees without dev packages or links."""
+        self.test_v1 = list(iter_package_lock_packages("test/lockfiles/npm_v1/package-lock.json"))
+        self.assertEqual(
+            self.test_v1,
+            [("debug", "2.6.9"), ("ms", "2.0.0"), ("ms", "2.1.3"), ("lodash", "4.17.21")],
+        )
+        self.test_v3 = list(iter_package_lock_packages("test/lockfiles/npm_v3/package-lock.json"))
+        self.assertEqual(
+            self.test_v3,
+            [
+                ("@babel/code-frame", "7.22.13"),
+                ("chalk", "2.4.2"),
+                ("debug", "4.3.4"),
+                ("ms", "2.1.2"),
+                ("string-width", "4.2.3"),
+            ],
+        )
+
+    def test_iter_yarn_and_pnpm_lock_packages(self):
+        """Check yarn classic and berry and pnpm v6 and v9 lockfiles."""
+        expected = [("@babel/code-frame", "7.22.13"), ("debug", "4.3.4")]
+        self.test_classic = list(iter_yarn_lock_packages("test/lockfiles/yarn_classic/yarn.lock"))
+        self.assertEqual(self.test_classic, expected + [("ms", "2.1.2")])
+        self.test_berry = list(iter_npm_lockfile("test/lockfiles/yarn_berry/yarn.lock"))
+        self.assertEqual(self.test_berry, expected)
+        for version in ("v6", "v9"):
+            self.test_pnpm = list(
+                iter_pnpm_lock_packages(f"test/lockfiles/pnpm_{version}/pnpm-lock.yaml")
+            )
+            self.assertEqual(self.test_pnpm, expected)
+
+    def test_json_stream_across_chunks(self):
+        """Check values split across read chunks are decoded and skipped intact."""
+        document = {"a": [1, {"b": 'x"}{]['}], "n": 12345, "packages": {"c": "\\"}}
+        text = json.dumps(document, indent=1)
+        for chunk_size in (1, 3, 64):
+            stream = _JsonStream(io.StringIO(text), chunk_size)
+            self.test_decoded = {key: stream.value() for key in stream.items()}
+            self.assertEqual(self.test_decoded, document)
+            stream = _JsonStream(io.StringIO(text), chunk_size)
+            self.test_kept = [key for key in stream.items() if stream.skip() is None]
+            self.assertEqual(self.test_kept, ["a", "n", "packages"])
+
+    def test_lockfile_replaces_resolution(self):
+        """Check a lockfile next to package.json is read instead of resolving it."""
+        backend = NpmBackend()
+        with mock.patch.object(NpmBackend, "resolve_graph") as resolve_graph:
+            self.test_pkgs = backend.list_packages("test/lockfiles/npm_v3/package.json")
+        resolve_graph.assert_not_called()
+        self.assertEqual(self.test_pkgs["debug"], "4.3.4")
+        self.assertNotIn("mocha", self.test_pkgs)
+        # with no_deps the package.json next to a lockfile is read instead
+        self.test_direct = backend.list_packages(
+            "test/lockfiles/npm_v3/package-lock.json", no_deps=True
+        )
+        self.assertEqual(self.test_direct, {"@babel/code-frame": None, "debug": None})
+
+    def test_iter_python_lockfile(self):
+        """Check Pipfile.lock, poetry.lock, uv.lock, pdm.lock and pip-compile output."""
+        self.test_locks = {
+            path: list(iter_python_lockfile(f"test/lockfiles/{path}"))
+            for path in (
+                "pipenv/Pipfile.lock",
+                "poetry/poetry.lock",
+                "poetry_1_8/poetry.lock",
+                "uv/uv.lock",
+                "pdm/pdm.lock",
+                "compiled/requirements.txt",
+            )
+        }
+        self.assertEqual(
+            self.test_locks["pipenv/Pipfile.lock"],
+            [
+                ("certifi", "2024.2.2"),
+                ("requests", "2.32.0"),
+                ("ruamel.yaml", "0.17.24"),
+                ("mylib", None),
+            ],
+        )
+        # development packages and the project itself are skipped
+        self.assertEqual(
+            self.test_locks["poetry/poetry.lock"],
+            [
+                ("certifi", "2024.2.2"),
+                ("flask", "2.3.3"),
+                ("requests", "2.31.0"),
+                ("Werkzeug", "3.0.1"),
+            ],
+        )
+        # without categories or groups, only what the project's runtime dependencies reach
+        self.assertEqual(
+            self.test_locks["poetry_1_8/poetry.lock"],
+            [
+                ("asgiref", "3.8.1"),
+                ("certifi", "2024.2.2"),
+                ("flask", "2.3.3"),
+                ("requests", "2.31.0"),
+                ("werkzeug", "3.0.1"),
+            ],
+        )
+        self.assertEqual(
+            self.test_locks["uv/uv.lock"],
+            [
+                ("certifi", "2024.2.2"),
+                ("ipywidgets", "8.1.2"),
+                ("requests", "2.31.0"),
+                ("rich", "13.7.1"),
+            ],
+        )
+        self.assertEqual(
+            self.test_locks["pdm/pdm.lock"], [("certifi", "2024.2.2"), ("requests", "2.31.0")]
+        )
+        self.assertEqual(
+            self.test_locks["compiled/requirements.txt"],
+            [("certifi", "2024.2.2"), ("requests", "2.31.0"), ("typing-extensions", "4.11.0")],
+        )
+        self.assertIsNone(find_python_lockfile("test/test_requirements.txt"))
+
+    def test_python_lockfile_replaces_resolution(self):
+        """Check locked Python manifests skip resolution and unlocked ones are parsed."""
+        backend = PypiBackend()
+        with mock.patch.object(PypiBackend, "resolve_graph") as resolve_graph:
+            self.test_pkgs = backend.list_packages("test/lockfiles/pipenv/Pipfile")
+        resolve_graph.assert_not_called()
+        self.assertEqual(self.test_pkgs["ruamel-yaml"], "0.17.24")
+        self.assertNotIn("pytest", self.test_pkgs)
+        self.test_poetry = backend.parse_manifest("test/lockfiles/poetry/poetry.lock")
+        self.assertEqual(
+            self.test_poetry,
+            {"requests": "requests>=2.31,<3.0.0", "Flask": "Flask>=2.3,<2.4.0"},
+        )
+        self.test_pep621 = backend.parse_manifest("test/lockfiles/uv/pyproject.toml")
+        self.assertEqual(list(self.test_pep621), ["requests", "rich"])
+        self.assertEqual(
+            backend.parse_manifest("test/lockfiles/pipenv/Pipfile")["rich"], "rich>=13"
+        )
+
+    def test_pyproject_skips_invalid_requirements(self):
+        """Check a malformed [project] dependency is logged and skipped."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(f"{tmp_dir}/pyproject.toml", "w") as toml_file:
+                toml_file.write('[project]\ndependencies = ["requests>=2", "rich >>= 13"]\n')
+            with self.assertLogs("pypi", "WARNING"):
+                self.test_specs = PypiBackend().parse_manifest(f"{tmp_dir}/pyproject.toml")
+        self.assertEqual(self.test_specs, {"requests": "requests>=2"})
+
+    def test_pyproject_multiple_constraints(self):
+        """Check a Poetry dependency given as a list of constraints takes the first."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(f"{tmp_dir}/pyproject.toml", "w") as toml_file:
+                toml_file.write(
+                    "[tool.poetry.dependencies]\n"
+                    'python = "^3.10"\n'
+                    'numpy = [{version = "^1.24", python = "<3.12"}, '
+                    '{version = "^1.26", python = ">=3.12"}]\n'
+                    'uvloop = [{version = "^0.19", optional = true}]\n'
+                    'mylib = [{git = "https://github.com/x/mylib.git"}]\n'
+                )
+            self.test_specs = PypiBackend().parse_manifest(f"{tmp_dir}/pyproject.toml")
+        self.assertEqual(self.test_specs, {"numpy": "numpy>=1.24,<2.0.0", "mylib": "mylib"})
+
+
+class _ListBackend(EcosystemBackend):
+    """A minimal backend over a .txt list of names and an in-memory registry."""
+
+    ecosystem = "toy"
+
+    def __init__(self, registry):
+        super().__init__()
+        self.registry = registry
+        self.fetched = []
+
+    def parse_manifest(self, filepath):
+        with open(filepath) as manifest_file:
+            return dict.fromkeys(line.strip() for line in manifest_file if line.strip())
+
+    def resolve_graph(self, specs):
+        closure = []
+        edges = []
+        for name in specs:
+            if name in self.registry:
+                closure.append((name, "1.0"))
+                closure.extend((dep, "1.0") for dep in self.registry[name]["deps"])
+                edges.extend(((name, "1.0"), (dep, "1.0")) for dep in self.registry[name]["deps"])
+        not_found = [name for name in specs if name not in self.registry]
+        return {"closure": closure, "edges": edges, "not_found": not_found}
+
+    def fetch_metadata(self, package):
+        self.fetched.append(package)
+        return self.registry.get(package)
+
+    def extract_repo(self, metadata):
+        return metadata["repo"]
+
+
+class TestBackendsMethods(unittest.TestCase):
+    """Test the ecosystem backend interface and pipeline driver."""
+
+    def test_run_pipeline_with_plugin_backend(self):
+        """Check a new backend gets resolution, lookups and output from the driver."""
+        backend = _ListBackend(
+            {
+                "app": {"repo": "https://github.com/toy/app", "deps": ["lib"]},
+                "lib": {"repo": "", "deps": []},
+            }
+        )
+        stream = io.StringIO()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "deps.txt")
+            with open(path, "w") as manifest_file:
+                manifest_file.write("app\nmissing\n")
+            run_pipeline(backend, path, sink=JsonlSink(stream))
+        self.test_records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(
+            [(rec["package"], rec["version"], rec["status"]) for rec in self.test_records],
+            [("app", "1.0", "ok"), ("lib", "1.0", "no-repo"), ("missing", None, "not-found")],
+        )
+        # metadata is memoized per backend
+        backend.lookup(("app", None))
+        self.assertEqual(sorted(backend.fetched), ["app", "lib", "missing"])
+
+    def test_resolutions_are_shared(self):
+        """Check manifests listing the same packages are resolved once per backend."""
+        backend = _ListBackend(
+            {"app": {"repo": "", "deps": ["lib"]}, "lib": {"repo": "", "deps": []}}
+        )
+        with mock.patch.object(backend, "resolve_graph", wraps=backend.resolve_graph) as resolve:
+            self.test_first = backend.resolve({"app": None})
+            self.test_second = backend.resolve({"app": None})
+        self.assertEqual(self.test_first, {"app": "1.0", "lib": "1.0"})
+        self.assertEqual(self.test_second, self.test_first)
+        self.assertEqual(resolve.call_count, 1)
+
+    def test_get_backend(self):
+        """Check backends are created by ecosystem name."""
+        self.test_backend = get_backend("julia", registry="test/julia_package_tree")
+        self.assertEqual(
+            self.test_backend.lookup(("ACME", None))["repo_url"],
+            "https://github.com/HSU-ANT/ACME.jl.git",
+        )
+        with self.assertRaises(ValueError):
+            get_backend("cobol")
+
+
+class TestGraphMethods(unittest.TestCase):
+    """Test the dependency graph and its criticality metrics."""
+
+    def _build_graph(self):
+        graph = DependencyGraph()
+        graph.add_manifest("app/requirements.txt", "pypi", ["web", "cli"])
+        graph.add_manifest("tool/requirements.txt", "pypi", ["cli"])
+        graph.add_resolution(
+            "pypi",
+            {
+                "closure": [
+                    ("web", "2.0"), ("cli", "1.0"), ("core", "1.5"), ("core-ext", "0.1")
+                ],
+                "edges": [
+                    (("web", "2.0"), ("core", "1.5")),
+                    (("cli", "1.0"), ("core", "1.5")),
+                    (("cli", "1.0"), ("core", "1.5")),
+                    # core and core-ext depend on each other
+                    (("core", "1.5"), ("core-ext", "0.1")),
+                    (("core-ext", "0.1"), ("core", "1.5")),
+                ],
+                "not_found": ["ghost"],
+            },
+        )
+        graph.set_repo("pypi", "web", "https://github.com/acme/web")
+        graph.set_repo("pypi", "cli", "https://github.com/acme/cli")
+        graph.set_repo("pypi", "core", "https://github.com/acme/core")
+        graph.set_repo("pypi", "core-ext", "git+https://github.com/Acme/core.git")
+        return graph
+
+    def test_graph_metrics(self):
+        """Check CSR adjacency, fan-in, reach and PageRank over a cyclic graph."""
+        graph = self._build_graph()
+        indptr, indices = graph.csr()
+        self.test_cli = graph.intern("pypi", "cli")
+        self.test_core = graph.intern("pypi", "core")
+        # the duplicate cli -> core edge is stored once
+        self.assertEqual(
+            indices[indptr[self.test_cli]:indptr[self.test_cli + 1]].tolist(), [self.test_core]
+        )
+        self.test_metrics = {
+            graph.label(node_id): metrics
+            for node_id, metrics in enumerate(zip(graph.fan_in().tolist(), graph.reach().tolist()))
+        }
+        self.assertEqual(self.test_metrics["pypi:core"], (3, 2))
+        self.assertEqual(self.test_metrics["pypi:core-ext"], (1, 2))
+        self.assertEqual(self.test_metrics["pypi:web"], (1, 1))
+        self.assertEqual(self.test_metrics["pypi:ghost"], (0, 0))
+        self.test_pagerank = graph.pagerank()
+        self.assertAlmostEqual(self.test_pagerank.sum(), 1.0)
+        self.assertEqual(int(self.test_pagerank.argmax()), self.test_core)
+
+    def test_rank_repos(self):
+        """Check packages of one repository are ranked together."""
+        self.test_ranking = self._build_graph().rank_repos(top=2)
+        self.assertEqual(self.test_ranking[0]["repo_url"], "https://github.com/acme/core")
+        self.assertEqual(self.test_ranking[0]["packages"], 2)
+        # web and cli, but not core-ext from the same repository
+        self.assertEqual(self.test_ranking[0]["fan_in"], 2)
+        self.assertEqual(self.test_ranking[0]["reach"], 2)
+        self.assertEqual(len(self.test_ranking), 2)
+
+    def test_graph_exports(self):
+        """Check the edge list and GraphML exports."""
+        graph = self._build_graph()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            graph.write(os.path.join(tmpdir, "graph.tsv"), "edgelist")
+            graph.write(os.path.join(tmpdir, "graph.graphml"))
+            with open(os.path.join(tmpdir, "graph.tsv")) as edge_file:
+                self.test_edges = edge_file.read().splitlines()
+            self.test_graphml = ElementTree.parse(os.path.join(tmpdir, "graph.graphml"))
+        self.assertEqual(len(self.test_edges), 7)
+        self.assertIn("manifest:app/requirements.txt\tpypi:web", self.test_edges)
+        namespace = {"g": "http://graphml.graphdrawing.org/xmlns"}
+        self.assertEqual(len(self.test_graphml.findall(".//g:node", namespace)), 7)
+        self.assertEqual(len(self.test_graphml.findall(".//g:edge", namespace)), 7)
+        with self.assertRaises(ValueError):
+            graph.write("graph.gexf", "gexf")
+
+    def test_run_pipeline_records_graph(self):
+        """Check the pipeline driver fills a graph with edges and repositories."""
+        backend = _ListBackend(
+            {
+                "app": {"repo": "https://github.com/toy/app", "deps": ["lib"]},
+                "lib": {"repo": "https://github.com/toy/lib", "deps": []},
+            }
+        )
+        graph = DependencyGraph()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "deps.txt")
+            with open(path, "w") as manifest_file:
+                manifest_file.write("app\n")
+            run_pipeline(backend, path, sink=JsonlSink(io.StringIO()), graph=graph)
+            self.test_edges = [
+                (graph.label(source), graph.label(target)) for source, target in graph.iter_edges()
+            ]
+            self.assertEqual(
+                self.test_edges, [("toy:app", "toy:lib"), (f"manifest:{path}", "toy:app")]
+            )
+        self.assertEqual(graph.repos[graph.intern("toy", "lib")], "https://github.com/toy/lib")
+
+
+class TestBulkMethods(unittest.TestCase):
+    """Test analyzing many manifests at once."""
+
+    def test_find_manifests(self):
+        """Check manifests are found and vendored node_modules skipped."""
+        self.test_manifests = list(find_manifests(["test/bulk_manifests", "test/test_package.json"]))
+        self.assertEqual(
+            self.test_manifests,
+            [
+                "test/bulk_manifests/audio/Project.toml",
+                "test/bulk_manifests/signal/Project.toml",
+                "test/test_package.json",
+            ],
+        )
+
+    def test_analyze_manifests(self):
+        """Check results map back to manifests and their union."""
+        with mock.patch.object(NpmBackend, "lookup") as npm_lookup:
+            self.test_results = analyze_manifests(
+                ["test/bulk_manifests"], no_deps=True, julia_registry="test/julia_package_tree"
+            )
+        npm_lookup.assert_not_called()
+        self.test_audio = self.test_results["manifests"]["test/bulk_manifests/audio/Project.toml"]
+        self.assertEqual(
+            [(record["package"], record["status"]) for record in self.test_audio],
+            [("ACME", "ok"), ("NotRegistered", "not-found")],
+        )
+        self.assertEqual(
+            self.test_results["union"],
+            [
+                {
+                    "repo_url": "https://github.com/HSU-ANT/ACME.jl.git",
+                    "manifests": [
+                        "test/bulk_manifests/audio/Project.toml",
+                        "test/bulk_manifests/signal/Project.toml",
+                    ],
+                },
+                {
+                    "repo_url": "https://github.com/JuliaHCI/ADI.jl.git",
+                    "manifests": ["test/bulk_manifests/signal/Project.toml"],
+                },
+            ],
+        )
+
+    def test_analyze_manifests_looks_up_packages_once(self):
+        """Check a package shared by many manifests is looked up once."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for repo in ("a", "b", "c"):
+                os.makedirs(os.path.join(tmpdir, repo))
+                with open(os.path.join(tmpdir, repo, "package.json"), "w") as json_file:
+                    json.dump({"dependencies": {"react": "^18.0.0", repo: "1.0.0"}}, json_file)
+            with mock.patch.object(NpmBackend, "lookup") as npm_lookup:
+                npm_lookup.side_effect = lambda node: make_record("npm", node[0], "1.0.0")
+                self.test_results = analyze_manifests([tmpdir], no_deps=True)
+        self.assertEqual(npm_lookup.call_count, 4)
+        self.assertEqual(len(self.test_results["manifests"]), 3)
+
+
+class TestFetchMethods(unittest.TestCase):
+    """Test the shared concurrent fetch engine."""
+
+    def test_fetch_map_preserves_order(self):
+        """Check fetch_map returns results in input order."""
+        self.test_results = fetch.fetch_map(lambda x: x * 2, [3, 1, 2])
+        self.assertEqual(self.test_results, [6, 2, 4])
+
+    def test_fetch_map_respects_concurrency(self):
+        """Check fetch_map never exceeds the requested concurrency."""
+        in_flight = []
+        peak = []
+        lock = threading.Lock()
+
+        def slow_lookup(item):
+            with lock:
+                in_flight.append(item)
+                peak.append(len(in_flight))
+            time.sleep(0.02)
+            with lock:
+                in_flight.remove(item)
+            return item
+
+        self.test_results = fetch.fetch_map(slow_lookup, range(12), concurrency=4)
+        self.assertEqual(self.test_results, list(range(12)))
+        self.assertEqual(max(peak), 4)
+
+    def test_get_retries_transient_errors(self):
+        """Check 429 and 5xx answers are retried, honoring Retry-After."""
+        throttled = mock.Mock(status_code=429, headers={"Retry-After": "0"})
+        unavailable = mock.Mock(status_code=503, headers={})
+        ok = mock.Mock(status_code=200, headers={})
+        session = mock.Mock()
+        session.get.side_effect = [throttled, unavailable, ok]
+        before = fetch.stats()
+        with mock.patch("fetch._get_session", return_value=session), mock.patch(
+            "fetch.BACKOFF_BASE", 0
+        ):
+            self.assertIs(fetch.get("https://registry.example/pkg"), ok)
+        after = fetch.stats()
+        self.assertEqual(after["retries"] - before["retries"], 2)
+        self.assertEqual(after["throttled"] - before["throttled"], 1)
+        self.assertEqual(session.get.call_args.kwargs["timeout"], fetch.DEFAULT_TIMEOUT)
+
+    def test_get_json_coalesces_concurrent_requests(self):
+        """Check concurrent lookups of one document share a single request."""
+        started, release = threading.Event(), threading.Event()
+        results = []
+
+        def slow_get_body(url, headers=None):
+            started.set()
+            release.wait(5)
+            return 200, b'{"name": "x"}'
+
+        before = fetch.stats()
+        with mock.patch("fetch._get_body", side_effect=slow_get_body) as get_body:
+            threads = [
+                threading.Thread(
+                    target=lambda: results.append(fetch.get_json("https://registry.example/x"))
+                )
+                for _ in range(4)
+            ]
+            threads[0].start()
+            started.wait(5)
+            for thread in threads[1:]:
+                thread.start()
+            deadline = time.monotonic() + 5
+            while fetch.stats()["coalesced"] - before["coalesced"] < 3:
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.01)
+            release.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(get_body.call_count, 1)
+        self.assertEqual(results, [{"name": "x"}] * 4)
+
+    def test_get_gives_up_after_retries(self):
+        """Check connection errors are raised once retries run out."""
+        session = mock.Mock()
+        session.get.side_effect = requests.ConnectionError("refused")
+        fetch.configure(retries=2)
+        try:
+            with mock.patch("fetch._get_session", return_value=session), mock.patch(
+                "fetch.BACKOFF_BASE", 0
+            ):
+                with self.assertRaises(requests.ConnectionError):
+                    fetch.get("https://registry.example/pkg")
+        finally:
+            fetch.configure(retries=fetch.DEFAULT_RETRIES)
+        self.assertEqual(session.get.call_count, 3)
+
+    def test_lookup_survives_unreachable_registry(self):
+        """Check a package whose registry stays unreachable is reported as failed."""
+        session = mock.Mock()
+        session.get.side_effect = requests.ConnectionError("refused")
+        fetch.configure(retries=0)
+        try:
+            with mock.patch("fetch._get_session", return_value=session):
+                self.test_records = [
+                    PypiBackend().lookup(("unreachable-pypi-demo", None)),
+                    NpmBackend().lookup(("unreachable-npm-demo", "1.0.0")),
+                ]
+                # nothing is cached, so a later lookup tries the registry again
+                PypiBackend().lookup(("unreachable-pypi-demo", None))
+        finally:
+            fetch.configure(retries=fetch.DEFAULT_RETRIES)
+        self.assertEqual(
+            [(record["package"], record["status"]) for record in self.test_records],
+            [("unreachable-pypi-demo", "failed"), ("unreachable-npm-demo", "failed")],
+        )
+        self.assertEqual(self.test_records[1]["version"], "1.0.0")
+        self.assertEqual(session.get.call_count, 3)
+
+    def test_token_bucket_paces_requests(self):
+        """Check a host's requests are paced once its burst is spent."""
+        bucket = fetch._TokenBucket(rate=50)  # pylint: disable=protected-access
+        for _ in range(50):
+            bucket.acquire()
+        start = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.08)
+
+    def test_fetch_imap_streams_in_order(self):
+        """Check fetch_imap yields ordered results from a lazy iterable."""
+        self.test_results = fetch.fetch_imap(lambda x: x * 2, iter(range(50)), concurrency=4)
+        self.assertEqual(next(self.test_results), 0)
+        self.assertEqual(list(self.test_results), [x * 2 for x in range(1, 50)])
+
+
+class TestProfilingMethods(unittest.TestCase):
+    """Test the opt-in stage and request instrumentation."""
+
+    def tearDown(self):
+        profiling.disable()
+        fetch.configure(snapshot=None)
+        clear_pypi_project_cache()
+
+    def test_stage_is_noop_when_disabled(self):
+        """Check stages record nothing until profiling is enabled."""
+        with profiling.stage("resolve_deps"):
+            pass
+        self.assertFalse(profiling.enabled())
+        self.assertEqual(profiling.summary(), {})
+
+    def test_profile_counts_stages_requests_and_lookups(self):
+        """Check stage timers, request histograms and snapshot hits."""
+        profiling.enable()
+        fetch.configure(snapshot=DirectorySnapshot("test/registry_snapshot"))
+        resolve_pypi_dependency_graph(["demo-app<1.1", "not-in-snapshot"])
+        profiling.record_request("https://pypi.org/pypi/x/json", profiling.clock(), 404, 10)
+        self.test_summary = profiling.summary()
+        self.assertEqual(self.test_summary["stages"]["fetch_metadata"]["calls"], 4)
+        self.assertEqual(self.test_summary["lookups"]["snapshot"]["hits"], 3)
+        self.assertEqual(self.test_summary["lookups"]["snapshot"]["misses"], 1)
+        host = self.test_summary["hosts"]["pypi.org"]
+        self.assertEqual((host["requests"], host["errors"], host["bytes"]), (1, 1, 10))
+        self.assertEqual(host["latency_ms"]["<=1"], 1)
+
+    def test_write_chrome_trace(self):
+        """Check traced stages are written as complete trace events."""
+        profiling.enable(trace=True)
+        with profiling.stage("parse_manifest"):
+            pass
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "trace.json")
+            profiling.write_chrome_trace(path)
+            with open(path) as trace_file:
+                self.test_trace = json.load(trace_file)
+        self.assertEqual(len(self.test_trace["traceEvents"]), 1)
+        self.assertEqual(self.test_trace["traceEvents"][0]["name"], "parse_manifest")
+        self.assertEqual(self.test_trace["traceEvents"][0]["ph"], "X")
+
+
+class TestSnapshotMethods(unittest.TestCase):
+    """Test resolving from local registry snapshots."""
+
+    def tearDown(self):
+        fetch.configure(snapshot=None, recorder=None)
+        clear_pypi_project_cache()
+
+    def test_snapshot_key(self):
+        """Check registry URLs map to ecosystem/name[/version] keys."""
+        self.assertEqual(snapshot_key("https://pypi.org/pypi/Demo_App/json"), "pypi/demo-app")
+        self.assertEqual(
+            snapshot_key("https://pypi.org/pypi/demo-app/1.0.0/json"), "pypi/demo-app/1.0.0"
+        )
+        self.assertEqual(
+            snapshot_key("https://registry.npmjs.org/@babel%2fcore"), "npm/@babel/core"
+        )
+        self.assertIsNone(snapshot_key("https://example.org/x"))
+
+    def test_resolve_from_directory_snapshot(self):
+        """Check PyPI resolution runs against a directory snapshot."""
+        clear_pypi_project_cache()
+        fetch.configure(snapshot=DirectorySnapshot("test/registry_snapshot"))
+        self.test_graph = resolve_pypi_dependency_graph(["demo-app<1.1", "not-in-snapshot"])
+        self.assertEqual(
+            self.test_graph["closure"], [("demo-app", "1.0.0"), ("demo-lib", "2.0.0")]
+        )
+        self.assertEqual(self.test_graph["not_found"], ["not-in-snapshot"])
+
+    def test_import_bigquery_pypi(self):
+        """Check a BigQuery export becomes project and release documents."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            snapshot = SqliteSnapshot(os.path.join(tmpdir, "snapshot.sqlite"))
+            self.assertEqual(import_bigquery_pypi("test/bigquery_pypi.jsonl", snapshot), 2)
+            project = json.loads(snapshot.lookup("https://pypi.org/pypi/demo-app/json"))
+            release = json.loads(snapshot.lookup("https://pypi.org/pypi/demo-app/1.0.0/json"))
+            snapshot.close()
+        # the latest final release describes the project
+        self.assertEqual(project["info"]["version"], "1.1.0")
+        self.assertEqual(sorted(project["releases"]), ["1.0.0", "1.1.0", "2.0.0rc1"])
+        self.assertEqual(
+            project["info"]["project_urls"]["Source"], "https://github.com/example/demo-app"
+        )
+        self.assertEqual(release["info"]["requires_dist"], ["demo-lib>=1"])
+
+    def test_recorder_builds_snapshot(self):
+        """Check retrieved documents are recorded for later offline runs."""
+        response = mock.Mock(status_code=200, content=b'{"info": {"name": "x"}}')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fetch.configure(recorder=DirectorySnapshot(tmpdir))
+            with mock.patch("fetch.get", return_value=response):
+                fetch.get_json("https://pypi.org/pypi/x/json")
+            fetch.configure(recorder=None, snapshot=DirectorySnapshot(tmpdir))
+            with mock.patch("fetch.get") as fake_get:
+                self.assertEqual(
+                    fetch.get_json("https://pypi.org/pypi/x/json"), {"info": {"name": "x"}}
+                )
+            fake_get.assert_not_called()
+
+
+class TestOutputMethods(unittest.TestCase):
+    """Test the streaming output sinks."""
+
+    def setUp(self):
+        self.test_records = [
+            make_record("pypi", "requests", "2.31.0", "https://github.com/psf/requests", latency=0.5),
+            make_record("pypi", "requests-fork", "1.0", "https://github.com/psf/requests.git"),
+            make_record("npm", "left-pad", "1.3.0"),
+            make_record("pypi", "package_a", found=False),
+        ]
+
+    def test_make_record(self):
+        """Check the status is derived from the lookup outcome."""
+        self.assertEqual(
+            [record["status"] for record in self.test_records],
+            ["ok", "ok", "no-repo", "not-found"],
+        )
+        self.assertEqual(self.test_records[0]["latency"], 0.5)
+
+    def test_text_sink(self):
+        """Check repositories are printed once and warnings go elsewhere."""
+        stdout, stderr = io.StringIO(), io.StringIO()
+        sink = TextSink(stdout, stderr)
+        for record in self.test_records:
+            sink.write(record)
+        self.assertEqual(stdout.getvalue(), "https://github.com/psf/requests\n")
+        self.assertEqual(
+            stderr.getvalue(),
+            "WARNING: left-pad on npm does not have a repository URL\n"
+            "WARNING: package_a is not on PyPI\n",
+        )
+
+    def test_structured_sinks(self):
+        """Check JSONL and CSV sinks write every record."""
+        jsonl, csv_file = io.StringIO(), io.StringIO()
+        jsonl_sink, csv_sink = JsonlSink(jsonl), CsvSink(csv_file)
+        for record in self.test_records:
+            jsonl_sink.write(record)
+            csv_sink.write(record)
+        self.assertEqual(
+            [json.loads(line) for line in jsonl.getvalue().splitlines()], self.test_records
+        )
+        self.assertEqual(
+            csv_file.getvalue().splitlines()[:2],
+            [
+                "ecosystem,package,version,repo_url,status,latency",
+                "pypi,requests,2.31.0,https://github.com/psf/requests,ok,0.5",
+            ],
+        )
+
+
+class TestResultsMethods(unittest.TestCase):
+    """Test the queryable store of recorded results."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.test_store = ResultsStore(os.path.join(self.test_dir, "results.sqlite"))
+        self.test_app = os.path.join(self.test_dir, "app", "requirements.txt")
+        self.test_web = os.path.join(self.test_dir, "web", "package.json")
+
+    def tearDown(self):
+        self.test_store.close()
+        shutil.rmtree(self.test_dir)
+
+    def _scan(self, manifests):
+        """Record one scan of {manifest: [(package, repo_url)]}."""
+        self.test_store.begin_scan()
+        for manifest, pkgs in manifests.items():
+            self.test_store.add_many(
+                [make_record("pypi", name, "1.0", url) for name, url in pkgs], manifest
+            )
+        self.test_store.finish_scan()
+
+    def test_reverse_lookups(self):
+        """Check repositories map back to every manifest depending on them."""
+        self._scan(
+            {
+                self.test_app: [
+                    ("requests", "https://github.com/psf/requests"),
+                    ("urllib3", "https://github.com/urllib3/urllib3"),
+                ],
+                self.test_web: [("urllib3", "git+https://github.com/URLLIB3/urllib3.git")],
+            }
+        )
+        self.test_dependents = self.test_store.dependents("github.com/urllib3/urllib3")
+        self.assertEqual(
+            [row["manifest"] for row in self.test_dependents], [self.test_app, self.test_web]
+        )
+        self.assertEqual(
+            [row["package"] for row in self.test_store.manifest_repos(self.test_app)],
+            ["requests", "urllib3"],
+        )
+        self.assertEqual(self.test_store.dependents("github.com/pallets/click"), [])
+
+    def test_new_since_last_scan(self):
+        """Check a rescan reports new results and drops the ones that went away."""
+        requests_repo = ("requests", "https://github.com/psf/requests")
+        self._scan({self.test_app: [requests_repo, ("six", "https://github.com/benjaminp/six")]})
+        self._scan(
+            {
+                self.test_app: [requests_repo, ("idna", "https://github.com/kjd/idna")],
+                self.test_web: [("left-pad", "")],
+            }
+        )
+        self.test_new = self.test_store.new_since()
+        self.assertEqual(
+            [(row["manifest"], row["package"], row["status"]) for row in self.test_new],
+            [(self.test_app, "idna", "ok"), (self.test_web, "left-pad", "no-repo")],
+        )
+        self.assertEqual(self.test_store.dependents("https://github.com/benjaminp/six"), [])
+        self.assertEqual(len(self.test_store.new_since(0)), 3)
+        self.assertEqual([scan["id"] for scan in self.test_store.scans()], [1, 2])
+
+    def test_results_sink(self):
+        """Check the sink passes records on and records them with their manifest."""
+        stream = io.StringIO()
+        sink = ResultsSink(self.test_store, JsonlSink(stream), manifest=self.test_app)
+        sink.write(make_record("pypi", "requests", "2.31.0", "https://github.com/psf/requests"))
+        d3_record = make_record("npm", "d3", "7.0.0", "github:d3/d3")
+        sink.write(dict(d3_record, manifest=self.test_web))
+        sink.close()
+        self.test_store.finish_scan()
+        self.assertEqual(len(stream.getvalue().splitlines()), 2)
+        self.assertEqual(
+            [row["package"] for row in self.test_store.dependents("https://github.com/d3/d3")],
+            ["d3"],
+        )
+        self.assertEqual(self.test_store.manifest_repos(self.test_app)[0]["version"], "2.31.0")
+
+
+class TestLruMethods(unittest.TestCase):
+    """Test the bounded in-memory caches."""
+
+    def test_lru_cache_evicts_least_recently_used(self):
+        """Check the entry used longest ago is evicted past the size cap."""
+        self.test_cache = LruCache("test", max_entries=2)
+        self.test_cache["a"] = 1
+        self.test_cache["b"] = 2
+        self.assertIn("a", self.test_cache)
+        self.assertEqual(self.test_cache["a"], 1)
+        self.test_cache.setdefault("c", 3)
+        self.assertNotIn("b", self.test_cache)
+        self.assertEqual(self.test_cache.setdefault("a", 0), 1)
+        self.assertEqual(
+            (self.test_cache.hits, self.test_cache.misses, self.test_cache.evictions), (1, 1, 1)
+        )
+
+    def test_lru_cache_expires_entries(self):
+        """Check entries are dropped once their lifetime is over."""
+        self.test_cache = LruCache("test", ttl=60)
+        self.test_cache["a"] = 1
+        self.assertIn("a", self.test_cache)
+        with mock.patch("lru.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertNotIn("a", self.test_cache)
+        self.assertEqual(len(self.test_cache), 0)
+
+    def test_configure_bounds_live_caches(self):
+        """Check configure caps caches created before and after it."""
+        self.test_cache = memory_cache("test_bounded")
+        for key in range(5):
+            self.test_cache[key] = key
+        lru.configure(max_entries=3)
+        try:
+            self.assertEqual(len(self.test_cache), 3)
+            self.assertEqual(memory_cache("test_later").max_entries, 3)
+            self.assertEqual(lru.stats()["test_bounded"]["evictions"], 2)
+        finally:
+            lru.configure()
+
+
+class TestServeMethods(unittest.TestCase):
+    """Test the long-running resolver service."""
+
+    def setUp(self):
+        clear_pypi_project_cache()
+        fetch.configure(snapshot=DirectorySnapshot("test/registry_snapshot"))
+        self.test_server = make_server(ResolverService(), port=0)
+        threading.Thread(target=self.test_server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.test_server.shutdown()
+        self.test_server.server_close()
+        fetch.configure(snapshot=None)
+        clear_pypi_project_cache()
+
+    def _request(self, method, path, body=None):
+        """Send a request to the test server, returning (status, body)."""
+        connection = HTTPConnection("127.0.0.1", self.test_server.server_address[1], timeout=10)
+        try:
+            connection.request(method, path, body=body)
+            response = connection.getresponse()
+            return response.status, response.read().decode()
+        finally:
+            connection.close()
+
+    def test_scan_streams_records(self):
+        """Check a posted manifest is answered with records and counted in the stats."""
+        for _ in range(2):
+            status, body = self._request(
+                "POST", "/scan?filename=requirements.txt", b"demo-app<1.1\nnot-in-snapshot\n"
+            )
+            self.assertEqual(status, 200)
+        self.test_records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(
+            [(record["package"], record["status"]) for record in self.test_records],
+            [("demo-app", "ok"), ("demo-lib", "no-repo"), ("not-in-snapshot", "not-found")],
+        )
+        status, body = self._request("GET", "/stats")
+        self.test_stats = json.loads(body)
+        self.assertEqual(self.test_stats["scans"], 2)
+        self.assertEqual(sorted(self.test_stats["scan_latency_ms"]), ["max", "p50", "p95"])
+        # the second scan reused the first one's resolution
+        self.assertGreaterEqual(self.test_stats["caches"]["pypi_resolutions"]["hits"], 1)
+
+    def test_rejects_unknown_requests(self):
+        """Check unsupported manifests, missing files and unknown paths are refused."""
+        self.assertEqual(self._request("POST", "/scan?filename=setup.cfg", b"")[0], 400)
+        self.assertEqual(self._request("POST", "/scan", b"demo-app")[0], 400)
+        self.assertEqual(self._request("POST", "/scan?path=/nonexistent/package.json")[0], 404)
+        self.assertEqual(self._request("GET", "/metrics")[0], 404)
+
+
+class TestCacheMethods(unittest.TestCase):
+    """Test the persistent registry response cache."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = RegistryCache(self.tmp_dir.name + "/registry.sqlite", ttl=60)
+
+    def tearDown(self):
+        fetch.configure(cache=None, offline=False, refresh=False)
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def test_cache_lookup_and_expiry(self):
+        """Check stored entries are returned and expire after their TTL."""
+        self.cache.store("https://example.org/a", 200, b'{"a": 1}', etag='"v1"')
+        self.cache.store("https://example.org/b", 200, b'{"b": 1}', ttl=-1)
+        self.assertTrue(self.cache.lookup("https://example.org/a")["fresh"])
+        self.assertFalse(self.cache.lookup("https://example.org/b")["fresh"])
+        self.assertIsNone(self.cache.lookup("https://example.org/c"))
+
+    def test_cache_lru_eviction(self):
+        """Check least recently used entries are evicted over the size cap."""
+        self.cache.max_bytes = 20
+        self.cache.store("a", 200, b"x" * 10)
+        self.cache.store("b", 200, b"x" * 10)
+        self.cache.lookup("a")
+        self.cache.store("c", 200, b"x" * 10)
+        self.assertIsNotNone(self.cache.lookup("a"))
+        self.assertIsNone(self.cache.lookup("b"))
+        self.assertEqual(self.cache.stats()["bytes"], 20)
+
+    def test_cache_hits_defer_access_times(self):
+        """Check hits are not committed one by one but written out on close."""
+        path = self.tmp_dir.name + "/registry.sqlite"
+        self.cache.store("a", 200, b"x")
+
+        def last_access():
+            connection = sqlite3.connect(path)
+            try:
+                return connection.execute("SELECT last_access FROM responses").fetchone()[0]
+            finally:
+                connection.close()
+
+        stored = last_access()
+        with mock.patch("cache.time.time", return_value=stored + 10):
+            for _ in range(3):
+                self.cache.lookup("a")
+        self.assertEqual(last_access(), stored)
+        self.cache.close()
+        self.assertEqual(last_access(), stored + 10)
+        self.cache = RegistryCache(path)
+
+    def test_get_json_uses_cache(self):
+        """Check warm lookups skip the network and stale ones revalidate."""
+        fetch.configure(cache=self.cache)
+        fresh = mock.Mock(status_code=200, content=b'{"name": "d3"}', headers={"ETag": '"v1"'})
+        fresh.json.return_value = {"name": "d3"}
+        with mock.patch("fetch.get", return_value=fresh) as fake_get:
+            self.assertEqual(fetch.get_json("https://example.org/d3"), {"name": "d3"})
+            self.assertEqual(fetch.get_json("https://example.org/d3"), {"name": "d3"})
+            self.assertEqual(fake_get.call_count, 1)
+
+        fetch.configure(refresh=True)
+        not_modified = mock.Mock(status_code=304, headers={})
+        with mock.patch("fetch.get", return_value=not_modified) as fake_get:
+            self.assertEqual(fetch.get_json("https://example.org/d3"), {"name": "d3"})
+            self.assertEqual(
+                fake_get.call_args.kwargs["headers"]["If-None-Match"], '"v1"'
+            )
+
+        fetch.configure(refresh=False, offline=True)
+        with mock.patch("fetch.get") as fake_get:
+            self.assertEqual(fetch.get_json("https://example.org/missing"), {})
+            fake_get.assert_not_called()
+
+
+class TestMainMethods(unittest.TestCase):
+    """Test the command line entry point."""
+
+    def test_import_defers_heavy_dependencies(self):
+        """Check importing the CLI loads no ecosystem module or HTTP client."""
+        self.test_loaded = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, main; print(' '.join(sorted(sys.modules)))",
+            ],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.split()
+        for module in (
+            "requests", "requirements", "tomli", "julia", "npm", "conda", "bulk", "numpy",
+            "pypi", "graph", "results", "cache",
+        ):
+            self.assertNotIn(module, self.test_loaded)
+
+
 class TestUtilsMethods(unittest.TestCase):
     """Test functions that work across ecosystems."""
 
@@ -190,6 +1584,12 @@ class TestUtilsMethods(unittest.TestCase):
             "test/julia_package_tree/ACME/package.toml" in self.test_toml_paths
         )
 
+    def test_iter_all_paths(self):
+        """Check the lazy tree walk finds the same paths as glob would."""
+        self.test_paths = iter_all_paths(["meta.yaml"], "test/bioconda_package_tree")
+        self.assertEqual(next(self.test_paths), "test/bioconda_package_tree/abacas/meta.yaml")
+        self.assertIn("test/bioconda_package_tree/amas/subfolder/meta.yaml", list(self.test_paths))
+
     def test_clean_github_link(self):
         """Test clean_github_link function."""
         self.assertEqual(
@@ -203,6 +1603,57 @@ class TestUtilsMethods(unittest.TestCase):
             "https://github.com/psf/requests",
         )
 
+        self.assertEqual(
+            clean_github_link("see http://github.com/psf/requests\nfor details"),
+            "http://github.com/psf/requests",
+        )
+        self.assertEqual(clean_github_link("https://githubXcom/psf/requests"), "")
+
+
+class TestUrlsMethods(unittest.TestCase):
+    """Test repository URL normalization."""
+
+    def test_normalize_repo_url(self):
+        """Check URL forms from every supported host normalize alike."""
+        self.assertEqual(
+            normalize_repo_urls([
+                "git+https://www.github.com/psf/requests/tree/main/requests",
+                "git+ssh://git@github.com/d3/d3.git",
+                "git://github.com/d3/d3.git",
+                "git@gitlab.com:inkscape/inkscape.git",
+                "github:facebook/react",
+                "bitbucket:atlassian/python-bitbucket",
+                "https://codeberg.org/forgejo/forgejo/releases.",
+                "https://api.github.com/repos/psf/requests",
+                "https://example.org/not/a/repo",
+            ]),
+            [
+                "https://github.com/psf/requests",
+                "https://github.com/d3/d3",
+                "https://github.com/d3/d3",
+                "https://gitlab.com/inkscape/inkscape",
+                "https://github.com/facebook/react",
+                "https://bitbucket.org/atlassian/python-bitbucket",
+                "https://codeberg.org/forgejo/forgejo",
+                "",
+                "",
+            ],
+        )
+
+    def test_repo_key_dedupes(self):
+        """Check .git suffixes and case do not create duplicates."""
+        self.assertEqual(repo_key("https://github.com/IQTLabs/NetworkML.git"), "github.com/iqtlabs/networkml")
+        self.assertEqual(
+            dedupe_repo_urls([
+                "https://github.com/d3/d3.git",
+                "https://github.com/d3/d3",
+                "https://www.GitHub.com/D3/d3",
+                "https://example.org/x",
+                "https://example.org/x",
+            ]),
+            ["https://github.com/d3/d3.git", "https://example.org/x"],
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,169 @@
+"""Normalization of repository URLs across code hosts."""
+
+import re
+from functools import lru_cache
+
+
+REPO_HOSTS = ("github.com", "gitlab.com", "bitbucket.org", "codeberg.org")
+SHORTHAND_HOSTS = {
+    "github": "github.com",
+    "gitlab": "gitlab.com",
+    "bitbucket": "bitbucket.org",
+}
+MEMO_SIZE = 1 << 18
+
+# every known host and shorthand contains one of these
+_HOST_HINTS = ("github", "gitlab", "bitbucket", "codeberg")
+_HOST_PATTERN = "|".join(re.escape(host) for host in REPO_HOSTS)
+# matches, anywhere in a string:
+#   https://www.github.com/owner/repo/tree/main, git+https://...,
+#   git+ssh://git@github.com/owner/repo.git, git://github.com/owner/repo,
+#   git@gitlab.com:owner/repo.git and github:owner/repo shorthands
+_REPO_URL = re.compile(
+    r"(?:(?<![\w.-])(?P<shorthand>"
+    + "|".join(SHORTHAND_HOSTS)
+    + r"):(?P<shorthand_owner>[\w.-]+)/(?P<shorthand_repo>[\w.-]+))"
+    r"|(?:(?<![\w.-])(?:www\.)?(?P<host>"
+    + _HOST_PATTERN
+    + r")(?::\d+)?[/:](?P<owner>[\w.-]+)/(?P<repo>[\w.-]+))",
+    re.IGNORECASE,
+)
+# case-sensitive and anchored on the literal host, which lets the regex
+# engine skip through long texts such as READMEs far faster than _REPO_URL
+_REPO_MENTION = re.compile(
+    r"(?P<host>" + _HOST_PATTERN + r")[/:](?P<owner>[\w.-]+)/(?P<repo>[\w.-]+)"
+)
+_GIT_SUFFIX = re.compile(r"(?:\.git)?\.*$", re.IGNORECASE)
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def parse_repo_url(raw_url):
+    """Split a repository URL into host, owner and repo.
+
+    Args:
+        raw_url (str) - raw URL or npm-style shorthand
+
+    Returns:
+        tuple - (host, owner, repo) with the host lowercased and any .git
+            suffix removed, None if no known code host is referenced
+    """
+    match = _REPO_URL.search(raw_url or "")
+    if match is None:
+        return None
+    if match.group("shorthand"):
+        host = SHORTHAND_HOSTS[match.group("shorthand").lower()]
+        owner, repo = match.group("shorthand_owner"), match.group("shorthand_repo")
+    else:
+        host = match.group("host").lower()
+        owner, repo = match.group("owner"), match.group("repo")
+    repo = _GIT_SUFFIX.sub("", repo)
+    if not repo:
+        return None
+    return host, owner, repo
+
+
+def iter_repo_urls(text):
+    """Lazily find repository URLs in free text such as a README.
+
+    The text is scanned with a single compiled pattern and nothing is
+    tokenized, so callers that stop at the first useful match only pay
+    for the text up to that match. Only lowercase host names are found
+    and shorthands such as github:owner/repo are not, which suits prose.
+
+    Args:
+        text (str) - text that may mention repositories
+
+    Yields:
+        tuple - (host, owner, repo) for each mention, in order
+    """
+    for match in _REPO_MENTION.finditer(text or ""):
+        start = match.start()
+        if start >= 4 and text[start - 4 : start] == "www.":
+            start -= 4
+        # skip subdomains such as api.github.com and look-alike hosts
+        if start and (text[start - 1].isalnum() or text[start - 1] in "_.-"):
+            continue
+        repo = _GIT_SUFFIX.sub("", match.group("repo"))
+        if repo:
+            yield match.group("host"), match.group("owner"), repo
+
+
+def mentions_repo_host(raw_url):
+    """Cheaply check whether a string could reference a known code host.
+
+    Args:
+        raw_url (str) - raw URL or npm-style shorthand
+
+    Returns:
+        bool - False if parse_repo_url would certainly return None
+    """
+    lowered = (raw_url or "").lower()
+    return any(hint in lowered for hint in _HOST_HINTS)
+
+
+def normalize_repo_url(raw_url):
+    """Convert a repository URL into https://{host}/{owner}/{repo}.
+
+    Args:
+        raw_url (str) - raw URL or npm-style shorthand
+
+    Returns:
+        str - canonical URL, empty if no known code host is referenced
+    """
+    parsed = parse_repo_url(raw_url)
+    if parsed is None:
+        return ""
+    return "https://" + "/".join(parsed)
+
+
+def repo_key(raw_url):
+    """Build the case-insensitive identity of a repository URL.
+
+    https://github.com/d3/d3.git, git+ssh://git@github.com/D3/d3 and
+    github:d3/d3 all share the key github.com/d3/d3.
+
+    Args:
+        raw_url (str) - raw URL or npm-style shorthand
+
+    Returns:
+        str - lowercase host/owner/repo, empty if no known host matched
+    """
+    parsed = parse_repo_url(raw_url)
+    if parsed is None:
+        return ""
+    return "/".join(parsed).lower()
+
+
+def normalize_repo_urls(raw_urls):
+    """Normalize a whole batch of URLs, parsing each distinct URL once.
+
+    Args:
+        raw_urls (iterable of str) - raw URLs
+
+    Returns:
+        list - normalize_repo_url of each input, in input order
+    """
+    raw_urls = list(raw_urls)
+    normalized = {url: normalize_repo_url(url) for url in dict.fromkeys(raw_urls)}
+    return [normalized[url] for url in raw_urls]
+
+
+def dedupe_repo_urls(urls):
+    """Drop URLs pointing at a repository already seen.
+
+    URLs without a recognized code host are compared verbatim.
+
+    Args:
+        urls (iterable of str) - repository URLs
+
+    Returns:
+        list - first URL of each repository, in input order
+    """
+    seen = set()
+    unique = []
+    for url in urls:
+        key = repo_key(url) or url
+        if key not in seen:
+            seen.add(key)
+            unique.append(url)
+    return unique
@@ -1,32 +1,39 @@
 """Utility functions across ecosystems."""
 
-import glob
+import fnmatch
 import os
 import re
+from collections import deque
+from functools import lru_cache
+from itertools import islice
 
+import profiling
 
+
+# make http(s):// optional
+# make www. optional
+# check for a organization name after github.com and a package name
+GITHUB_LINK_PATTERN = re.compile(r"(https?://)?(www\.)?github\.com/[^/\s]*/[^/\s]*")
+
+
+@lru_cache(maxsize=1 << 16)
 def clean_github_link(raw_url):
     """Convert raw URL into GitHub link with org and repo.
 
     Convert a raw URL into cleaned URL, where a cleaned url
-    has https://www.github.com/{org}/{package}
+    has https://www.github.com/{org}/{package}. To compare links from
+    different sources (or other code hosts) use urls.repo_key.
 
     Args:
         raw_url (str) - raw URL from npm
 
     Returns
-        cleaned_url: string
+        cleaned_url: string, empty if raw_url has no GitHub link
     """
-    # make https:// optional
-    # make www. optional
-    # check for a organization name after github.com and a package name
-    pattern = re.compile("(https://)?(www.)?github.com/[^/]*/[^/]*")
-    try:
-        cleaned_url = pattern.search(raw_url).group(0)
-        cleaned_url = cleaned_url.strip("\n")
-    except AttributeError:
-        cleaned_url = ""
-    return cleaned_url
+    match = GITHUB_LINK_PATTERN.search(raw_url)
+    if match is None:
+        return ""
+    return match.group(0)
 
 
 def find_all_paths(path_endings, base="."):
@@ -39,13 +46,86 @@ def find_all_paths(path_endings, base="."):
     Returns:
         list - all relative paths ending in path_ending
     """
-    paths = []
-    for path_ending in path_endings:
-        found_paths = glob.glob(
-            os.path.expanduser(base) + "/**/" + path_ending, recursive=True,
-        )
-        paths.extend(found_paths)
-    return paths
+    return list(iter_all_paths(path_endings, base))
+
+
+def iter_all_paths(path_endings, base="."):
+    """Lazily find all paths with particular ending.
+
+    Walks the tree with os.scandir and yields each match as soon as its
+    directory is read, so callers can start working before the walk
+    finishes. Hidden directories (such as .git) are skipped, matching
+    glob's behaviour, and symlinked directories are not followed.
+
+    Args:
+        base (str) - location from which to start tree search
+        path_endings (list of str) - file names or glob patterns such as
+            package.toml
+
+    Yields:
+        str - relative paths ending in one of path_endings
+    """
+    pending = [os.path.expanduser(base)]
+    while pending:
+        directory = pending.pop()
+        try:
+            with profiling.stage("walk_tree"):
+                entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+
+        subdirectories = []
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+            elif any(fnmatch.fnmatchcase(entry.name, ending) for ending in path_endings):
+                yield entry.path
+        # visit subdirectories in name order
+        pending.extend(reversed(subdirectories))
+
+
+def parallel_imap(func, items, processes=None, chunksize=64):
+    """Map func over items in worker processes, yielding results in order.
+
+    Only a few chunks are in flight at any time, so items can be a lazy
+    generator over a huge tree without it being consumed up front.
+
+    Args:
+        func (callable) - module-level (picklable) function
+        items (iterable) - arguments to pass to func one at a time
+        processes (int) - number of worker processes; None or 1 maps
+            in the current process
+        chunksize (int) - number of items sent to a worker at once
+
+    Yields:
+        func(item) for each item, in input order
+    """
+    if not processes or processes <= 1:
+        yield from map(func, items)
+        return
+
+    # serial runs, the default, never load multiprocessing
+    from concurrent.futures import ProcessPoolExecutor  # pylint: disable=import-outside-toplevel
+
+    items = iter(items)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = deque()
+        while True:
+            while len(pending) < processes * 2:
+                chunk = list(islice(items, chunksize))
+                if not chunk:
+                    break
+                pending.append(executor.submit(_map_chunk, func, chunk))
+            if not pending:
+                return
+            yield from pending.popleft().result()
+
+
+def _map_chunk(func, chunk):
+    """Apply func to every item of a chunk inside a worker process."""
+    return [func(item) for item in chunk]
 
 
 def nested_dictionary_extract(key, dictionary):